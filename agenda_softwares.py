@@ -1,49 +1,443 @@
 # Serviço de monitorização das datas e avisos
 
+import time
+_IMPORT_START = time.perf_counter()
+
+import argparse
+import csv
 import datetime
-import tkinter as tk
-from tkinter import messagebox
-from data_handler import load_data
+import json
+import sys
+from data_handler import load_data, get_backend, iter_records
+from records import RecordCache, RecordInfo, WARN_DAYS, STATUS_EXPIRED, STATUS_WARN
+from expiry_index import ExpiryIndex
+from renewal_forecast import RenewalForecast, FORECAST_MONTHS
+from alert_state import AlertState, AlertDigest, state_path_for
+from profiling import PROFILER, add_profile_arguments, start_from_args
 
-def check_expiration_and_alert():
-    """Verifica a validade dos softwares e exibe alertas."""
-    data = load_data()
-    today = datetime.date.today()
-    expiring_soon = []
+# O tkinter só é importado quando um popup precisa ser exibido
+IMPORT_MS = (time.perf_counter() - _IMPORT_START) * 1000
+
+# Códigos de saída
+EXIT_OK = 0
+EXIT_EXPIRING = 1
+EXIT_EXPIRED = 2
+
+def find_expiring_columnar(records, today=None, threshold=WARN_DAYS):
+    """Mesmo resultado de find_expiring, com a agenda guardada em colunas.
+
+    'records' pode ser iter_records(): os dicts são descartados à medida que
+    viram colunas, e só os vencidos/próximos são montados de novo.
+    """
+    from columnar import ColumnarInventory
+
+    store = ColumnarInventory.from_records(records)
+    names = store.columns["nome"]
+    for i in store.invalid_indices():
+        print(f"Data inválida para o software: {names[i]}", file=sys.stderr)
+    return store.find_expiring(today, threshold)
+
+def _renews(software):
+    return software.get("renovacao", "").lower() != "nao"
+
+def find_expiring(data, today=None, threshold=WARN_DAYS, ordinals=None):
+    """Retorna (vencidos, próximos) entre os softwares que serão renovados.
 
-    for software in data["softwares"]:
-        validade_str = software.get("validade", "")
+    'ordinals' são os das datas já interpretadas, se a agenda veio da cópia binária.
+    """
+    today = today or datetime.date.today()
+    cache = RecordCache(warn_days=threshold)
+    index = ExpiryIndex(data["softwares"], cache, ordinals)
 
-        if not validade_str or validade_str.lower() == "vitalício":
+    for software in index.invalid():
+        if software.get("validade", ""):
+            print(f"Data inválida para o software: {software['nome']}", file=sys.stderr)
+
+    expired = [s for s in index.expired(today) if _renews(s)]
+    expiring = [s for s in index.expiring_within(threshold, today) if _renews(s)]
+    return expired, expiring
+
+def find_expiring_stream(records, today=None, threshold=WARN_DAYS):
+    """Mesmo resultado de find_expiring, percorrendo 'records' um a um.
+
+    Só os vencidos e próximos do vencimento ficam em memória, então o
+    consumo não cresce com o tamanho da agenda (ver iter_records).
+    """
+    today_ordinal = (today or datetime.date.today()).toordinal()
+    expired = []
+    expiring = []
+    for seq, software in enumerate(records):
+        info = RecordInfo(software.get("validade", ""))
+        if not info.valid:
+            if info.validade:
+                print(f"Data inválida para o software: {software['nome']}", file=sys.stderr)
+            continue
+        info.refresh(today_ordinal, threshold)
+        if info.status == STATUS_EXPIRED:
+            target = expired
+        elif info.status == STATUS_WARN:
+            target = expiring
+        else:
             continue
-        
-        try:
-            validade_date = datetime.datetime.strptime(software["validade"], "%Y-%m-%d").date()
-            diff_days = (validade_date - today).days
-
-            if software.get("renovacao", "").lower() != "nao":
-                if 0 <= diff_days <= 90:  # expira em até 3 meses
-                    expiring_soon.append(software)
-                elif diff_days < 0:  # já venceu
-                    expiring_soon.append(software)
-            
-            
-            
-
-        except ValueError:
-            print(f"Data inválida para o software: {software['nome']}")
-
-    if expiring_soon:
-        message = "Os seguintes softwares estão com a validade próxima ou vencida:\n\n"
-        for soft in expiring_soon:
-            message += f"Software: {soft['nome']}\n"
-            message += f"Validade: {soft['validade']}\n"
-            message += "-------------------\n"
-
-        root = tk.Tk()
-        root.withdraw()
-        messagebox.showwarning("Aviso de Validade de Software", message)
-        root.destroy()
+        if _renews(software):
+            target.append((info.ordinal, seq, software))
+
+    # Mesma ordem do ExpiryIndex: validade e, nos empates, ordem do arquivo
+    expired.sort(key=lambda item: item[:2])
+    expiring.sort(key=lambda item: item[:2])
+    return [item[2] for item in expired], [item[2] for item in expiring]
+
+def evaluate_alerts(data, today=None, threshold=WARN_DAYS, reset=False, inventory=None):
+    """Avalia só os registros novos, editados ou que cruzaram um limite.
+
+    Retorna um AlertDigest com as transições ainda não avisadas e grava o
+    estado do usuário ao lado do arquivo de dados. Com várias agendas (inventory),
+    cada uma tem o seu estado e os resumos são combinados em um só.
+    """
+    if inventory is None:
+        targets = [(state_path_for(get_backend().path), data["softwares"], None)]
+    else:
+        targets = [(state_path_for(s.path), inventory.records_of(s), s.label) for s in inventory.sources]
+
+    digest = AlertDigest(today or datetime.date.today())
+    for state_path, softwares, label in targets:
+        state = AlertState(state_path)
+        if reset:
+            state.reset()
+        with PROFILER.stage("alerts"):
+            part = state.evaluate(softwares, today, threshold)
+        with PROFILER.stage("save"):
+            state.save()
+        digest.extend(part, label)
+
+    for software in digest.invalid:
+        print(f"Data inválida para o software: {software['nome']}", file=sys.stderr)
+    return digest
+
+def exit_code_for(expired, expiring):
+    if expired:
+        return EXIT_EXPIRED
+    if expiring:
+        return EXIT_EXPIRING
+    return EXIT_OK
+
+def with_unreachable(code, unreachable):
+    """Servidor de ativação fora do ar é tão urgente quanto licença vencida."""
+    return EXIT_EXPIRED if unreachable else code
+
+# ====================================================
+# Formatos de saída
+# ====================================================
+def _rows(expired, expiring, today, label_of=None):
+    """Linhas do relatório; com label_of, cada linha ganha a agenda de origem."""
+    cache = RecordCache()
+    for situacao, softwares in (("vencido", expired), ("proximo", expiring)):
+        for soft in softwares:
+            row = {
+                "situacao": situacao,
+                "nome": soft.get("nome", ""),
+                "validade": soft.get("validade", ""),
+                "dias": cache.get(soft, today).days,
+                "renovacao": soft.get("renovacao", ""),
+            }
+            if label_of is not None:
+                row["origem"] = label_of(soft)
+            yield row
+
+def format_text(expired, expiring, today, label_of=None):
+    rows = list(_rows(expired, expiring, today, label_of))
+    if not rows:
+        return "Nenhum software vencido ou próximo do vencimento."
+    lines = []
+    for row in rows:
+        label = "VENCIDO" if row["situacao"] == "vencido" else "PRÓXIMO"
+        source = f"[{row['origem']}] " if "origem" in row else ""
+        lines.append(f"{label:<8} {row['validade']:<10} {row['dias']:>5} dias  {source}{row['nome']}")
+    return "\n".join(lines)
+
+def format_json(expired, expiring, today, extra=None, label_of=None):
+    report = {
+        "data": today.isoformat(),
+        "vencidos": len(expired),
+        "proximos": len(expiring),
+        "softwares": list(_rows(expired, expiring, today, label_of)),
+    }
+    if extra:
+        report.update(extra)
+    return json.dumps(report, indent=2, ensure_ascii=False)
+
+def write_csv(expired, expiring, today, stream, label_of=None):
+    fieldnames = ["situacao", "nome", "validade", "dias", "renovacao"]
+    if label_of is not None:
+        fieldnames.append("origem")
+    writer = csv.DictWriter(stream, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(_rows(expired, expiring, today, label_of))
+
+def write_digest_csv(digest, stream):
+    fieldnames = ["atual", "anterior", "nome", "validade", "dias"]
+    if any(t.source is not None for t in digest.transitions()):
+        fieldnames.append("origem")
+    writer = csv.DictWriter(stream, fieldnames=fieldnames)
+    writer.writeheader()
+    writer.writerows(t.as_dict() for t in digest.transitions())
+
+def build_message(softwares, label_of=None):
+    parts = ["Os seguintes softwares estão com a validade próxima ou vencida:", ""]
+    for soft in softwares:
+        parts.append(f"Software: {soft['nome']}")
+        if label_of is not None:
+            parts.append(f"Agenda: {label_of(soft)}")
+        parts.append(f"Validade: {soft['validade']}")
+        parts.append("-------------------")
+    return "\n".join(parts)
+
+def find_unreachable(records, timeout):
+    """[(registro, HealthResult)] dos servidores/portais de ativação que não responderam."""
+    from endpoint_health import check_records
+
+    return [(soft, result) for soft, result in check_records(records, timeout) if not result.ok]
+
+def format_unreachable(unreachable):
+    lines = []
+    for soft, result in unreachable:
+        lines.append(f"INACESSÍVEL  {result.target.key}  {soft.get('nome', '')} ({result.error})")
+    return "\n".join(lines)
+
+def unreachable_rows(unreachable):
+    return [dict(result.as_dict(), nome=soft.get("nome", "")) for soft, result in unreachable]
+
+def build_digest_message(digest):
+    return "Mudanças na validade dos softwares desde a última verificação:\n\n" + digest.format_text()
+
+def show_popup(message):
+    """Exibe o aviso em um messagebox (importa o tkinter só aqui)."""
+    import tkinter as tk
+    from tkinter import messagebox
+
+    root = tk.Tk()
+    root.withdraw()
+    messagebox.showwarning("Aviso de Validade de Software", message)
+    root.destroy()
+
+# ====================================================
+# Verificação
+# ====================================================
+def load_agendas(paths=None):
+    """Carrega a agenda padrão ou, com 'paths', várias agendas combinadas.
+
+    Retorna (data, inventory); inventory é None quando há uma agenda só.
+    """
+    if not paths:
+        return load_data(), None
+    from inventories import load_inventories
+
+    inventory = load_inventories(paths)
+    for path, error in inventory.errors:
+        print(f"Agenda ignorada ({path}): {error}", file=sys.stderr)
+    return inventory.data, inventory
+
+def _loaded_ordinals(inventory):
+    """Ordinais trazidos pela cópia binária da agenda padrão, se houver."""
+    if inventory is not None:
+        return None
+    return getattr(get_backend(), "load_ordinals", None)
+
+def check_expiration_and_alert(threshold=WARN_DAYS, all_records=False, paths=None, stream=False,
+                               server_timeout=None):
+    """Verifica a validade dos softwares e exibe alertas.
+
+    Por padrão só avisa as mudanças desde a última verificação; com
+    all_records=True mostra a lista completa, como antes. 'paths' aceita
+    arquivos e diretórios de agendas, verificados em conjunto. Com
+    stream=True (só para a lista completa) a agenda é lida aos poucos;
+    stream="colunar" também, mas guardada em colunas (ver columnar).
+    Com server_timeout, também testa os servidores de ativação; um servidor
+    inacessível conta como um software vencido.
+    Retorna o código de saída (0 ok, 1 próximos do vencimento, 2 vencidos).
+    """
+    if stream:
+        find = find_expiring_columnar if stream == "colunar" else find_expiring_stream
+        expired, expiring = find(iter_records(), threshold=threshold)
+        if expired or expiring:
+            show_popup(build_message(expired + expiring))
+        return exit_code_for(expired, expiring)
+
+    data, inventory = load_agendas(paths)
+    unreachable = find_unreachable(data["softwares"], server_timeout) if server_timeout else []
+    servers = ("\n\nServidores de ativação inacessíveis:\n" + format_unreachable(unreachable)) if unreachable else ""
+    if all_records:
+        expired, expiring = find_expiring(data, threshold=threshold, ordinals=_loaded_ordinals(inventory))
+        if expired or expiring or unreachable:
+            show_popup(build_message(expired + expiring, inventory.label_of if inventory else None) + servers)
+        return with_unreachable(exit_code_for(expired, expiring), unreachable)
+
+    digest = evaluate_alerts(data, threshold=threshold, inventory=inventory)
+    if digest or unreachable:
+        show_popup(build_digest_message(digest) + servers)
+    return with_unreachable(exit_code_for(digest.expired_total, digest.expiring_total), unreachable)
+
+def print_digest(digest, fmt, extra=None):
+    if fmt == "json":
+        report = digest.as_dict()
+        if extra:
+            report.update(extra)
+        print(json.dumps(report, indent=2, ensure_ascii=False), flush=True)
+    elif fmt == "csv":
+        write_digest_csv(digest, sys.stdout)
+        sys.stdout.flush()
+    else:
+        print(digest.format_text(), flush=True)
+
+def run_daemon_mode(args):
+    from scheduler import run_daemon
+
+    def check(data, today):
+        digest = evaluate_alerts(data, today, args.threshold)
+        if not digest:
+            return
+        if args.headless:
+            print_digest(digest, args.format)
+        else:
+            show_popup(build_digest_message(digest))
+
+    def log(message):
+        print(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {message}", file=sys.stderr, flush=True)
+
+    try:
+        run_daemon(check, threshold=args.threshold, poll_interval=args.intervalo, log=log)
+    except KeyboardInterrupt:
+        pass
+    return EXIT_OK
+
+def print_forecast(paths, months, fmt, today=None):
+    """Previsão de renovações por mês (--previsao) na saída padrão."""
+    import renewal_forecast
+
+    data, inventory = load_agendas(paths)
+    report = RenewalForecast(data["softwares"], ordinals=_loaded_ordinals(inventory)).report(today, months)
+    if fmt == "json":
+        print(json.dumps(report, indent=2, ensure_ascii=False), flush=True)
+    elif fmt == "csv":
+        renewal_forecast.write_csv(report, sys.stdout)
+        sys.stdout.flush()
+    else:
+        print(renewal_forecast.format_text(report), flush=True)
+    return EXIT_OK
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Verifica a validade das licenças de software")
+    parser.add_argument("--headless", action="store_true",
+                        help="Não abre popup; escreve o relatório na saída padrão")
+    parser.add_argument("--format", choices=("text", "json", "csv"), default="text",
+                        help="Formato do relatório no modo --headless (padrão: text)")
+    parser.add_argument("--threshold", type=int, default=WARN_DAYS, metavar="DIAS",
+                        help=f"Dias de antecedência para o aviso (padrão: {WARN_DAYS})")
+    parser.add_argument("--tempos", action="store_true",
+                        help="Mostra na saída de erro o tempo de importação e de verificação")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Continua em execução e avisa no dia em que cada limite é cruzado")
+    parser.add_argument("--intervalo", type=float, default=30, metavar="SEGUNDOS",
+                        help="No modo --daemon, intervalo entre as checagens do arquivo (padrão: 30)")
+    parser.add_argument("--todos", action="store_true",
+                        help="Lista todos os vencidos/próximos, não só as mudanças desde a última verificação")
+    parser.add_argument("--reiniciar-estado", action="store_true",
+                        help="Esquece o que já foi avisado e avisa tudo de novo")
+    parser.add_argument("--agendas", nargs="+", metavar="CAMINHO",
+                        help="Arquivos ou diretórios de agendas (um por laboratório), verificados em conjunto")
+    parser.add_argument("--stream", action="store_true",
+                        help="Com --todos, lê a agenda aos poucos em vez de carregá-la inteira (agendas muito grandes)")
+    parser.add_argument("--colunar", action="store_true",
+                        help="Com --todos, guarda a agenda em colunas e calcula os prazos em lote (usa o NumPy se instalado)")
+    parser.add_argument("--servidores", action="store_true",
+                        help="Testa também os servidores de licença e portais do campo de ativação")
+    parser.add_argument("--timeout-servidor", type=float, default=3.0, metavar="SEGUNDOS",
+                        help="Tempo máximo de resposta de cada servidor com --servidores (padrão: 3)")
+    parser.add_argument("--previsao", type=int, nargs="?", const=FORECAST_MONTHS, metavar="MESES",
+                        help="Escreve a previsão de renovações por mês (padrão: "
+                             f"{FORECAST_MONTHS} meses) no --format escolhido e sai")
+    add_profile_arguments(parser, "perfil_verificacao.json")
+    args = parser.parse_args(argv)
+    start_from_args(args, "agenda_softwares")
+
+    if args.stream and args.colunar:
+        parser.error("use --stream ou --colunar, não os dois")
+    stream = "colunar" if args.colunar else args.stream
+    if stream and (not args.todos or args.daemon or args.agendas or args.reiniciar_estado):
+        parser.error("--stream e --colunar só valem para a lista completa (--todos) de uma única agenda")
+
+    server_timeout = args.timeout_servidor if args.servidores else None
+    if args.servidores and (args.daemon or stream):
+        parser.error("--servidores não pode ser usado com --daemon, --stream ou --colunar")
+
+    if args.previsao is not None:
+        if args.previsao < 1:
+            parser.error("--previsao precisa de pelo menos 1 mês")
+        if args.daemon or stream or args.servidores or args.reiniciar_estado:
+            parser.error("--previsao não pode ser usado com --daemon, --stream, --colunar, "
+                         "--servidores ou --reiniciar-estado")
+        return print_forecast(args.agendas, args.previsao, args.format)
+
+    if args.daemon:
+        if args.agendas:
+            parser.error("--daemon acompanha uma única agenda; não use junto com --agendas")
+        return run_daemon_mode(args)
+
+    if not args.headless:
+        if args.reiniciar_estado:
+            data, inventory = load_agendas(args.agendas)
+            evaluate_alerts(data, threshold=args.threshold, reset=True, inventory=inventory)
+            return check_expiration_and_alert(threshold=args.threshold, all_records=True, paths=args.agendas,
+                                              server_timeout=server_timeout)
+        code = check_expiration_and_alert(threshold=args.threshold, all_records=args.todos,
+                                          paths=args.agendas, stream=stream, server_timeout=server_timeout)
+        if args.tempos:
+            print(f"Importação: {IMPORT_MS:.1f} ms", file=sys.stderr)
+        return code
+
+    start = time.perf_counter()
+    today = datetime.date.today()
+    if stream:
+        data, inventory = None, None
+    else:
+        data, inventory = load_agendas(args.agendas)
+    label_of = inventory.label_of if inventory else None
+    if stream:
+        find = find_expiring_columnar if stream == "colunar" else find_expiring_stream
+        expired, expiring = find(iter_records(), today, args.threshold)
+    elif args.todos:
+        if args.reiniciar_estado:
+            # Como no modo com popup: esquece o avisado e já grava a situação atual
+            evaluate_alerts(data, today, args.threshold, reset=True, inventory=inventory)
+        expired, expiring = find_expiring(data, today, args.threshold, _loaded_ordinals(inventory))
+    else:
+        digest = evaluate_alerts(data, today, args.threshold, reset=args.reiniciar_estado, inventory=inventory)
+    unreachable = find_unreachable(data["softwares"], server_timeout) if server_timeout else []
+    check_ms = (time.perf_counter() - start) * 1000
+    extra = {"tempos_ms": {"importacao": round(IMPORT_MS, 2), "verificacao": round(check_ms, 2)}} if args.tempos else None
+    if server_timeout and args.format == "json":
+        extra = dict(extra or {}, servidores_inacessiveis=unreachable_rows(unreachable))
+
+    if args.todos:
+        if args.format == "json":
+            print(format_json(expired, expiring, today, extra, label_of))
+        elif args.format == "csv":
+            write_csv(expired, expiring, today, sys.stdout, label_of)
+        else:
+            print(format_text(expired, expiring, today, label_of))
+        code = exit_code_for(expired, expiring)
+    else:
+        print_digest(digest, args.format, extra)
+        code = exit_code_for(digest.expired_total, digest.expiring_total)
+
+    if unreachable and args.format != "json":
+        # No CSV a saída padrão tem um formato fixo: os servidores vão para a saída de erro
+        print(format_unreachable(unreachable), file=sys.stderr if args.format == "csv" else sys.stdout, flush=True)
+    code = with_unreachable(code, unreachable)
+
+    if args.tempos:
+        print(f"Importação: {IMPORT_MS:.1f} ms | Verificação: {check_ms:.1f} ms", file=sys.stderr)
+    return code
 
 if __name__ == "__main__":
-    check_expiration_and_alert()
\ No newline at end of file
+    sys.exit(main())
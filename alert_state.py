@@ -0,0 +1,265 @@
+# Estado persistido entre as verificações: só avisa o que mudou
+
+import datetime
+from hashlib import sha1
+import json
+import os
+import re
+from data_handler import write_json_atomic
+from records import RecordCache, WARN_DAYS, STATUS_WARN, STATUS_EXPIRED
+
+STATE_VERSION = 1
+
+# Situações que geram aviso, na ordem em que aparecem no resumo
+ALERT_GROUPS = (
+    (STATUS_EXPIRED, "vencidos", "Vencidos"),
+    (STATUS_WARN, "proximos", "Próximos do vencimento"),
+)
+
+def _user_tag(user=None):
+    """Usuário do sistema, só com caracteres seguros para nome de arquivo."""
+    if user is None:
+        import getpass
+
+        try:
+            user = getpass.getuser()
+        except (OSError, KeyError, ImportError):
+            user = ""
+    return re.sub(r"[^\w.-]", "_", user) or "usuario"
+
+def state_path_for(data_path, user=None):
+    """software_agenda.json -> software_agenda.<usuário>.estado.json
+
+    Um estado por pessoa: a agenda é compartilhada, e o que já foi avisado
+    a quem verificou primeiro ainda precisa ser avisado aos demais.
+    """
+    return f"{os.path.splitext(data_path)[0]}.{_user_tag(user)}.estado.json"
+
+def content_hash(record):
+    """Hash dos campos que decidem o aviso (nome, validade e renovação).
+
+    Alterar ativação, usuário ou licenças não reavalia o registro; o id
+    também não entra, então o estado continua válido quando ids são criados.
+    """
+    get = record.get
+    payload = f"{get('nome', '')}\x1f{get('validade', '')}\x1f{get('renovacao', '')}"
+    return sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def _renews(record):
+    return record.get("renovacao", "").lower() != "nao"
+
+# ====================================================
+# Resumo dos avisos
+# ====================================================
+class Transition:
+    __slots__ = ("software", "previous", "status", "days", "source")
+
+    def __init__(self, software, previous, status, days, source=None):
+        self.software = software
+        self.previous = previous  # None para registro novo
+        self.status = status
+        self.days = days
+        self.source = source      # agenda de origem, com várias agendas
+
+    def as_dict(self):
+        result = {
+            "nome": self.software.get("nome", ""),
+            "validade": self.software.get("validade", ""),
+            "dias": self.days,
+            "anterior": self.previous,
+            "atual": self.status,
+        }
+        if self.source is not None:
+            result["origem"] = self.source
+        return result
+
+class AlertDigest:
+    """Transições novas de uma verificação, agrupadas por situação.
+
+    'expired_total' e 'expiring_total' contam todos os softwares renováveis
+    em cada situação (não só os novos) e definem o código de saída.
+    """
+
+    def __init__(self, today):
+        self.today = today
+        self.groups = {status: [] for status, _, _ in ALERT_GROUPS}
+        self.invalid = []  # reavaliados com data não reconhecida
+        self.evaluated = 0
+        self.expired_total = 0
+        self.expiring_total = 0
+
+    def add(self, transition):
+        self.groups[transition.status].append(transition)
+
+    def __bool__(self):
+        return any(self.groups.values())
+
+    def __len__(self):
+        return sum(len(items) for items in self.groups.values())
+
+    def transitions(self):
+        for status, _, _ in ALERT_GROUPS:
+            yield from self.groups[status]
+
+    def extend(self, other, source=None):
+        """Junta o resumo de outra agenda a este, marcando a origem."""
+        for transition in other.transitions():
+            transition.source = source
+            self.add(transition)
+        for items in self.groups.values():
+            items.sort(key=lambda t: t.days)
+        self.invalid.extend(other.invalid)
+        self.evaluated += other.evaluated
+        self.expired_total += other.expired_total
+        self.expiring_total += other.expiring_total
+
+    def format_text(self):
+        if not self:
+            return "Nenhuma mudança desde a última verificação."
+        parts = []
+        for status, _, title in ALERT_GROUPS:
+            items = self.groups[status]
+            if not items:
+                continue
+            lines = [f"{title} ({len(items)}):"]
+            for t in items:
+                days = f"{t.days} dias" if t.days is not None else "?"
+                source = f"[{t.source}] " if t.source is not None else ""
+                lines.append(f"  - {source}{t.software.get('nome', '')} (validade {t.software.get('validade', '')}, {days})")
+            parts.append("\n".join(lines))
+        return "\n\n".join(parts)
+
+    def as_dict(self):
+        return {
+            "data": self.today.isoformat(),
+            "avaliados": self.evaluated,
+            "vencidos": self.expired_total,
+            "proximos": self.expiring_total,
+            "novos": {
+                key: [t.as_dict() for t in self.groups[status]]
+                for status, key, _ in ALERT_GROUPS
+            },
+        }
+
+# ====================================================
+# Estado
+# ====================================================
+class AlertState:
+    """Última situação avaliada de cada registro, guardada em um JSON.
+
+    As entradas são indexadas pelo hash do conteúdo do registro e guardam
+    a situação, se ela já foi avisada e o dia da próxima mudança prevista.
+    Registros com o mesmo hash cuja próxima mudança ainda não chegou não
+    são reavaliados.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.threshold = None
+        self.entries = {}  # hash -> {"nome", "status", "avisado", "proxima"}
+        self.changed = False  # há algo a gravar (save() sem mudanças não escreve)
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except (OSError, ValueError):
+            return
+        if raw.get("versao") != STATE_VERSION:
+            return
+        self.threshold = raw.get("limite")
+        self.entries = raw.get("registros", {})
+
+    def save(self):
+        if not self.changed:
+            return
+        # Compacto: o arquivo só é lido por aqui e tem uma entrada por registro
+        write_json_atomic(self.path, {
+            "versao": STATE_VERSION,
+            "limite": self.threshold,
+            "registros": self.entries,
+        }, indent=None)
+        self.changed = False
+
+    def reset(self):
+        self.entries = {}
+        self.changed = True
+
+    @staticmethod
+    def _next_change(info, today_ordinal, threshold):
+        if info.lifetime or info.date is None:
+            return None  # só muda se o registro for editado
+        if today_ordinal < info.ordinal - threshold:
+            return info.ordinal - threshold
+        if today_ordinal <= info.ordinal:
+            return info.ordinal + 1
+        return None
+
+    def evaluate(self, softwares, today=None, threshold=WARN_DAYS):
+        """Atualiza o estado e retorna um AlertDigest com as transições novas."""
+        today = today or datetime.date.today()
+        t = today.toordinal()
+        digest = AlertDigest(today)
+        cache = RecordCache(warn_days=threshold)
+
+        # Com outro limite as previsões guardadas não valem mais
+        reuse = self.threshold == threshold
+        previous_entries = self.entries
+        by_name = None  # só montado se algum registro foi editado
+        entries = {}
+        changed = not reuse
+
+        for software in softwares:
+            key = content_hash(software)
+            old = previous_entries.get(key)
+            entries_key = entries.get(key)
+            if entries_key is not None:
+                old = entries_key  # conteúdo duplicado: mesma avaliação
+
+            proxima = old.get("proxima") if old else None
+            if reuse and old is not None and (proxima is None or t < proxima):
+                entry = old
+            else:
+                digest.evaluated += 1
+                info = cache.get(software, today)
+                status = info.status
+                if info.date is None and software.get("validade", ""):
+                    digest.invalid.append(software)
+                # Registro editado: procura a situação anterior pelo nome
+                before = old
+                if before is None:
+                    if by_name is None:
+                        by_name = {entry.get("nome"): entry for entry in previous_entries.values()}
+                    before = by_name.get(software.get("nome", ""))
+                prev_status = before.get("status") if before else None
+                prev_notified = before.get("avisado", False) if before else False
+
+                notified = prev_notified and prev_status == status
+                if status in (STATUS_WARN, STATUS_EXPIRED) and _renews(software) and not notified:
+                    digest.add(Transition(software, prev_status, status, info.days))
+                    notified = True
+
+                entry = {
+                    "nome": software.get("nome", ""),
+                    "status": status,
+                    "avisado": notified,
+                    "proxima": self._next_change(info, t, threshold),
+                }
+                changed = changed or entry != previous_entries.get(key)
+
+            entries[key] = entry
+            if _renews(software):
+                if entry["status"] == STATUS_EXPIRED:
+                    digest.expired_total += 1
+                elif entry["status"] == STATUS_WARN:
+                    digest.expiring_total += 1
+
+        for items in digest.groups.values():
+            items.sort(key=lambda t: t.days)
+        # Registros removidos (ou editados) deixam chaves que não existem mais
+        changed = changed or len(entries) != len(previous_entries)
+        self.entries = entries
+        self.threshold = threshold
+        self.changed = self.changed or changed
+        return digest
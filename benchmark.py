@@ -0,0 +1,392 @@
+# Benchmark dos caminhos críticos com agendas sintéticas
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import data_handler
+from data_handler import JsonBackend, SqliteBackend, JournalBackend, set_backend
+
+DEFAULT_SIZES = "1000,10000,100000"
+
+_WORDS = (
+    "Adobe", "Autodesk", "Lab", "Chem", "Bio", "Mass", "Lynx", "Prism", "Gene", "Cloud",
+    "Office", "Suite", "Pro", "Server", "Studio", "Analytics", "Thermo", "Draw", "Signs", "Data",
+)
+_MALFORMED = ("31/12/2026", "2026-13-01", "2026-02-30", "sem data", "01-01-2027", "")
+
+# ====================================================
+# Agenda sintética
+# ====================================================
+def synthetic_record(rng, i, today):
+    roll = rng.random()
+    if roll < 0.10:
+        validade = "Vitalício"
+    elif roll < 0.15:
+        validade = rng.choice(_MALFORMED)
+    else:
+        validade = (today + datetime.timedelta(days=rng.randint(-730, 1460))).isoformat()
+
+    nome = f"{rng.choice(_WORDS)} {rng.choice(_WORDS)} {i}"
+    if rng.random() < 0.3:
+        # URLs longas de portais de licenciamento
+        path = "/".join(rng.choice(_WORDS).lower() for _ in range(rng.randint(8, 20)))
+        ativacao = f"https://licencas.exemplo.com.br/{path}?conta={rng.randint(1, 10**9)}"
+    elif rng.random() < 0.5:
+        ativacao = f"177.220.{rng.randint(0, 255)}.{rng.randint(0, 255)}:{rng.randint(1024, 65535)}"
+    else:
+        ativacao = "Chave de acesso"
+
+    return {
+        "id": f"{rng.getrandbits(128):032x}",
+        "nome": nome,
+        "validade": validade,
+        "ativacao": ativacao,
+        "usuario": f"{rng.choice(_WORDS).lower()}{rng.randint(1, 999)}@unicamp.br",
+        "numero_licencas": str(rng.randint(1, 200)),
+        "renovacao": "sim" if rng.random() < 0.7 else "nao",
+    }
+
+def generate_inventory(path, size, seed=0, today=None):
+    """Grava em 'path' uma agenda sintética com 'size' registros."""
+    rng = random.Random(seed)
+    today = today or datetime.date.today()
+    data = {"softwares": [synthetic_record(rng, i, today) for i in range(size)]}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+# ====================================================
+# Medição
+# ====================================================
+def measure(fn, repeat, setup=None):
+    """Executa fn 'repeat' vezes e retorna as estatísticas em ms."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(times), 3),
+        "mediana_ms": round(statistics.median(times), 3),
+        "execucoes": repeat,
+    }
+
+def bench_storage(results, workdir, json_path, repeat, with_sqlite):
+    set_backend(JsonBackend(json_path))
+    results["load_data"] = measure(data_handler.load_data, repeat)
+
+    data = data_handler.load_data()
+    set_backend(JsonBackend(os.path.join(workdir, "saida.json")))
+    results["save_data"] = measure(lambda: data_handler.save_data(data), repeat)
+
+    if with_sqlite:
+        set_backend(SqliteBackend(os.path.join(workdir, "agenda.db")))
+        results["save_data[sqlite]"] = measure(lambda: data_handler.save_data(data), repeat)
+        results["load_data[sqlite]"] = measure(data_handler.load_data, repeat)
+
+    # Alteração de um único registro: regrava o JSON inteiro x uma linha no diário
+    record = data["softwares"][0]
+
+    def touch(backend):
+        record["usuario"] = f"bench-{time.perf_counter_ns()}"
+        backend.update_record(data, record)
+    json_backend = JsonBackend(os.path.join(workdir, "saida.json"))
+    results["update_record"] = measure(lambda: touch(json_backend), repeat)
+
+    shutil.copy(json_path, os.path.join(workdir, "diario.json"))
+    journal = JournalBackend(os.path.join(workdir, "diario.jsonl"))
+    data = journal.load()
+    record = data["softwares"][0]
+    results["update_record[diario]"] = measure(lambda: touch(journal), repeat)
+    set_backend(journal)
+    results["load_data[diario]"] = measure(data_handler.load_data, repeat)
+
+    set_backend(JsonBackend(json_path))
+
+def bench_checker(results, workdir, json_path, repeat):
+    import agenda_softwares
+    from alert_state import state_path_for
+
+    set_backend(JsonBackend(json_path))
+    state_path = state_path_for(json_path)
+
+    def reset_state():
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+    # O popup é substituído por uma função vazia durante a medição
+    # e os avisos de data inválida são descartados
+    original_popup = agenda_softwares.show_popup
+    agenda_softwares.show_popup = lambda message: None
+    check = agenda_softwares.check_expiration_and_alert
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+            results["check_expiration_and_alert"] = measure(check, repeat, setup=reset_state)
+            check()
+            results["check_expiration_and_alert[incremental]"] = measure(check, repeat)
+            results["check_expiration_and_alert[todos]"] = measure(
+                lambda: check(all_records=True), repeat)
+            results["check_expiration_and_alert[colunar]"] = measure(
+                lambda: check(all_records=True, stream="colunar"), repeat)
+    finally:
+        agenda_softwares.show_popup = original_popup
+        reset_state()
+
+# Números que o corte de um bloco pode partir ao meio ("1." / "1.5e" / "-")
+_STREAM_SAMPLE = {
+    "antes": -0.25e-7,
+    "softwares": [1, 1.5, -2e+3, 123456789, 1e100, {"x": [3.14159, -0.0]}, "1.5e3", True, None],
+    "depois": 1.5e10,
+}
+
+def check_stream(results, json_path):
+    """Confere que a leitura em blocos dá o mesmo resultado que json.load.
+
+    A amostra é lida com blocos de 1 a 31 caracteres, para o corte cair em
+    todas as posições de cada número; a agenda sintética, com um bloco de
+    tamanho ímpar.
+    """
+    from json_stream import iter_array, iter_file_array
+
+    sizes = list(range(1, 32))
+    for indent in (None, 4):
+        text = json.dumps(_STREAM_SAMPLE, indent=indent)
+        for chunk_size in sizes:
+            if list(iter_array(io.StringIO(text), "softwares", chunk_size)) != _STREAM_SAMPLE["softwares"]:
+                raise RuntimeError(f"json_stream difere de json.load (bloco de {chunk_size}, indent={indent})")
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        expected = json.load(f)["softwares"]
+    if list(iter_file_array(json_path, "softwares", chunk_size=4093)) != expected:
+        raise RuntimeError(f"json_stream difere de json.load em {json_path}")
+    results["_stream_confere"] = {"blocos": f"1-{sizes[-1]} e 4093", "iguais": True}
+
+def bytes_per_record(build, count):
+    """Memória alocada (tracemalloc) pela estrutura que build() retorna, por registro."""
+    import gc
+    import tracemalloc
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        value = build()
+        gc.collect()
+        allocated = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del value
+    return round(allocated / count, 1) if count else 0.0
+
+def bench_columnar(results, json_path, size, repeat):
+    from columnar import ColumnarInventory, numpy_available
+
+    def load_records():
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)["softwares"]
+
+    backend = JsonBackend(json_path)
+    results["_memoria_bytes_por_registro"] = {
+        "dicts": bytes_per_record(load_records, size),
+        "colunar": bytes_per_record(lambda: ColumnarInventory.from_records(backend.iter_records()), size),
+    }
+
+    records = load_records()
+    results["ColumnarInventory.from_records"] = measure(lambda: ColumnarInventory.from_records(records), repeat)
+    store = ColumnarInventory.from_records(records)
+    del records
+    results["classify[python]"] = measure(lambda: store.classify(use_numpy=False), repeat)
+    if numpy_available():
+        results["classify[numpy]"] = measure(lambda: store.classify(use_numpy=True), repeat)
+
+def bench_forecast(results, json_path, repeat):
+    from renewal_forecast import RenewalForecast
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        records = json.load(f)["softwares"]
+    results["RenewalForecast.__init__"] = measure(lambda: RenewalForecast(records), repeat)
+
+    # Uma edição: só a contribuição do registro muda de mês
+    forecast = RenewalForecast(records)
+    record = records[len(records) // 2] if records else {}
+    dates = ("2027-03-15", "2028-08-01")
+
+    def edit():
+        record["validade"] = dates[record.get("validade") == dates[0]]
+        forecast.update(record)
+    results["RenewalForecast.update"] = measure(edit, repeat)
+    results["RenewalForecast.report"] = measure(forecast.report, repeat)
+
+def bench_editor(results, json_path, repeat):
+    import tkinter as tk
+
+    set_backend(JsonBackend(json_path))
+    try:
+        import ui_editor
+        start = time.perf_counter()
+        # Sem testar os servidores: as ativações sintéticas abririam conexões
+        # de verdade durante as medições
+        app = ui_editor.SoftwareEditor(check_servers=False)
+        results["SoftwareEditor.__init__"] = {"min_ms": round((time.perf_counter() - start) * 1000, 3), "execucoes": 1}
+    except tk.TclError as e:
+        results["editor"] = {"ignorado": f"Tk indisponível: {e}"}
+        return
+
+    try:
+        app.withdraw()
+        app.update_idletasks()
+
+        def set_query(text):
+            # Cancela o filtro agendado pela digitação; a medição chama apply_filter
+            app.search_var.set(text)
+            if app._filter_job is not None:
+                app.after_cancel(app._filter_job)
+                app._filter_job = None
+
+        def set_status(text):
+            app.status_filter_var.set(text)
+
+        set_query("")
+        results["apply_filter"] = measure(app.apply_filter, repeat)
+        set_query("lab")
+        results["apply_filter[busca]"] = measure(app.apply_filter, repeat)
+        set_query("")
+        set_status("Somente próximos")
+        results["apply_filter[proximos]"] = measure(app.apply_filter, repeat)
+        set_status("Todos")
+        app.apply_filter()
+
+        results["apply_sort"] = measure(app.apply_sort, repeat)
+
+        # Clique no cabeçalho da coluna já ordenada: só inverte a lista
+        results["apply_sort[inverte]"] = measure(lambda: app.change_sort("Validade"), repeat)
+
+        def sort_by(*columns):
+            app.sorter.spec = [(column, True) for column in columns]
+            app.apply_sort()
+        results["apply_sort[nome]"] = measure(lambda: sort_by("Nome"), repeat)
+        results["apply_sort[licencas+nome]"] = measure(lambda: sort_by("Licenças", "Nome"), repeat)
+        sort_by("Validade")
+
+        # Sem mudanças (só o diff) e com a Treeview vazia (render completo)
+        results["load_tree"] = measure(app.load_tree, repeat)
+
+        def clear_tree():
+            app.renderer.render([])
+        results["load_tree[vazia]"] = measure(app.load_tree, repeat, setup=clear_tree)
+    finally:
+        app.save_queue.close()
+        app.destroy()
+
+def run_size(size, repeat, seed, with_sqlite, skip_editor):
+    workdir = tempfile.mkdtemp(prefix="agenda-bench-")
+    try:
+        json_path = os.path.join(workdir, "software_agenda.json")
+        start = time.perf_counter()
+        generate_inventory(json_path, size, seed)
+        results = {
+            "_arquivo_bytes": os.path.getsize(json_path),
+            "_geracao_ms": round((time.perf_counter() - start) * 1000, 3),
+        }
+
+        bench_storage(results, workdir, json_path, repeat, with_sqlite)
+        check_stream(results, json_path)
+        bench_checker(results, workdir, json_path, repeat)
+        bench_columnar(results, json_path, size, repeat)
+        bench_forecast(results, json_path, repeat)
+        if not skip_editor:
+            bench_editor(results, json_path, repeat)
+        return results
+    finally:
+        set_backend(None)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+# ====================================================
+# Relatório
+# ====================================================
+def git_revision():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=10,
+        )
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def compare(current, previous_path):
+    """Mostra a razão atual/anterior da mediana de cada medição."""
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+
+    print(f"\nComparação com {previous_path} (revisão {previous.get('revisao')}):")
+    for size, ops in current["resultados"].items():
+        old_ops = previous.get("resultados", {}).get(size, {})
+        for op, stats in ops.items():
+            old = old_ops.get(op)
+            if op.startswith("_") or not old or "min_ms" not in stats or "min_ms" not in old:
+                continue
+            new_ms = stats.get("mediana_ms", stats["min_ms"])
+            old_ms = old.get("mediana_ms", old["min_ms"])
+            ratio = new_ms / old_ms if old_ms else float("inf")
+            flag = "  <-- regressão" if ratio > 1.2 else ""
+            print(f"  {size:>8} {op:<42} {old_ms:>10.2f} -> {new_ms:>10.2f} ms  x{ratio:.2f}{flag}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark da agenda de softwares com dados sintéticos")
+    parser.add_argument("--tamanhos", default=DEFAULT_SIZES,
+                        help=f"Quantidades de registros separadas por vírgula (padrão: {DEFAULT_SIZES}; aceita até 1000000)")
+    parser.add_argument("--repeticoes", type=int, default=3, help="Execuções por medição (padrão: 3)")
+    parser.add_argument("--semente", type=int, default=0, help="Semente do gerador de dados")
+    parser.add_argument("--sqlite", action="store_true", help="Mede também o backend SQLite")
+    parser.add_argument("--sem-editor", action="store_true", help="Não mede o editor (Tk)")
+    parser.add_argument("--saida", default="bench_results.json", help="Arquivo JSON de resultados")
+    parser.add_argument("--comparar", metavar="ARQUIVO", help="Resultados anteriores para comparação")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.tamanhos.split(",") if s.strip()]
+    output_path = os.path.abspath(args.saida)
+    compare_path = os.path.abspath(args.comparar) if args.comparar else None
+    report = {
+        "revisao": git_revision(),
+        "data": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "plataforma": platform.platform(),
+        "resultados": {},
+    }
+
+    # O editor carrega checked.png/unchecked.png do diretório atual
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    for size in sizes:
+        print(f"{size} registros...", flush=True)
+        results = run_size(size, args.repeticoes, args.semente, args.sqlite, args.sem_editor)
+        report["resultados"][str(size)] = results
+        for op, stats in results.items():
+            if isinstance(stats, dict) and "min_ms" in stats:
+                print(f"  {op:<42} {stats['min_ms']:>10.2f} ms")
+            elif isinstance(stats, dict):
+                print(f"  {op:<42} {stats}")
+
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em {output_path}")
+
+    if compare_path:
+        compare(report, compare_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# Agenda em colunas (arrays e strings internadas) para inventários muito grandes
+
+import datetime
+import sys
+from array import array
+from itertools import islice
+from data_handler import FIELDS
+from records import (validade_ordinals, LIFETIME_DATE, WARN_DAYS,
+                     STATUS_OK, STATUS_WARN, STATUS_EXPIRED, STATUS_INVALID)
+
+_LIFETIME_ORDINAL = LIFETIME_DATE.toordinal()
+
+# Colunas de texto com poucos valores distintos: cada valor fica uma vez só
+# na memória (sys.intern), em vez de uma cópia por registro
+INTERNED_FIELDS = ("validade", "ativacao", "usuario", "numero_licencas", "renovacao")
+
+# Códigos de situação em classify(); STATUS_BY_CODE traduz para records.STATUS_*
+CODE_INVALID, CODE_OK, CODE_WARN, CODE_EXPIRED = range(4)
+STATUS_BY_CODE = (STATUS_INVALID, STATUS_OK, STATUS_WARN, STATUS_EXPIRED)
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class Classification:
+    """Resultado de ColumnarInventory.classify() para um dia.
+
+    days: dias restantes por registro (0 para data inválida e vitalício;
+    use 'codes' para distinguir); codes: CODE_* por registro; expired e
+    expiring: índices dos renováveis vencidos e próximos, em ordem de validade.
+    """
+
+    __slots__ = ("days", "codes", "expired", "expiring")
+
+    def __init__(self, days, codes, expired, expiring):
+        self.days = days
+        self.codes = codes
+        self.expired = expired
+        self.expiring = expiring
+
+class ColumnarInventory:
+    """Os registros da agenda guardados coluna a coluna.
+
+    A validade vira um array de ordinais ("i", 4 bytes por registro) e a
+    renovação um array de flags ("b"); o dict de cada registro só é montado
+    de novo para os registros que vão ser exibidos (record()).
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.columns = {field: [] for field in FIELDS}
+        self.ordinals = array("i")
+        self.renews = array("b")
+        self.extra = {}  # índice -> chaves fora de FIELDS (raras)
+
+    @classmethod
+    def from_records(cls, records, batch_size=4096):
+        """Monta as colunas a partir de um iterável de dicts (pode ser iter_records()).
+
+        Os registros são consumidos em lotes de 'batch_size', coluna a coluna,
+        então no máximo um lote de dicts fica em memória ao mesmo tempo.
+        """
+        store = cls()
+        intern = sys.intern
+        known = frozenset(FIELDS + ("id",))
+        records = iter(records)
+
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                return store
+            offset = len(store.ids)
+            store.ids.extend([r.get("id") for r in batch])
+            for field, column in store.columns.items():
+                values = [r.get(field) for r in batch]
+                if field in INTERNED_FIELDS:
+                    values = [intern(v) if type(v) is str else v for v in values]
+                column.extend(values)
+
+            store.ordinals.extend(validade_ordinals(store.columns["validade"][offset:]))
+            store.renews.extend([str(r.get("renovacao", "")).lower() != "nao" for r in batch])
+            for i, record in enumerate(batch, offset):
+                if not known.issuperset(record):
+                    store.extra[i] = {k: v for k, v in record.items() if k not in known}
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def record(self, i):
+        """Dict do registro i, com as mesmas chaves do original."""
+        record = {} if self.ids[i] is None else {"id": self.ids[i]}
+        for field, column in self.columns.items():
+            value = column[i]
+            if value is not None:
+                record[field] = value
+        if i in self.extra:
+            record.update(self.extra[i])
+        return record
+
+    def records(self, indices=None):
+        if indices is None:
+            indices = range(len(self))
+        return [self.record(i) for i in indices]
+
+    # ---------- Cálculo em lote ----------
+    def classify(self, today=None, threshold=WARN_DAYS, use_numpy=None):
+        """Dias restantes, situação e índices vencidos/próximos em uma passada.
+
+        use_numpy=None usa o NumPy se ele estiver instalado; o resultado é o
+        mesmo nos dois caminhos.
+        """
+        today_ordinal = (today or datetime.date.today()).toordinal()
+        if use_numpy is None:
+            use_numpy = numpy_available()
+        if use_numpy:
+            return self._classify_numpy(today_ordinal, threshold)
+        return self._classify_python(today_ordinal, threshold)
+
+    def _classify_python(self, t, threshold):
+        limit = t + threshold
+        lifetime = _LIFETIME_ORDINAL
+        ordinals = self.ordinals
+        renews = self.renews
+
+        days = array("i", [o - t if 0 < o < lifetime else 0 for o in ordinals])
+        codes = bytearray(
+            CODE_INVALID if o == 0 else
+            CODE_EXPIRED if o < t else
+            CODE_WARN if o <= limit and o != lifetime else
+            CODE_OK
+            for o in ordinals
+        )
+        expired = [i for i, o in enumerate(ordinals) if 0 < o < t and renews[i]]
+        expiring = [i for i, o in enumerate(ordinals) if t <= o <= limit and o != lifetime and renews[i]]
+        # Ordem do ExpiryIndex: validade e, nos empates, ordem da agenda
+        expired.sort(key=ordinals.__getitem__)
+        expiring.sort(key=ordinals.__getitem__)
+        return Classification(days, codes, expired, expiring)
+
+    def _classify_numpy(self, t, threshold):
+        import numpy as np
+
+        limit = t + threshold
+        ordinals = np.frombuffer(self.ordinals, dtype=np.int32) if len(self) else np.zeros(0, np.int32)
+        renews = np.frombuffer(self.renews, dtype=np.int8).astype(bool) if len(self) else np.zeros(0, bool)
+
+        valid = ordinals > 0
+        lifetime = ordinals == _LIFETIME_ORDINAL
+        dated = valid & ~lifetime
+        is_expired = dated & (ordinals < t)
+        is_warn = dated & (ordinals >= t) & (ordinals <= limit)
+
+        days = np.where(dated, ordinals - t, 0).astype(np.int32)
+        codes = np.full(len(ordinals), CODE_OK, dtype=np.uint8)
+        codes[~valid] = CODE_INVALID
+        codes[is_warn] = CODE_WARN
+        codes[is_expired] = CODE_EXPIRED
+
+        def ordered(mask):
+            indices = np.flatnonzero(mask & renews)
+            return indices[np.argsort(ordinals[indices], kind="stable")].tolist()
+
+        return Classification(
+            array("i", days.tobytes()), bytearray(codes.tobytes()),
+            ordered(is_expired), ordered(is_warn),
+        )
+
+    def invalid_indices(self):
+        """Registros com validade preenchida mas não reconhecida, na ordem da agenda."""
+        validades = self.columns["validade"]
+        return [i for i, o in enumerate(self.ordinals) if o == 0 and validades[i]]
+
+    def find_expiring(self, today=None, threshold=WARN_DAYS, use_numpy=None):
+        """(vencidos, próximos) como dicts, na ordem de agenda_softwares.find_expiring."""
+        result = self.classify(today, threshold, use_numpy)
+        return self.records(result.expired), self.records(result.expiring)
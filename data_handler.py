@@ -1,23 +1,1262 @@
+import datetime
 import json
 import os
+import threading
+import time
+from contextlib import closing, contextmanager
+from profiling import PROFILER
+from record_merge import merge_records
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# sqlite3 e argparse são importados só quando usados: este módulo é carregado
+# a cada login pela verificação automática e deve iniciar rápido
 
 FILE_PATH = "software_agenda.json"
 DEFAULT_PATH = "softwares_default.json"
+DB_PATH = "software_agenda.db"
 
-def load_data():
-    """Carrega os dados da agenda de um arquivo JSON."""
-    if os.path.exists(FILE_PATH):
-        with open(FILE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+# Agendas JSON a partir deste tamanho ganham uma cópia binária ao lado
+# (snapshot_cache); abaixo disso o json.loads já é instantâneo
+SNAPSHOT_MIN_BYTES = 1024 * 1024
+
+# Campos conhecidos de um registro; qualquer outra chave vai para a coluna "extra"
+FIELDS = ("nome", "validade", "ativacao", "usuario", "numero_licencas", "renovacao")
+
+def new_record_id():
+    import uuid
+
+    return uuid.uuid4().hex
+
+def record_key(record):
+    """Identificador persistente do registro (campo "id", criado se faltar)."""
+    key = record.get("id")
+    if key is None:
+        key = record["id"] = new_record_id()
+    return key
+
+def ensure_ids(records):
+    """Dá um id novo aos registros sem id ou com id repetido.
+
+    Retorna quantos registros foram alterados (0 se nada precisa ser gravado).
+    """
+    seen = set()
+    changed = 0
+    for record in records:
+        key = record.get("id")
+        if not isinstance(key, str) or not key or key in seen:
+            key = record["id"] = new_record_id()
+            changed += 1
+        seen.add(key)
+    return changed
+
+def snapshot_data(data):
+    """Cópia rasa e consistente da agenda para ser gravada em outra thread.
+
+    list() e dict() copiam em uma única operação, sem liberar o GIL, então a
+    cópia não quebra se a interface alterar os registros ao mesmo tempo.
+    """
+    snapshot = dict(data)
+    snapshot["softwares"] = [dict(r) for r in list(data.get("softwares", []))]
+    return snapshot
+
+def write_json_atomic(path, data, indent=4):
+    """Grava o JSON em um arquivo temporário e o renomeia por cima do destino.
+
+    Se o processo cair no meio da gravação, o arquivo original continua intacto.
+    indent=None grava compacto (arquivos que ninguém edita à mão).
+    """
+    # Nome único por processo e thread, na mesma pasta (os.replace não cruza discos)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    fd = os.open(tmp_path, flags, 0o644)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=indent, ensure_ascii=False,
+                      separators=None if indent is not None else (",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def file_signature(path):
+    """(mtime_ns, tamanho, inode) do arquivo, ou None se ele não existir.
+
+    Como toda gravação troca o arquivo inteiro (os.replace), o inode muda
+    mesmo quando mtime e tamanho coincidem.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+# ====================================================
+# Trava entre processos
+# ====================================================
+class FileLockTimeout(OSError):
+    pass
+
+if os.name == "nt":
+    def _lock_fd(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+    def _unlock_fd(fd):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    def _lock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock_fd(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+@contextmanager
+def file_lock(path, timeout=10.0):
+    """Trava exclusiva sobre 'path' entre processos (arquivo path + ".lock").
+
+    Vale também entre threads do mesmo processo. Levanta FileLockTimeout se
+    outro processo segurar a trava por mais de 'timeout' segundos.
+    """
+    fd = os.open(path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _lock_fd(fd)
+                break
+            except OSError:
+                if time.monotonic() >= deadline:
+                    raise FileLockTimeout(f"O arquivo {path} está sendo gravado por outro usuário")
+                time.sleep(0.05)
+        try:
+            yield
+        finally:
+            _unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+class FileWatcher:
+    """Detecta alterações em um arquivo comparando só a assinatura (stat)."""
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = file_signature(path)
+
+    def changed(self):
+        """True se o arquivo mudou desde a última chamada."""
+        signature = file_signature(self.path)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        return True
+
+# ====================================================
+# Backend JSON (formato original, arquivo único)
+# ====================================================
+class JsonBackend:
+    """Guarda a agenda inteira em um arquivo JSON.
+
+    Não há atualização parcial: qualquer alteração regrava o documento todo.
+
+    O arquivo pode estar aberto por várias pessoas (pasta compartilhada): a
+    gravação é feita sob file_lock() e, se a assinatura do arquivo mudou
+    desde a última sincronização, a versão gravada por outro processo é
+    mesclada registro a registro (pelo id) em vez de ser sobrescrita.
+    """
+
+    def __init__(self, path=None, default_path=None):
+        self._path = path
+        self._default_path = default_path
+        self._sync_lock = threading.Lock()
+        self._signature = None  # assinatura do arquivo na última sincronização
+        self._base = {}         # id -> registro (cópia) na última sincronização
+        self._base_text = None  # ou o texto lido, interpretado só se preciso
+        self._base_blob = None  # ou a cópia binária (snapshot_cache)
+        self._memory_is_file = False  # os dados em memória são os do arquivo na última sincronização
+        self.last_conflicts = []
+        self.ids_assigned = 0  # registros que receberam id na carga e ainda não foram gravados
+        self.load_ordinals = None  # ordinais das validades na última carga, se vieram da cópia
+
+    @property
+    def path(self):
+        return self._path or FILE_PATH
+
+    @property
+    def default_path(self):
+        return self._default_path or DEFAULT_PATH
+
+    def _read(self):
+        """(dados, texto, assinatura) do arquivo atual (o texto em bytes UTF-8)."""
+        # A assinatura vem antes da leitura: se o arquivo for trocado no meio,
+        # a próxima verificação percebe a mudança de novo
+        signature = file_signature(self.path)
+        with open(self.path, "rb") as f:
+            text = f.read()
+        return json.loads(text), text, signature
+
+    def _set_base(self, signature, records=None, text=None, blob=None):
+        self._signature = signature
+        self._base_text = text
+        self._base_blob = blob
+        self._base = {} if records is None else {r["id"]: dict(r) for r in records}
+
+    def _base_records(self):
+        if self._base_text is not None or self._base_blob is not None:
+            if self._base_text is not None:
+                records = json.loads(self._base_text).get("softwares", [])
+            else:
+                import snapshot_cache
+                records = snapshot_cache.decode(self._base_blob).get("softwares", [])
+            self._base = {r["id"]: r for r in records if "id" in r}
+            self._base_text = self._base_blob = None
+        return self._base
+
+    def _load_snapshot(self, signature, text=None):
+        """Dados da cópia binária (snapshot_cache), ou None se ela está desatualizada."""
+        import snapshot_cache
+
+        snapshot = snapshot_cache.load(self.path, signature, text)
+        if snapshot is None:
+            return None
+        if text is not None:
+            # Mesmo conteúdo com outra assinatura: regrava a cópia com a atual
+            snapshot_cache.store(self.path, signature, text, snapshot.data)
+        self.load_ordinals = snapshot.ordinals
+        with self._sync_lock:
+            self._set_base(signature, blob=snapshot.blob)
+            self._memory_is_file = True
+        return snapshot.data
+
+    def load(self):
+        self.load_ordinals = None
+        self.ids_assigned = 0
+        if os.path.exists(self.path):
+            # Agendas grandes abrem pela cópia binária quando ela está em dia
+            signature = file_signature(self.path)
+            use_snapshot = signature is not None and signature[1] >= SNAPSHOT_MIN_BYTES
+            if use_snapshot:
+                data = self._load_snapshot(signature)
+                if data is not None:
+                    return data
+
+            data, text, signature = self._read()
+            if use_snapshot:
+                cached = self._load_snapshot(signature, text)
+                if cached is not None:
+                    return cached
+            softwares = data.get("softwares", [])
+            assigned = ensure_ids(softwares)
+            if not assigned:
+                with self._sync_lock:
+                    self._set_base(signature, text=text)
+                    self._memory_is_file = True
+                if use_snapshot:
+                    import snapshot_cache
+                    self.load_ordinals = snapshot_cache.store(self.path, signature, text, data)
+                return data
+            # Arquivo antigo: os ids valem em memória e só vão para o arquivo
+            # na próxima gravação do editor (ver ids_assigned); quem só lê
+            # (verificação, API) não regrava a agenda compartilhada
+            with self._sync_lock:
+                self._set_base(signature, records=softwares)
+                self._memory_is_file = False
+            self.ids_assigned = assigned
+            return data
+
+        # se não existir, carrega o default
+        with self._sync_lock:
+            self._set_base(None, records=[])
+            self._memory_is_file = False
+        if os.path.exists(self.default_path):
+            with open(self.default_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            ensure_ids(data.get("softwares", []))
+            return data
+
+        return {"softwares": []}
+
+    def save(self, data):
+        with file_lock(self.path):
+            with self._sync_lock:
+                signature = self._signature
+                base = self._base_records()
+
+            current = file_signature(self.path)
+            if current is not None and current != signature:
+                # Outro processo gravou depois da nossa última sincronização
+                theirs = self._read()[0].get("softwares", [])
+                ensure_ids(theirs)
+                merged, self.last_conflicts = merge_records(base, data.get("softwares", []), theirs)
+                write_json_atomic(self.path, dict(data, softwares=merged))
+                with self._sync_lock:
+                    self._memory_is_file = False
+                self.ids_assigned = 0
+                # A base continua a antiga: a agenda aberta ainda precisa
+                # incorporar a parte dos outros (ver poll_external)
+                return
+
+            write_json_atomic(self.path, data)
+            with self._sync_lock:
+                self._set_base(file_signature(self.path), records=data.get("softwares", []))
+                self._memory_is_file = True
+            self.ids_assigned = 0
+
+    def iter_records(self):
+        """Percorre os registros sem carregar o arquivo inteiro (somente leitura).
+
+        Os registros saem como estão no arquivo: os sem id não recebem um.
+        """
+        from json_stream import iter_file_array
+
+        for path in (self.path, self.default_path):
+            if os.path.exists(path):
+                yield from iter_file_array(path, "softwares")
+                return
+
+    def poll_external(self):
+        """Confere (só com um stat) se outro processo gravou o arquivo.
+
+        Retorna None se nada mudou; senão (base, registros do arquivo,
+        assinatura, texto) para mesclar com merge_records e depois
+        confirmar com mark_synced(assinatura, texto).
+        """
+        current = file_signature(self.path)
+        with self._sync_lock:
+            if current is None or current == self._signature:
+                return None
+            base = self._base_records()
+        data, text, signature = self._read()
+        records = data.get("softwares", [])
+        if ensure_ids(records):
+            text = None  # ids criados agora: a base passa a ser a cópia dos registros
+        return base, records, signature, text
+
+    def write_snapshot(self, data):
+        """Atualiza a cópia binária com 'data', se o arquivo ainda é a nossa última gravação.
+
+        Chamado ao fechar o editor, com a fila de gravação vazia, para que a
+        próxima abertura não precise interpretar o JSON. Depois de uma
+        mesclagem com alterações de fora (poll_external), a memória pode ter
+        ficado diferente do arquivo (conflitos mantidos na versão local): aí
+        a cópia sai do texto lido agora, não de 'data'.
+        """
+        with self._sync_lock:
+            signature = self._signature
+            memory_is_file = self._memory_is_file
+        if signature is None or signature[1] < SNAPSHOT_MIN_BYTES:
+            return
+        import snapshot_cache
+
+        try:
+            with open(self.path, "rb") as f:
+                text = f.read()
+        except OSError:
+            return
+        if file_signature(self.path) != signature:
+            return
+        if not memory_is_file:
+            data = json.loads(text)
+            if ensure_ids(data.get("softwares", [])):
+                return  # arquivo sem ids: a cópia inventaria ids que ele não tem
+        snapshot_cache.store(self.path, signature, text, data)
+
+    def sync_state(self):
+        """(assinatura, texto) da última sincronização, para repassar a outro JsonBackend."""
+        with self._sync_lock:
+            return self._signature, self._base_text
+
+    def mark_synced(self, signature, text=None, records=None, memory_is_file=False):
+        """Passa a usar o arquivo com 'signature' como base de mesclagem.
+
+        memory_is_file diz se os dados em memória são exatamente os do
+        arquivo (carga feita em outro processo); depois de uma mesclagem não
+        são, e write_snapshot relê o arquivo.
+        """
+        with self._sync_lock:
+            self._memory_is_file = memory_is_file
+            if text is not None:
+                self._set_base(signature, text=text)
+            else:
+                self._set_base(signature, records=records or [])
+
+    def apply_changes(self, data, changes):
+        """Aplica um lote de alterações; no JSON isso é uma única regravação."""
+        self.save(snapshot_data(data))
+
+    def insert_record(self, data, record):
+        self.save(data)
+
+    def update_record(self, data, record):
+        self.save(data)
+
+    def delete_record(self, data, record):
+        # 'record' já foi retirado de data["softwares"] pelo chamador
+        self.save(data)
+
+# ====================================================
+# Backend SQLite (indexado, atualiza uma linha por vez)
+# ====================================================
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS softwares (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT,
+    nome TEXT,
+    validade TEXT,
+    ativacao TEXT,
+    usuario TEXT,
+    numero_licencas TEXT,
+    renovacao TEXT,
+    extra TEXT
+);
+"""
+
+_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_softwares_id ON softwares(id);
+CREATE INDEX IF NOT EXISTS idx_softwares_nome ON softwares(nome);
+CREATE INDEX IF NOT EXISTS idx_softwares_validade ON softwares(validade);
+"""
+
+# Colunas gravadas, na ordem de _to_row
+_COLUMNS = ("id",) + FIELDS + ("extra",)
+
+class SqliteBackend:
+    """Guarda cada software como uma linha de uma tabela SQLite.
+
+    Os registros continuam sendo dicts comuns; a coluna "id" guarda o
+    identificador persistente, usado para alterar só a linha do registro.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._schema_ready = False
+        self.ids_assigned = 0  # linhas sem id na carga; o id só é gravado pelo editor
+
+    @property
+    def path(self):
+        return self._path or DB_PATH
+
+    def _connect(self):
+        import sqlite3
+
+        # Uma conexão por operação: o backend pode ser usado de outra thread
+        conn = sqlite3.connect(self.path)
+        if not self._schema_ready:
+            conn.executescript(_SCHEMA)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(softwares)")}
+            if "id" not in columns:
+                # Bancos criados antes da coluna id
+                conn.execute("ALTER TABLE softwares ADD COLUMN id TEXT")
+            conn.executescript(_INDEXES)
+            self._schema_ready = True
+        return conn
+
+    @staticmethod
+    def _to_row(record):
+        extra = {k: v for k, v in record.items() if k not in FIELDS and k != "id"}
+        values = [record_key(record)]
+        values += [record.get(field) for field in FIELDS]
+        values.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+        return values
+
+    @staticmethod
+    def _from_row(row):
+        record = {"id": row[0]} if row[0] is not None else {}
+        record.update((field, value) for field, value in zip(FIELDS, row[1:]) if value is not None)
+        extra = row[len(FIELDS) + 1]
+        if extra:
+            record.update(json.loads(extra))
+        return record
+
+    def load(self):
+        columns = ", ".join(_COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            rows = conn.execute(f"SELECT rowid, {columns} FROM softwares ORDER BY rowid").fetchall()
+        softwares = [self._from_row(row[1:]) for row in rows]
+        # Linhas antigas sem id recebem um em memória; save() as regrava com ele
+        self.ids_assigned = ensure_ids(softwares)
+        return {"softwares": softwares}
+
+    def save(self, data):
+        records = data.get("softwares", [])
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        columns = ", ".join(_COLUMNS)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM softwares")
+            conn.executemany(
+                f"INSERT INTO softwares ({columns}) VALUES ({placeholders})",
+                (self._to_row(record) for record in records),
+            )
+        self.ids_assigned = 0
+
+    def apply_changes(self, data, changes):
+        """Aplica um lote de (operação, registro) em uma única transação."""
+        if any(op == "save" for op, _ in changes):
+            self.save(snapshot_data(data))
+            return
+
+        with closing(self._connect()) as conn, conn:
+            for op, record in changes:
+                if op == "insert":
+                    self._insert(conn, record)
+                elif op == "update":
+                    self._update(conn, record)
+                elif op == "delete":
+                    self._delete(conn, record)
+
+    def _insert(self, conn, record):
+        placeholders = ", ".join("?" * len(_COLUMNS))
+        columns = ", ".join(_COLUMNS)
+        conn.execute(
+            f"INSERT OR REPLACE INTO softwares ({columns}) VALUES ({placeholders})",
+            self._to_row(dict(record)),
+        )
+
+    def _update(self, conn, record):
+        row = self._to_row(dict(record))
+        assignments = ", ".join(f"{column} = ?" for column in _COLUMNS[1:])
+        cur = conn.execute(
+            f"UPDATE softwares SET {assignments} WHERE id = ?",
+            row[1:] + [row[0]],
+        )
+        if cur.rowcount == 0:
+            self._insert(conn, record)
+
+    def _delete(self, conn, record):
+        conn.execute("DELETE FROM softwares WHERE id = ?", (record_key(record),))
+
+    def insert_record(self, data, record):
+        with closing(self._connect()) as conn, conn:
+            self._insert(conn, record)
+
+    def update_record(self, data, record):
+        with closing(self._connect()) as conn, conn:
+            self._update(conn, record)
+
+    def delete_record(self, data, record):
+        with closing(self._connect()) as conn, conn:
+            self._delete(conn, record)
+
+    def iter_records(self):
+        """Percorre os registros linha a linha, sem montar a lista inteira."""
+        columns = ", ".join(_COLUMNS)
+        with closing(self._connect()) as conn:
+            for row in conn.execute(f"SELECT {columns} FROM softwares ORDER BY rowid"):
+                yield self._from_row(row)
+
+    def count(self):
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM softwares").fetchone()[0]
+
+# ====================================================
+# Backend em diário (só as alterações, em JSON lines)
+# ====================================================
+JOURNAL_PATH = "software_agenda.jsonl"
+
+# Acima deste tamanho o diário é incorporado a uma nova cópia completa
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+
+_MISSING = object()
+
+def change_entry(before, after):
+    """Alteração de um registro como ela vai para o diário.
+
+    before/after: cópias do registro antes e depois (None na inclusão e na
+    remoção). O diário acrescenta seq, data, usuário e sessão.
+    """
+    record = after if after is not None else before
+    op = "insert" if before is None else "delete" if after is None else "update"
+    return {"op": op, "id": record["id"], "antes": before, "depois": after}
+
+def invert_change(change):
+    """A alteração que desfaz 'change'."""
+    return change_entry(change["depois"], change["antes"])
+
+def apply_change(records, change):
+    """Aplica uma alteração do diário a {id: registro}, sem alterar os dicts existentes.
+
+    Numa alteração só os campos que mudaram são aplicados: duas pessoas que
+    alteram campos diferentes do mesmo registro não se sobrescrevem.
+    """
+    key = change["id"]
+    before, after = change["antes"], change["depois"]
+    if after is None:
+        records.pop(key, None)
+        return
+    current = records.get(key)
+    if current is None or before is None:
+        records[key] = dict(after)
+        return
+    updated = dict(current)
+    for field, value in after.items():
+        if before.get(field, _MISSING) != value:
+            updated[field] = value
+    for field in before:
+        if field not in after:
+            updated.pop(field, None)
+    records[key] = updated
+
+def _read_journal(path, offset=0):
+    """(linhas a partir de 'offset', posição após a última linha completa, inode).
 
-    # se não existir, carrega o default
-    if os.path.exists(DEFAULT_PATH):
-        with open(DEFAULT_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
+    Uma linha incompleta no fim (gravação interrompida) fica para depois;
+    linhas que não são JSON válido são ignoradas.
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [], 0, None
+    with f:
+        inode = os.fstat(f.fileno()).st_ino
+        f.seek(offset)
+        chunk = f.read()
+    end = chunk.rfind(b"\n") + 1
+    entries = []
+    for line in chunk[:end].splitlines():
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            continue
+    return entries, offset + end, inode
 
-    return {"softwares": []}
+def _iter_journal(path):
+    """Linhas de um diário uma a uma (para o histórico, que pode ser grande)."""
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            if line.endswith(b"\n"):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+def _current_user():
+    import getpass
+
+    try:
+        return getpass.getuser()
+    except (OSError, KeyError, ImportError):
+        return ""
+
+class JournalBackend:
+    """Grava cada alteração como uma linha no fim de um diário (JSON lines).
+
+    Incluir, alterar ou remover um registro acrescenta ao diário uma linha
+    com o registro antes e depois: a gravação é do tamanho da alteração, não
+    da agenda. A agenda é a última cópia completa (".snapshot.json") mais as
+    linhas gravadas depois dela. Quando o diário passa de
+    JOURNAL_COMPACT_BYTES, e ao fechar o editor, as linhas são incorporadas a
+    uma cópia nova e movidas para o histórico (".historico.jsonl"), que só é
+    lido pela auditoria (history_since).
+
+    Na primeira abertura a agenda vem do arquivo JSON de mesmo nome. Várias
+    pessoas podem gravar no mesmo diário: a escrita é feita sob file_lock()
+    e poll_external() lê só as linhas novas gravadas pelos outros.
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._lock = threading.Lock()
+        self._session = new_record_id()  # marca as linhas gravadas por este processo
+        self._state = {}         # id -> registro, como no diário até _position
+        self._position = (None, 0)  # (inode, bytes) do diário já incorporados a _state
+        self._seq = 0            # seq da última linha conhecida
+        self._own = []           # linhas nossas gravadas depois de linhas de outros ainda não lidas
+        self._loaded = False     # _state só vale depois de load()
+
+    @property
+    def path(self):
+        return self._path or JOURNAL_PATH
+
+    def _sibling(self, suffix):
+        base = self.path[:-len(".jsonl")] if self.path.endswith(".jsonl") else self.path
+        return base + suffix
+
+    @property
+    def snapshot_path(self):
+        return self._sibling(".snapshot.json")
+
+    @property
+    def history_path(self):
+        return self._sibling(".historico.jsonl")
+
+    @property
+    def seed_path(self):
+        return self._sibling(".json")
+
+    # ---------- Leitura ----------
+    def _disk_position(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return (None, 0)
+        return (st.st_ino, st.st_size)
+
+    def _replay(self):
+        """(estado, seq, posição) lidos do disco, ou None se o diário ainda não existe."""
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+        entries, offset, inode = _read_journal(self.path)
+        if snapshot is None and inode is None:
+            return None
+
+        snapshot = snapshot or {}
+        state = {r["id"]: r for r in snapshot.get("softwares", [])}
+        seq = snapshot.get("seq", 0)
+        for entry in entries:
+            # Linhas já incorporadas à cópia (compactação interrompida no meio)
+            if entry.get("seq", 0) <= seq:
+                continue
+            apply_change(state, entry)
+            seq = entry["seq"]
+        return state, seq, (inode, offset)
+
+    def _seed(self):
+        """Cria a cópia inicial a partir do arquivo JSON (ou do padrão)."""
+        data = JsonBackend(self.seed_path).load()
+        state = {record_key(r): r for r in data.get("softwares", [])}
+        try:
+            self._write_snapshot(list(state.values()), 0)
+            open(self.path, "ab").close()
+        except OSError:
+            pass  # somente leitura: a agenda vale só nesta execução
+        return state, 0, self._disk_position()
+
+    def load(self):
+        with self._lock:
+            replayed = self._replay() or self._seed()
+            self._state, self._seq, self._position = replayed
+            self._own = []
+            self._loaded = True
+            return {"softwares": [dict(r) for r in self._state.values()]}
+
+    def iter_records(self):
+        """Registros da cópia mais o diário, sem alterar o estado deste backend."""
+        replayed = self._replay()
+        if replayed is None:
+            yield from JsonBackend(self.seed_path).iter_records()
+            return
+        yield from replayed[0].values()
+
+    # ---------- Gravação ----------
+    def _known(self):
+        """Estado que já gravamos: o incorporado mais as nossas linhas pendentes."""
+        if not self._own:
+            return self._state
+        known = dict(self._state)
+        for entry in self._own:
+            apply_change(known, entry)
+        return known
+
+    def _last_seq_on_disk(self):
+        """Maior seq gravado, lendo só o que os outros acrescentaram ao diário."""
+        inode, offset = self._position
+        if self._disk_position()[0] == inode:
+            entries = _read_journal(self.path, offset)[0]
+            seqs = [self._seq]
+        else:
+            # Diário compactado por outro processo: a cópia nova diz onde ele parou
+            entries = _read_journal(self.path)[0]
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                seqs = [self._seq, json.load(f).get("seq", 0)]
+        return max(seqs + [entry.get("seq", 0) for entry in entries])
+
+    def apply_changes(self, data, changes):
+        """Acrescenta ao diário uma linha por registro que mudou no lote."""
+        if not self._loaded:
+            # Sem o estado, uma remoção não teria o "antes" e sumiria sem
+            # linha no diário, e alterações seriam gravadas como inclusões
+            raise RuntimeError(f"o diário {self.path} precisa ser carregado (load) antes de gravar")
+        with file_lock(self.path):
+            with self._lock:
+                known = self._known()
+                batch = {}  # id -> registro (ou None) depois das alterações do lote
+
+                def current(key):
+                    return batch[key] if key in batch else known.get(key)
+
+                entries = []
+                for op, record in changes:
+                    if op == "save":
+                        pairs = self._diff(current, known, batch, data.get("softwares", []))
+                    else:
+                        key = record_key(record)
+                        pairs = [(key, None if op == "delete" else dict(record))]
+                    for key, after in pairs:
+                        before = current(key)
+                        if before != after:
+                            entries.append(change_entry(before, after))
+                            batch[key] = after
+                if entries:
+                    self._append(entries)
+
+    @staticmethod
+    def _diff(current, known, batch, records):
+        """(id, registro ou None) de tudo o que difere entre 'records' e o gravado."""
+        pairs = []
+        seen = set()
+        for record in list(records):
+            key = record_key(record)
+            seen.add(key)
+            pairs.append((key, dict(record)))
+        for key in list(known) + list(batch):
+            if key not in seen and current(key) is not None:
+                seen.add(key)
+                pairs.append((key, None))
+        return pairs
+
+    def _append(self, changes):
+        external = self._disk_position() != self._position
+        seq = self._last_seq_on_disk() if external else self._seq
+        stamp = datetime.datetime.now().isoformat(timespec="seconds")
+        user = _current_user()
+
+        entries = []
+        for change in changes:
+            seq += 1
+            entries.append(dict(seq=seq, quando=stamp, usuario=user, sessao=self._session, **change))
+        payload = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+
+        with open(self.path, "a+b") as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    payload = b"\n" + payload  # isola uma linha incompleta deixada por uma queda
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+            end = f.tell()
+            inode = os.fstat(f.fileno()).st_ino
+
+        self._seq = seq
+        if external:
+            # Há linhas de outros antes das nossas: tudo entra no próximo poll_external
+            self._own.extend(entries)
+            return
+        for entry in entries:
+            apply_change(self._state, entry)
+        self._position = (inode, end)
+        if end >= JOURNAL_COMPACT_BYTES:
+            try:
+                self._compact()
+            except OSError:
+                pass  # as linhas já estão gravadas; compacta na próxima vez
+
+    def save(self, data):
+        self.apply_changes(data, [("save", None)])
+
+    def insert_record(self, data, record):
+        self.apply_changes(data, [("insert", record)])
+
+    def update_record(self, data, record):
+        self.apply_changes(data, [("update", record)])
+
+    def delete_record(self, data, record):
+        self.apply_changes(data, [("delete", record)])
+
+    # ---------- Compactação ----------
+    def _write_snapshot(self, records, seq):
+        write_json_atomic(self.snapshot_path, {"seq": seq, "softwares": records})
+
+    def _compact(self):
+        """Cópia nova com todo o diário; as linhas vão para o histórico.
+
+        Só compacta quando o diário não tem linhas de outros ainda não lidas.
+        A ordem (cópia, histórico, diário vazio) permite retomar de uma queda
+        em qualquer ponto: linhas com seq já incluído na cópia são ignoradas.
+        """
+        inode, offset = self._position
+        if self._own or offset == 0 or self._disk_position() != self._position:
+            return False
+        self._write_snapshot(list(self._state.values()), self._seq)
+        with open(self.path, "rb") as f:
+            compacted = f.read(offset)
+        with open(self.history_path, "ab") as f:
+            f.write(compacted)
+            f.flush()
+            os.fsync(f.fileno())
+        # Um diário novo (outro inode): os demais processos percebem e releem
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        open(tmp_path, "wb").close()
+        os.replace(tmp_path, self.path)
+        self._position = self._disk_position()
+        return True
+
+    def compact(self):
+        with file_lock(self.path):
+            with self._lock:
+                return self._compact()
+
+    def write_snapshot(self, data):
+        """Chamado ao fechar o editor: incorpora o diário à cópia completa."""
+        try:
+            self.compact()
+        except OSError:
+            pass  # fica para a próxima vez
+
+    # ---------- Alterações de outros processos ----------
+    def poll_external(self):
+        """Confere (só com um stat) se outro processo acrescentou linhas ao diário.
+
+        Retorna None se nada mudou; senão (base, registros atuais, marca, None)
+        para mesclar com merge_records e depois confirmar com mark_synced(marca).
+        """
+        position = self._disk_position()
+        with self._lock:
+            if position == self._position:
+                return None
+            inode, offset = self._position
+            base = dict(self._known())
+            theirs = dict(self._state)
+            seq = self._seq
+
+        if position[0] == inode:
+            entries, end, inode = _read_journal(self.path, offset)
+            for entry in entries:
+                apply_change(theirs, entry)
+                seq = max(seq, entry.get("seq", 0))
+            mark = (theirs, seq, (inode, end))
+        else:
+            replayed = self._replay()
+            if replayed is None:
+                return None
+            mark = replayed
+        return base, list(mark[0].values()), mark, None
+
+    def mark_synced(self, signature, text=None, records=None):
+        state, seq, position = signature
+        with self._lock:
+            self._state = state
+            self._position = position
+            self._seq = max(self._seq, seq)
+            # Linhas nossas gravadas depois da leitura continuam pendentes
+            self._own = [entry for entry in self._own if entry["seq"] > seq]
+
+    # ---------- Auditoria ----------
+    def history_since(self, since):
+        """Alterações gravadas a partir de 'since' (data), do histórico e do diário."""
+        stamp = since.isoformat()
+        seen = set()
+        for path in (self.history_path, self.path):
+            for entry in _iter_journal(path):
+                seq = entry.get("seq")
+                if seq in seen or entry.get("quando", "") < stamp:
+                    continue
+                seen.add(seq)
+                yield entry
+
+_OP_LABELS = {"insert": "incluiu", "update": "alterou", "delete": "removeu"}
+
+def describe_change(entry):
+    """Uma linha legível de uma alteração do diário (para a auditoria)."""
+    before, after = entry.get("antes") or {}, entry.get("depois") or {}
+    nome = after.get("nome") or before.get("nome") or entry.get("id", "")
+    when = entry.get("quando", "").replace("T", " ")
+    text = f"{when}  {entry.get('usuario') or '?'}  {_OP_LABELS.get(entry.get('op'), entry.get('op'))} '{nome}'"
+    if entry.get("op") == "update":
+        fields = [k for k in list(before) + [k for k in after if k not in before]
+                  if before.get(k) != after.get(k)]
+        text += ": " + "; ".join(f"{k}: {before.get(k, '')} → {after.get(k, '')}" for k in fields)
+    return text
+
+# ====================================================
+# Seleção do backend ativo
+# ====================================================
+_backend = None
+
+def get_backend():
+    """Retorna o backend ativo.
+
+    AGENDA_BACKEND=json|sqlite|journal força a escolha; sem a variável, o
+    SQLite ou o diário são usados quando o banco ou o diário já existem
+    (por exemplo, depois de migrar).
+    """
+    global _backend
+    if _backend is None:
+        choice = os.environ.get("AGENDA_BACKEND", "").lower()
+        if choice == "sqlite" or (not choice and os.path.exists(DB_PATH)):
+            _backend = SqliteBackend()
+        elif choice == "journal" or (not choice and os.path.exists(JOURNAL_PATH)):
+            _backend = JournalBackend()
+        else:
+            _backend = JsonBackend()
+    return _backend
+
+def set_backend(backend):
+    """Troca o backend ativo (None volta para a seleção automática)."""
+    global _backend
+    _backend = backend
+
+def load_data():
+    """Carrega os dados da agenda do backend ativo."""
+    with PROFILER.stage("load"):
+        return get_backend().load()
+
+def iter_records():
+    """Registros do backend ativo, um por vez (para agendas muito grandes)."""
+    return get_backend().iter_records()
 
 def save_data(data):
-    """Salva os dados da agenda em um arquivo JSON."""
-    with open(FILE_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=4, ensure_ascii=False)
\ No newline at end of file
+    """Salva a agenda inteira no backend ativo."""
+    with PROFILER.stage("save"):
+        get_backend().save(data)
+
+def insert_record(data, record):
+    """Persiste um registro recém-adicionado a data["softwares"]."""
+    get_backend().insert_record(data, record)
+
+def update_record(data, record):
+    """Persiste a alteração de um único registro."""
+    get_backend().update_record(data, record)
+
+def delete_record(data, record):
+    """Persiste a remoção de um registro já retirado de data["softwares"]."""
+    get_backend().delete_record(data, record)
+
+# ====================================================
+# Fila de gravação em segundo plano
+# ====================================================
+class SaveQueue:
+    """Grava as alterações da interface em uma thread separada.
+
+    As alterações enviadas em sequência são agrupadas por registro e gravadas
+    juntas depois de 'delay' segundos sem novas alterações (ou, no máximo,
+    'max_delay' segundos depois da primeira pendente).
+    """
+
+    def __init__(self, backend=None, delay=0.4, max_delay=2.0):
+        self.backend = backend or get_backend()
+        self.delay = delay
+        self.max_delay = max_delay
+
+        self.last_flush_ms = None
+        self.flush_count = 0
+        self.last_error = None
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._data = None
+        self._pending = {}  # record_key -> (operação, registro), na ordem de chegada
+        self._first_change = None
+        self._last_change = None
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._run, name="agenda-save-queue", daemon=True)
+        self._thread.start()
+
+    @property
+    def pending_count(self):
+        return len(self._pending)
+
+    # ---------- Envio de alterações ----------
+    def insert(self, data, record):
+        self._submit("insert", data, record)
+
+    def update(self, data, record):
+        self._submit("update", data, record)
+
+    def delete(self, data, record):
+        self._submit("delete", data, record)
+
+    def save(self, data):
+        """Agenda uma regravação completa (ex.: alterações em lote)."""
+        self._submit("save", data, None)
+
+    def update_many(self, data, records):
+        """Agenda a gravação de vários registros alterados, no mesmo lote."""
+        self._submit_many("update", data, records)
+
+    def delete_many(self, data, records):
+        """Agenda a remoção de vários registros, no mesmo lote."""
+        self._submit_many("delete", data, records)
+
+    def _submit(self, op, data, record):
+        self._submit_many(op, data, [record])
+
+    def _submit_many(self, op, data, records):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("A fila de gravação já foi encerrada")
+            self._data = data
+            for record in records:
+                self._enqueue(op, record)
+
+            now = time.monotonic()
+            if self._first_change is None:
+                self._first_change = now
+            self._last_change = now
+        self._wake.set()
+
+    def _enqueue(self, op, record):
+        key = "save" if record is None else record_key(record)
+        previous = self._pending.get(key)
+        if previous is not None:
+            op = self._coalesce(previous[0], op)
+        # Reinsere no fim para manter a ordem da última alteração
+        self._pending.pop(key, None)
+        if op is not None:
+            self._pending[key] = (op, record)
+        # op None: inserido e removido antes de chegar ao disco, nada a gravar
+
+    @staticmethod
+    def _coalesce(previous, op):
+        if previous == "insert" and op == "delete":
+            return None
+        if previous == "insert":
+            return "insert"
+        return op
+
+    # ---------- Gravação ----------
+    def _run(self):
+        while True:
+            self._wake.wait()
+            with self._lock:
+                if self._closed:
+                    return
+                if not self._pending:
+                    self._wake.clear()
+                    continue
+                now = time.monotonic()
+                wait = min(
+                    self._last_change + self.delay - now,
+                    self._first_change + self.max_delay - now,
+                )
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            if not self.flush():
+                # Falhou (arquivo bloqueado, disco cheio...): tenta de novo mais tarde
+                time.sleep(self.max_delay)
+
+    def flush(self):
+        """Grava imediatamente tudo o que estiver pendente.
+
+        Retorna True se a gravação terminou sem erro.
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return self.last_error is None
+                data = self._data
+                batch = self._pending
+                self._pending = {}
+                self._first_change = None
+
+            start = time.perf_counter()
+            try:
+                self.backend.apply_changes(data, list(batch.values()))
+            except Exception as e:
+                # Devolve o lote para a fila; alterações mais novas têm prioridade
+                with self._lock:
+                    for key, change in batch.items():
+                        if key not in self._pending:
+                            self._pending[key] = change
+                    if self._first_change is None:
+                        self._first_change = time.monotonic()
+                self.last_error = e
+                return False
+
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            if PROFILER.enabled:
+                PROFILER.record("save", self.last_flush_ms)
+            self.flush_count += 1
+            self.last_error = None
+            return True
+
+    def close(self):
+        """Grava o que estiver pendente e encerra a thread de gravação."""
+        ok = self.flush()
+        with self._lock:
+            self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        return ok
+
+# ====================================================
+# Migração JSON -> SQLite
+# ====================================================
+def migrate_json_to_sqlite(json_path=None, db_path=None, overwrite=False):
+    """Copia a agenda do arquivo JSON para o banco SQLite.
+
+    Retorna o número de registros migrados. Se o banco já tiver dados,
+    só sobrescreve com overwrite=True.
+    """
+    source = JsonBackend(json_path)
+    target = SqliteBackend(db_path)
+
+    if not os.path.exists(source.path):
+        raise FileNotFoundError(f"Arquivo JSON não encontrado: {source.path}")
+    if target.count() and not overwrite:
+        raise FileExistsError(f"O banco {target.path} já possui registros (use --sobrescrever)")
+
+    data = source.load()
+    target.save(data)
+    if source.ids_assigned:
+        source.save(data)  # o JSON fica com os mesmos ids do banco
+    return len(data.get("softwares", []))
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Utilitários de armazenamento da agenda")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    migrar = sub.add_parser("migrar", help="Migra o arquivo JSON para o banco SQLite")
+    migrar.add_argument("--json", default=FILE_PATH, help="Arquivo JSON de origem")
+    migrar.add_argument("--db", default=DB_PATH, help="Banco SQLite de destino")
+    migrar.add_argument("--sobrescrever", action="store_true", help="Substitui os dados já existentes no banco")
+
+    diario = sub.add_parser("diario", help="Passa a gravar a agenda JSON em diário (só as alterações)")
+    diario.add_argument("--diario", default=JOURNAL_PATH,
+                        help="Diário a criar; a cópia inicial vem do .json de mesmo nome")
+
+    auditoria = sub.add_parser("auditoria", help="Lista as alterações gravadas no diário")
+    auditoria.add_argument("--since", required=True, metavar="DATA",
+                           help="Alterações a partir desta data (YYYY-MM-DD ou DD-MM-YYYY)")
+    auditoria.add_argument("--diario", default=JOURNAL_PATH, help="Diário a consultar")
+    auditoria.add_argument("--format", choices=("text", "json"), default="text")
+
+    args = parser.parse_args()
+    if args.comando == "migrar":
+        try:
+            total = migrate_json_to_sqlite(args.json, args.db, overwrite=args.sobrescrever)
+        except (FileNotFoundError, FileExistsError) as e:
+            parser.exit(1, f"Erro: {e}\n")
+        print(f"{total} registros migrados de {args.json} para {args.db}")
+    elif args.comando == "diario":
+        backend = JournalBackend(args.diario)
+        if os.path.exists(backend.path):
+            parser.exit(1, f"Erro: o diário {backend.path} já existe\n")
+        total = len(backend.load()["softwares"])
+        if not os.path.exists(backend.path):
+            parser.exit(1, f"Erro: não foi possível criar {backend.path}\n")
+        print(f"{total} registros de {backend.seed_path} copiados para {backend.snapshot_path}; "
+              f"as alterações passam a ser gravadas em {backend.path}")
+    elif args.comando == "auditoria":
+        from date_parser import parse_any
+
+        since = parse_any(args.since)
+        if since is None:
+            parser.exit(2, f"Erro: data inválida: {args.since}\n")
+        entries = JournalBackend(args.diario).history_since(since)
+        if args.format == "json":
+            json.dump(list(entries), sys.stdout, ensure_ascii=False, indent=2)
+            print()
+        else:
+            for entry in entries:
+                print(describe_change(entry))
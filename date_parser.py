@@ -0,0 +1,80 @@
+# Interpretação das datas de validade, compartilhada pelo editor e pela verificação
+
+import datetime
+from functools import lru_cache
+
+ISO_FMT = "%Y-%m-%d"
+BR_FMT = "%d-%m-%Y"
+
+# Datas distintas de uma agenda costumam ser poucas e muito repetidas
+MEMO_SIZE = 8192
+
+def _fixed(s, year, month, day):
+    """Lê uma data de largura fixa a partir das fatias informadas.
+
+    Retorna None quando os campos não são dígitos ASCII (o chamador então
+    recorre ao strptime) e False quando a data não existe.
+    """
+    y, m, d = s[year], s[month], s[day]
+    if not (y.isdigit() and m.isdigit() and d.isdigit() and s.isascii()):
+        return None
+    try:
+        return datetime.date(int(y), int(m), int(d))
+    except ValueError:
+        return False
+
+def _strptime(s, fmt):
+    try:
+        return datetime.datetime.strptime(s, fmt).date()
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=MEMO_SIZE)
+def parse_iso(s):
+    """YYYY-MM-DD -> date (None se inválida)."""
+    if len(s) == 10 and s[4] == "-" and s[7] == "-":
+        d = _fixed(s, slice(0, 4), slice(5, 7), slice(8, 10))
+        if d is not None:
+            return d or None
+    # Mesmas regras do strptime para o que não tem largura fixa ("2026-1-5")
+    return _strptime(s, ISO_FMT)
+
+@lru_cache(maxsize=MEMO_SIZE)
+def parse_br(s):
+    """DD-MM-YYYY -> date (None se inválida)."""
+    if len(s) == 10 and s[2] == "-" and s[5] == "-":
+        d = _fixed(s, slice(6, 10), slice(3, 5), slice(0, 2))
+        if d is not None:
+            return d or None
+    return _strptime(s, BR_FMT)
+
+def parse_any(s):
+    """Tenta os formatos ISO (YYYY-MM-DD) e BR (DD-MM-YYYY), nessa ordem."""
+    return parse_iso(s) or parse_br(s)
+
+def to_ordinals(values, parse=parse_iso):
+    """Converte uma coluna de strings em ordinais (0 para data inválida)."""
+    result = []
+    append = result.append
+    for s in values:
+        d = parse(s)
+        append(d.toordinal() if d else 0)
+    return result
+
+def add_months(d, months):
+    """Soma meses a uma data; o dia é limitado ao fim do mês (31/01 + 1 -> 28/02)."""
+    import calendar  # só o editor usa; a verificação não paga a importação
+
+    total = d.year * 12 + d.month - 1 + months
+    year, month = divmod(total, 12)
+    month += 1
+    if not 1 <= year <= 9999:
+        raise ValueError("data fora do intervalo suportado")
+    day = min(d.day, calendar.monthrange(year, month)[1])
+    return datetime.date(year, month, day)
+
+def to_iso_string(d):
+    return d.strftime(ISO_FMT)
+
+def to_br_string(d):
+    return d.strftime(BR_FMT)
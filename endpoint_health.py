@@ -0,0 +1,239 @@
+# Verificação dos servidores de licença e portais de ativação (campo "ativacao")
+
+import asyncio
+import re
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 3.0      # segundos por alvo
+DEFAULT_CONCURRENCY = 256  # conexões abertas ao mesmo tempo
+DEFAULT_TTL = 300.0        # segundos até um resultado precisar ser refeito
+
+# host:porta, [ipv6]:porta ou porta@host (notação dos servidores FlexLM)
+_HOST_PORT = re.compile(r"^(?:\[(?P<v6>[0-9A-Fa-f:.]+)\]|(?P<host>[A-Za-z0-9.-]+)):(?P<port>\d{1,5})$")
+_PORT_AT_HOST = re.compile(r"^(?P<port>\d{1,5})@(?P<host>[A-Za-z0-9.-]+)$")
+
+class Target:
+    """Um endereço verificável: TCP (host, porta) ou HTTP(S) (url)."""
+
+    __slots__ = ("kind", "host", "port", "url")
+
+    def __init__(self, kind, host, port, url=None):
+        self.kind = kind
+        self.host = host
+        self.port = port
+        self.url = url
+
+    @property
+    def key(self):
+        if self.kind == "http":
+            return self.url
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        return f"{host}:{self.port}"
+
+    def __eq__(self, other):
+        return isinstance(other, Target) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return f"Target({self.key!r})"
+
+def parse_target(ativacao):
+    """Alvo verificável de um campo "ativacao", ou None (chave, texto, IP sem porta)."""
+    text = (ativacao or "").strip()
+    if not text or " " in text:
+        return None
+    lowered = text.lower()
+    if lowered.startswith(("http://", "https://")):
+        parts = urlsplit(text)
+        if not parts.hostname:
+            return None
+        try:
+            port = parts.port or (443 if parts.scheme.lower() == "https" else 80)
+        except ValueError:
+            return None
+        return Target("http", parts.hostname, port, text)
+
+    match = _HOST_PORT.match(text) or _PORT_AT_HOST.match(text)
+    if not match:
+        return None
+    port = int(match.group("port"))
+    if not 0 < port < 65536:
+        return None
+    host = match.groupdict().get("v6") or match.group("host")
+    return Target("tcp", host, port)
+
+class HealthResult:
+    __slots__ = ("target", "ok", "latency_ms", "error", "checked_at")
+
+    def __init__(self, target, ok, latency_ms=None, error=None, checked_at=None):
+        self.target = target
+        self.ok = ok
+        self.latency_ms = latency_ms
+        self.error = error
+        self.checked_at = time.monotonic() if checked_at is None else checked_at
+
+    def describe(self):
+        if self.ok:
+            return f"OK ({self.latency_ms:.0f} ms)"
+        return f"Inacessível: {self.error}"
+
+    def as_dict(self):
+        return {
+            "alvo": self.target.key,
+            "ok": self.ok,
+            "latencia_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "erro": self.error,
+        }
+
+# ====================================================
+# Sondagem (asyncio)
+# ====================================================
+async def _probe_tcp(target):
+    reader, writer = await asyncio.open_connection(target.host, target.port)
+    writer.close()
+    await writer.wait_closed()
+
+async def _probe_http(target):
+    """HEAD na URL; qualquer resposta abaixo de 500 conta como acessível."""
+    parts = urlsplit(target.url)
+    context = ssl.create_default_context() if parts.scheme.lower() == "https" else None
+    reader, writer = await asyncio.open_connection(
+        target.host, target.port, ssl=context, server_hostname=target.host if context else None
+    )
+    try:
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        host = parts.netloc.rpartition("@")[2]
+        writer.write(f"HEAD {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+                     "User-Agent: agenda-softwares\r\n\r\n".encode("ascii", "ignore"))
+        await writer.drain()
+        status_line = await reader.readline()
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (OSError, ssl.SSLError):
+            pass
+    fields = status_line.decode("latin-1").split()
+    if len(fields) < 2 or not fields[0].startswith("HTTP/") or not fields[1].isdigit():
+        raise ConnectionError("resposta HTTP inválida")
+    status = int(fields[1])
+    if status >= 500:
+        raise ConnectionError(f"HTTP {status}")
+
+def _describe_error(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return "tempo esgotado"
+    if isinstance(error, ssl.SSLCertVerificationError):
+        return "certificado inválido"
+    if isinstance(error, ConnectionRefusedError):
+        return "conexão recusada"
+    return str(error) or type(error).__name__
+
+async def probe(target, timeout=DEFAULT_TIMEOUT, semaphore=None):
+    """Testa um alvo; nunca levanta exceção (o erro vai no HealthResult)."""
+    async def attempt():
+        start = time.perf_counter()
+        await asyncio.wait_for(
+            _probe_http(target) if target.kind == "http" else _probe_tcp(target), timeout
+        )
+        return (time.perf_counter() - start) * 1000
+
+    try:
+        if semaphore is None:
+            latency = await attempt()
+        else:
+            async with semaphore:
+                latency = await attempt()
+    except (OSError, asyncio.TimeoutError, ssl.SSLError, ConnectionError, ValueError) as e:
+        return HealthResult(target, False, error=_describe_error(e))
+    return HealthResult(target, True, latency)
+
+async def probe_all(targets, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+    """Testa todos os alvos em paralelo (no máximo 'concurrency' de cada vez).
+
+    Com alvos até o limite de concorrência, o tempo total é o do alvo mais
+    lento, limitado por 'timeout'.
+    """
+    unique = list(dict.fromkeys(targets))
+    semaphore = asyncio.Semaphore(concurrency)
+    results = await asyncio.gather(*(probe(t, timeout, semaphore) for t in unique))
+    return {result.target: result for result in results}
+
+def check_targets(targets, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+    """Versão síncrona de probe_all (para a verificação por linha de comando)."""
+    return asyncio.run(probe_all(targets, timeout, concurrency))
+
+def check_records(records, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY):
+    """[(registro, HealthResult)] dos registros cujo "ativacao" é verificável."""
+    targets = [(record, parse_target(record.get("ativacao", ""))) for record in records]
+    targets = [(record, target) for record, target in targets if target is not None]
+    results = check_targets([t for _, t in targets], timeout, concurrency)
+    return [(record, results[target]) for record, target in targets]
+
+# ====================================================
+# Monitor em segundo plano (editor)
+# ====================================================
+class HealthMonitor:
+    """Verifica alvos em uma thread própria, com cache por 'ttl' segundos.
+
+    status() nunca bloqueia: devolve o último resultado conhecido (ou None)
+    e agenda uma nova verificação se ele não existe ou venceu. 'generation'
+    aumenta a cada resultado novo, para a interface saber quando redesenhar.
+    Com enabled=False nada é testado e status() devolve sempre None.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, timeout=DEFAULT_TIMEOUT, concurrency=DEFAULT_CONCURRENCY,
+                 enabled=True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.generation = 0
+        self._results = {}    # Target -> HealthResult
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._loop = None
+        self._semaphore = None
+
+    def _ensure_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            threading.Thread(target=self._loop.run_forever, name="HealthMonitor", daemon=True).start()
+
+    def status(self, target):
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            result = self._results.get(target)
+            stale = result is None or now - result.checked_at > self.ttl
+            if stale and target not in self._pending:
+                self._pending.add(target)
+                self._ensure_loop()
+                asyncio.run_coroutine_threadsafe(self._check(target), self._loop)
+        return result
+
+    async def _check(self, target):
+        result = await probe(target, self.timeout, self._semaphore)
+        with self._lock:
+            self._results[target] = result
+            self._pending.discard(target)
+            self.generation += 1
+
+    def invalidate(self):
+        """Faz todos os alvos serem verificados de novo no próximo status()."""
+        with self._lock:
+            for result in self._results.values():
+                result.checked_at = float("-inf")
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
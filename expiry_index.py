@@ -0,0 +1,136 @@
+# Índice dos registros ordenado pela data de validade
+
+import bisect
+import datetime
+from data_handler import record_key
+from records import RecordCache, WARN_DAYS, LIFETIME_DATE
+from profiling import PROFILER
+
+_LIFETIME_ORDINAL = LIFETIME_DATE.toordinal()
+
+class ExpiryIndex:
+    """Mantém os registros ordenados pelo ordinal da data de validade.
+
+    As consultas por intervalo ("vencidos", "expira em até N dias",
+    "entre A e B") são duas buscas binárias mais a cópia dos k registros
+    encontrados. Datas inválidas ficam com ordinal 0 e licenças vitalícias
+    com o ordinal de 9999-12-31, então nenhuma das duas aparece nas consultas.
+
+    'ordinals', se informado, traz os ordinais já calculados na mesma ordem
+    de 'records' (cópia binária da agenda) e dispensa interpretar as datas.
+    """
+
+    def __init__(self, records=(), cache=None, ordinals=None):
+        self.cache = cache or RecordCache()
+        self._entries = []   # (ordinal, seq, chave), sempre ordenada
+        self._by_key = {}    # chave -> (entrada, registro)
+        self._next_seq = 0
+        self._load(records, ordinals)
+
+    @PROFILER.timed("parse")
+    def _load(self, records, ordinals=None):
+        if ordinals is None:
+            today = datetime.date.today()  # uma vez só: date.today() custa mais que o resto
+            ordinals = [self.cache.get(record, today).ordinal for record in records]
+        for record, ordinal in zip(records, ordinals):
+            entry = (ordinal, self._next_seq, record_key(record))
+            self._next_seq += 1
+            self._entries.append(entry)
+            self._by_key[entry[2]] = (entry, record)
+        self._entries.sort()
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ---------- Manutenção incremental ----------
+    def add(self, record):
+        key = record_key(record)
+        if key in self._by_key:
+            self.update(record)
+            return
+        entry = (self.cache.get(record).ordinal, self._next_seq, key)
+        self._next_seq += 1
+        bisect.insort(self._entries, entry)
+        self._by_key[key] = (entry, record)
+
+    def remove(self, record):
+        item = self._by_key.pop(record_key(record), None)
+        if item is None:
+            return
+        entry = item[0]
+        i = bisect.bisect_left(self._entries, entry)
+        del self._entries[i]
+
+    def update(self, record):
+        """Reposiciona um registro cuja validade pode ter mudado."""
+        key = record_key(record)
+        item = self._by_key.get(key)
+        if item is None:
+            self.add(record)
+            return
+        entry = item[0]
+        ordinal = self.cache.get(record).ordinal
+        if ordinal == entry[0]:
+            self._by_key[key] = (entry, record)
+            return
+        del self._entries[bisect.bisect_left(self._entries, entry)]
+        new_entry = (ordinal, entry[1], key)  # mantém a ordem de inserção nos empates
+        bisect.insort(self._entries, new_entry)
+        self._by_key[key] = (new_entry, record)
+
+    # ---------- Consultas ----------
+    def _range(self, first, last):
+        """Registros com ordinal entre first e last (inclusive)."""
+        lo = bisect.bisect_left(self._entries, (first,))
+        hi = bisect.bisect_left(self._entries, (last + 1,))
+        by_key = self._by_key
+        return [by_key[entry[2]][1] for entry in self._entries[lo:hi]]
+
+    def invalid(self):
+        """Registros cuja validade não é uma data reconhecida."""
+        return self._range(0, 0)
+
+    def expired(self, today=None):
+        """Registros já vencidos, do mais antigo para o mais recente."""
+        today = today or datetime.date.today()
+        return self._range(1, today.toordinal() - 1)
+
+    def expiring_within(self, days=WARN_DAYS, today=None):
+        """Registros que vencem de hoje até daqui a 'days' dias."""
+        today = today or datetime.date.today()
+        return self.between(today, today + datetime.timedelta(days=days))
+
+    def between(self, start, end):
+        """Registros com validade entre as datas start e end (inclusive)."""
+        return self._range(start.toordinal(), end.toordinal())
+
+    def next_ordinal_after(self, ordinal):
+        """Menor ordinal de validade maior que 'ordinal' (ignora vitalícios)."""
+        i = bisect.bisect_left(self._entries, (ordinal + 1,))
+        if i < len(self._entries) and self._entries[i][0] < _LIFETIME_ORDINAL:
+            return self._entries[i][0]
+        return None
+
+    def ordered(self, reverse=False):
+        """Todos os registros na ordem de validade."""
+        by_key = self._by_key
+        entries = reversed(self._entries) if reverse else self._entries
+        return [by_key[entry[2]][1] for entry in entries]
+
+    def order(self, records, reverse=False):
+        """Ordena um subconjunto dos registros indexados pela validade.
+
+        Se o subconjunto for uma fração pequena do índice, ordena só ele;
+        caso contrário percorre o índice, que já está em ordem (todos os
+        registros, sem filtro: a própria ordem do índice).
+        """
+        if len(records) == len(self._entries):
+            return self.ordered(reverse)
+        if len(records) * 16 < len(self._entries):
+            by_key = self._by_key
+            return sorted(records, key=lambda r: by_key[record_key(r)][0], reverse=reverse)
+
+        wanted = {record_key(r) for r in records}
+        by_key = self._by_key
+        entries = reversed(self._entries) if reverse else self._entries
+        return [by_key[entry[2]][1] for entry in entries if entry[2] in wanted]
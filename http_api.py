@@ -0,0 +1,275 @@
+# API HTTP local, somente leitura, para painéis e scripts consultarem a agenda
+
+import argparse
+import datetime
+import hashlib
+import json
+import sys
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from data_handler import get_backend, file_signature
+from records import RecordCache, WARN_DAYS, STATUS_OK, STATUS_WARN, STATUS_EXPIRED
+from expiry_index import ExpiryIndex
+from search_index import SearchIndex
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Situação de cada registro na resposta (como no relatório da verificação)
+_STATUS_LABELS = {
+    STATUS_OK: "ok",
+    STATUS_WARN: "proximo",
+    STATUS_EXPIRED: "vencido",
+}
+
+class BadRequest(ValueError):
+    """Parâmetro de consulta inválido (resposta 400)."""
+
+# ====================================================
+# Estado em memória
+# ====================================================
+class AgendaView:
+    """Uma versão carregada da agenda; nunca muda depois de criada.
+
+    Os índices são montados na primeira consulta que precisa deles, então
+    quem só lista os registros não paga a busca textual.
+    """
+
+    def __init__(self, data, signature, ordinals=None):
+        self.records = data.get("softwares", [])
+        self.signature = signature
+        self.cache = RecordCache()
+        self._ordinals = ordinals
+        self._lock = threading.Lock()
+        self._expiry = None
+        self._search = None
+
+    @property
+    def expiry(self):
+        with self._lock:
+            if self._expiry is None:
+                self._expiry = ExpiryIndex(self.records, self.cache, self._ordinals)
+            return self._expiry
+
+    @property
+    def search(self):
+        with self._lock:
+            if self._search is None:
+                self._search = SearchIndex(self.records)
+            return self._search
+
+    def describe(self, record, today):
+        """Registro como sai na resposta, com dias restantes e situação."""
+        with self._lock:
+            info = self.cache.get(record, today)
+        item = dict(record)
+        item["dias"] = info.days
+        item["situacao"] = _STATUS_LABELS.get(info.status, "data_invalida")
+        return item
+
+class AgendaState:
+    """Mantém a versão atual da agenda, recarregada só quando o arquivo muda."""
+
+    def __init__(self, backend=None):
+        self.backend = backend or get_backend()
+        self._lock = threading.Lock()
+        self._view = None
+
+    def current(self):
+        """AgendaView atual (um stat por chamada; relê o arquivo se ele mudou)."""
+        signature = file_signature(self.backend.path)
+        view = self._view
+        if view is not None and view.signature == signature:
+            return view
+        with self._lock:
+            # Outra thread pode ter recarregado enquanto esta esperava
+            view = self._view
+            if view is None or view.signature != signature:
+                data, signature = self._load()
+                view = AgendaView(data, signature, getattr(self.backend, "load_ordinals", None))
+                self._view = view
+            return view
+
+    def _load(self, attempts=3):
+        """(dados, assinatura do arquivo que eles representam).
+
+        A assinatura é conferida antes e depois da carga: se o arquivo mudou
+        no meio (outro processo gravou, ou a própria carga o criou), lê de
+        novo. Sem estabilizar, fica a de antes, e a próxima consulta relê.
+        """
+        for _ in range(attempts):
+            before = file_signature(self.backend.path)
+            data = self.backend.load()
+            after = file_signature(self.backend.path)
+            if before == after:
+                return data, after
+        return data, before
+
+# ====================================================
+# Consultas
+# ====================================================
+def _int_param(params, name, default, minimum=0, maximum=None):
+    values = params.get(name)
+    if not values:
+        return default
+    try:
+        value = int(values[-1])
+    except ValueError:
+        raise BadRequest(f"'{name}' deve ser um número inteiro") from None
+    if maximum is not None and not minimum <= value <= maximum:
+        raise BadRequest(f"'{name}' deve estar entre {minimum} e {maximum}")
+    if value < minimum:
+        raise BadRequest(f"'{name}' deve ser maior ou igual a {minimum}")
+    return value
+
+def _query_list(view, params, today):
+    return view.records
+
+def _query_search(view, params, today):
+    query = (params.get("q") or [""])[-1].strip()
+    if not query:
+        raise BadRequest("informe o texto da busca em 'q'")
+    return view.search.search(query)
+
+def _query_expiring(view, params, today):
+    days = _int_param(params, "dias", WARN_DAYS)
+    return view.expiry.expiring_within(days, today)
+
+def _query_expired(view, params, today):
+    return view.expiry.expired(today)
+
+# Caminho -> consulta; os parâmetros de cada uma estão no README
+ROUTES = {
+    "/softwares": _query_list,
+    "/busca": _query_search,
+    "/vencendo": _query_expiring,
+    "/vencidos": _query_expired,
+}
+
+def paginate(records, params):
+    """(página, por página, total de páginas, registros da página)."""
+    page = _int_param(params, "pagina", 1, minimum=1)
+    size = _int_param(params, "por_pagina", DEFAULT_PAGE_SIZE, minimum=1, maximum=MAX_PAGE_SIZE)
+    pages = max(1, -(-len(records) // size))
+    start = (page - 1) * size
+    return page, size, pages, records[start:start + size]
+
+def make_etag(view, path, params, today):
+    """ETag da resposta: muda com o arquivo, com o dia e com a consulta."""
+    canonical = "&".join(f"{k}={v}" for k in sorted(params) for v in params[k])
+    key = f"{view.signature}|{today.toordinal()}|{path}?{canonical}"
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+
+# ====================================================
+# Servidor
+# ====================================================
+class AgendaRequestHandler(BaseHTTPRequestHandler):
+    server_version = "AgendaSoftwares/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        route = ROUTES.get(url.path.rstrip("/") or "/")
+        if route is None:
+            self._send_json(HTTPStatus.NOT_FOUND, {"erro": "caminho desconhecido", "caminhos": sorted(ROUTES)})
+            return
+
+        params = parse_qs(url.query)
+        today = datetime.date.today()
+        try:
+            view = self.server.state.current()
+        except (OSError, ValueError) as e:
+            self._send_json(HTTPStatus.SERVICE_UNAVAILABLE, {"erro": f"agenda indisponível: {e}"})
+            return
+
+        etag = make_etag(view, url.path, params, today)
+        tags = _parse_etags(self.headers.get("If-None-Match", ""))
+        if etag in tags or "*" in tags:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
+
+        try:
+            records = route(view, params, today)
+            page, size, pages, items = paginate(records, params)
+        except BadRequest as e:
+            self._send_json(HTTPStatus.BAD_REQUEST, {"erro": str(e)})
+            return
+
+        body = {
+            "data": today.isoformat(),
+            "total": len(records),
+            "pagina": page,
+            "por_pagina": size,
+            "paginas": pages,
+            "softwares": [view.describe(r, today) for r in items],
+        }
+        self._send_json(HTTPStatus.OK, body, etag)
+
+    def _send_json(self, status, body, etag=None):
+        payload = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+def _parse_etags(header):
+    if header.strip() == "*":
+        return {"*"}
+    # Aceita também a forma fraca (W/"...") enviada por alguns proxies
+    return {tag.strip().removeprefix("W/") for tag in header.split(",") if tag.strip()}
+
+class AgendaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state, quiet=False):
+        super().__init__(address, AgendaRequestHandler)
+        self.state = state
+        self.quiet = quiet
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API HTTP somente leitura da agenda de softwares")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help=f"Endereço de escuta (padrão: {DEFAULT_HOST}, só esta máquina)")
+    parser.add_argument("--porta", type=int, default=DEFAULT_PORT,
+                        help=f"Porta (padrão: {DEFAULT_PORT})")
+    parser.add_argument("--arquivo", metavar="CAMINHO",
+                        help="Agenda .json ou .db a servir (padrão: a mesma do editor)")
+    parser.add_argument("--silencioso", action="store_true",
+                        help="Não registra cada requisição na saída de erro")
+    args = parser.parse_args(argv)
+
+    backend = None
+    if args.arquivo:
+        from inventories import backend_for_path
+        backend = backend_for_path(args.arquivo)
+    state = AgendaState(backend)
+    state.current()  # carrega antes de aceitar conexões
+
+    server = AgendaServer((args.host, args.porta), state, quiet=args.silencioso)
+    print(f"Servindo {state.backend.path} em http://{args.host}:{server.server_port}/", file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+# Importação e exportação da agenda em CSV e XLSX (planilhas do Excel)
+
+import csv
+import datetime
+import os
+import re
+import unicodedata
+import zipfile
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+from data_handler import FIELDS, new_record_id
+from date_parser import parse_any, to_iso_string
+from records import is_lifetime, LIFETIME_LABEL
+
+# Nomes de coluna aceitos na importação (sem acento e em minúsculas)
+HEADER_ALIASES = {
+    "nome": "nome", "software": "nome",
+    "validade": "validade", "data de validade": "validade", "vencimento": "validade",
+    "ativacao": "ativacao", "modo de ativacao": "ativacao",
+    "usuario": "usuario", "username": "usuario",
+    "numero_licencas": "numero_licencas", "licencas": "numero_licencas",
+    "numero de licencas": "numero_licencas", "total de licencas": "numero_licencas",
+    "renovacao": "renovacao", "renovar": "renovacao",
+}
+REQUIRED = ("nome", "validade", "numero_licencas")
+
+_YES = {"sim", "s", "yes", "x", "1"}
+_NO = {"nao", "n", "no", "0"}
+
+# Data zero das planilhas (datas do Excel são dias desde 30/12/1899)
+_EXCEL_EPOCH = datetime.date(1899, 12, 30)
+
+def _normalize(text):
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(text.lower().split())
+
+def name_key(nome):
+    """Chave usada para achar nomes repetidos ("Adobe CC" == " adobe cc")."""
+    return " ".join(nome.casefold().split())
+
+# ====================================================
+# Leitura (linha a linha)
+# ====================================================
+def iter_csv_rows(path):
+    """Gera (número da linha, lista de células), a primeira é o cabeçalho."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(f, dialect)
+        for row in reader:
+            yield reader.line_num, row
+
+_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_CELL_REF = re.compile(r"([A-Z]+)")
+
+def _column_index(ref):
+    letters = _CELL_REF.match(ref).group(1)
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+def _first_sheet(zf):
+    """Caminho da primeira planilha dentro do .xlsx."""
+    try:
+        workbook = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(zf.read("xl/_rels/workbook.xml.rels"))
+        rid = workbook.find(f"{_NS}sheets/{_NS}sheet").get(f"{_REL_NS}id")
+        for rel in rels:
+            if rel.get("Id") == rid:
+                target = rel.get("Target").lstrip("/")
+                return target if target.startswith("xl/") else "xl/" + target
+    except (KeyError, AttributeError):
+        pass
+    return "xl/worksheets/sheet1.xml"
+
+def iter_xlsx_rows(path):
+    """Gera (número da linha, lista de células) da primeira planilha.
+
+    O XML da planilha é lido com iterparse e cada linha é descartada depois
+    de processada, então arquivos grandes não ficam inteiros na memória.
+    """
+    with zipfile.ZipFile(path) as zf:
+        shared = []
+        if "xl/sharedStrings.xml" in zf.namelist():
+            with zf.open("xl/sharedStrings.xml") as f:
+                for _, elem in ElementTree.iterparse(f):
+                    if elem.tag == f"{_NS}si":
+                        shared.append("".join(t.text or "" for t in elem.iter(f"{_NS}t")))
+                        elem.clear()
+
+        with zf.open(_first_sheet(zf)) as f:
+            for _, elem in ElementTree.iterparse(f):
+                if elem.tag != f"{_NS}row":
+                    continue
+                cells = []
+                for c in elem.iter(f"{_NS}c"):
+                    kind = c.get("t")
+                    if kind == "inlineStr":
+                        value = "".join(t.text or "" for t in c.iter(f"{_NS}t"))
+                    else:
+                        v = c.find(f"{_NS}v")
+                        value = v.text if v is not None and v.text is not None else ""
+                        if kind == "s" and value:
+                            value = shared[int(value)]
+                    ref = c.get("r")
+                    i = _column_index(ref) if ref else len(cells)
+                    cells.extend([""] * (i + 1 - len(cells)))
+                    cells[i] = value
+                yield int(elem.get("r", 0)), cells
+                elem.clear()
+
+def iter_rows(path):
+    if os.path.splitext(path)[1].lower() == ".xlsx":
+        return iter_xlsx_rows(path)
+    return iter_csv_rows(path)
+
+# ====================================================
+# Validação em lote
+# ====================================================
+class ImportBatch:
+    """Resultado da leitura de um arquivo: nada é aplicado se houver erros."""
+
+    def __init__(self):
+        self.new = []      # registros a incluir
+        self.updates = []  # (registro existente, campos novos)
+        self.errors = []   # (linha, mensagem)
+        self.rows = 0
+
+    def format_errors(self):
+        return "\n".join(f"Linha {line}: {message}" for line, message in self.errors)
+
+    def apply(self, softwares):
+        """Inclui e atualiza os registros; retorna (novos, atualizados)."""
+        for record, fields in self.updates:
+            record.update(fields)
+        softwares.extend(self.new)
+        return self.new, [record for record, _ in self.updates]
+
+def _parse_validade(value, excel_serials):
+    value = value.strip()
+    if is_lifetime(value):
+        return LIFETIME_LABEL
+    d = parse_any(value.replace("/", "-"))
+    if d is None and excel_serials and re.fullmatch(r"\d+(\.0+)?", value):
+        serial = int(float(value))
+        if 0 < serial < 2958466:  # até 9999-12-31
+            d = _EXCEL_EPOCH + datetime.timedelta(days=serial)
+    return to_iso_string(d) if d else None
+
+def _parse_licencas(value):
+    value = value.strip()
+    if re.fullmatch(r"\d+(\.0+)?", value):  # planilhas gravam 10 como "10.0"
+        return str(int(float(value)))
+    return None
+
+def _parse_renovacao(value):
+    value = _normalize(value)
+    if not value or value in _YES:
+        return "sim"
+    if value in _NO:
+        return "nao"
+    return None
+
+def validate_rows(rows, existing=(), excel_serials=False):
+    """Valida todas as linhas e retorna um ImportBatch.
+
+    'rows' gera (linha, células) com o cabeçalho primeiro. Nomes que já
+    existem na agenda atualizam o registro existente; nomes repetidos no
+    próprio arquivo são erro.
+    """
+    batch = ImportBatch()
+    rows = iter(rows)
+    try:
+        header_line, header = next(rows)
+    except StopIteration:
+        batch.errors.append((1, "arquivo vazio"))
+        return batch
+
+    columns = {}
+    for i, title in enumerate(header):
+        field = HEADER_ALIASES.get(_normalize(title))
+        if field and field not in columns:
+            columns[field] = i
+    missing = [f for f in REQUIRED if f not in columns]
+    if missing:
+        batch.errors.append((header_line, f"colunas obrigatórias ausentes: {', '.join(missing)}"))
+        return batch
+
+    by_name = {}
+    for record in existing:
+        by_name.setdefault(name_key(record.get("nome", "")), record)
+    seen = {}  # nome -> linha em que apareceu
+
+    for line, cells in rows:
+        values = {f: (cells[i] if i < len(cells) else "") for f, i in columns.items()}
+        if not any(v.strip() for v in values.values()):
+            continue  # linha em branco
+        batch.rows += 1
+
+        errors = []
+        nome = " ".join(values["nome"].split())
+        if not nome:
+            errors.append("nome vazio")
+
+        validade = _parse_validade(values["validade"], excel_serials)
+        if validade is None:
+            errors.append(f"data inválida '{values['validade']}' (use YYYY-MM-DD, DD-MM-YYYY ou Vitalício)")
+
+        licencas = _parse_licencas(values["numero_licencas"])
+        if licencas is None:
+            errors.append(f"número de licenças inválido '{values['numero_licencas']}'")
+
+        renovacao = _parse_renovacao(values.get("renovacao", ""))
+        if renovacao is None:
+            errors.append(f"renovação inválida '{values['renovacao']}' (use sim ou nao)")
+
+        key = name_key(nome)
+        if nome and key in seen:
+            errors.append(f"nome repetido no arquivo (já aparece na linha {seen[key]})")
+        seen.setdefault(key, line)
+
+        if errors:
+            batch.errors.append((line, "; ".join(errors)))
+            continue
+
+        # Colunas opcionais só alteram o registro existente quando estão no arquivo
+        fields = {"nome": nome, "validade": validade, "numero_licencas": licencas}
+        if "renovacao" in columns:
+            fields["renovacao"] = renovacao
+        for f in ("ativacao", "usuario"):
+            if f in columns:
+                fields[f] = values[f].strip()
+
+        current = by_name.get(key)
+        if current is not None:
+            batch.updates.append((current, fields))
+        else:
+            record = {"id": new_record_id()}
+            record.update((f, "") for f in FIELDS)
+            record["renovacao"] = "sim"
+            record.update(fields)
+            batch.new.append(record)
+    return batch
+
+def read_import(path, existing=()):
+    """Lê e valida um arquivo .csv ou .xlsx."""
+    excel = os.path.splitext(path)[1].lower() == ".xlsx"
+    return validate_rows(iter_rows(path), existing, excel_serials=excel)
+
+# ====================================================
+# Exportação
+# ====================================================
+def export_csv(records, path):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for record in records:
+            writer.writerow([record.get(field, "") for field in FIELDS])
+
+_XLSX_STATIC = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Softwares" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        value = str(value)
+        if value.isdigit() and len(value) < 15 and (value == "0" or value[0] != "0"):
+            cells.append(f"<c><v>{value}</v></c>")
+        else:
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>')
+    return "<row>" + "".join(cells) + "</row>"
+
+def export_xlsx(records, path):
+    """Grava uma planilha mínima (só texto e números) com a biblioteca padrão."""
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, content in _XLSX_STATIC.items():
+            zf.writestr(name, content)
+        with zf.open("xl/worksheets/sheet1.xml", "w") as raw:
+            def write(text):
+                raw.write(text.encode("utf-8"))
+            write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                  '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+            write(_xlsx_row(FIELDS))
+            for record in records:
+                write(_xlsx_row(record.get(field, "") for field in FIELDS))
+            write("</sheetData></worksheet>")
+
+def export_records(records, path):
+    """Exporta em XLSX ou CSV conforme a extensão do arquivo."""
+    if os.path.splitext(path)[1].lower() == ".xlsx":
+        export_xlsx(records, path)
+    else:
+        export_csv(records, path)
@@ -0,0 +1,346 @@
+# Várias agendas (uma por laboratório/departamento) vistas como uma só
+
+import os
+import time
+from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from data_handler import JsonBackend, SqliteBackend, JournalBackend, SaveQueue, record_key, new_record_id
+from date_parser import parse_iso
+from records import is_lifetime
+
+# Acima deste total os arquivos são lidos em processos separados (o
+# json.load segura o GIL; abaixo disso, threads bastam e iniciam mais rápido)
+PROCESS_POOL_MIN_BYTES = 4 * 1024 * 1024
+
+def resolve_paths(paths):
+    """Expande diretórios em seus arquivos .json/.db/.jsonl (sem duplicatas)."""
+    result = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            journals = {name[:-len(".jsonl")] for name in names if name.endswith(".jsonl")}
+            for name in names:
+                if name.endswith((".estado.json", ".snapshot.json", ".historico.jsonl")):
+                    continue
+                if not name.endswith((".json", ".db", ".jsonl")):
+                    continue
+                # Agenda que já passou para o diário: o .json é só a origem da cópia inicial
+                if name.endswith(".json") and name[:-len(".json")] in journals:
+                    continue
+                result.append(os.path.join(path, name))
+        else:
+            result.append(path)
+
+    seen = set()
+    unique = []
+    for path in result:
+        key = os.path.normcase(os.path.abspath(path))
+        if key not in seen:
+            seen.add(key)
+            unique.append(path)
+    return unique
+
+def backend_for_path(path):
+    if path.lower().endswith(".db"):
+        return SqliteBackend(path)
+    if path.lower().endswith(".jsonl"):
+        return JournalBackend(path)
+    return JsonBackend(path)
+
+def _is_json(path):
+    """Agenda em JsonBackend (ver backend_for_path)."""
+    return not path.lower().endswith((".db", ".jsonl"))
+
+def validate_inventory(data):
+    """Avisos sobre o conteúdo de uma agenda (não impedem o uso)."""
+    softwares = data.get("softwares")
+    if not isinstance(softwares, list):
+        raise ValueError('o arquivo não tem a lista "softwares"')
+    warnings = []
+    for i, software in enumerate(softwares, 1):
+        if not isinstance(software, dict):
+            raise ValueError(f"registro {i} não é um objeto")
+        if not software.get("nome"):
+            warnings.append(f"registro {i} sem nome")
+        validade = software.get("validade", "")
+        if validade and not is_lifetime(validade) and parse_iso(validade) is None:
+            warnings.append(f"data inválida '{validade}' em {software.get('nome', f'registro {i}')}")
+    return warnings
+
+def _load_worker(path, keep_backend):
+    """Carrega e valida uma agenda (executado em thread ou em outro processo)."""
+    start = time.perf_counter()
+    result = {"path": path, "data": None, "error": None, "warnings": [], "sync": None, "backend": None,
+              "ids_assigned": 0}
+    try:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"arquivo não encontrado: {path}")
+        backend = backend_for_path(path)
+        data = backend.load()
+        result["warnings"] = validate_inventory(data)
+        result["data"] = data
+        result["ids_assigned"] = getattr(backend, "ids_assigned", 0)
+        if keep_backend:
+            result["backend"] = backend
+        else:
+            result["sync"] = backend.sync_state()
+    except (OSError, ValueError) as e:
+        result["error"] = str(e)
+    result["ms"] = (time.perf_counter() - start) * 1000
+    return result
+
+# ====================================================
+# Origens
+# ====================================================
+class Source:
+    """Uma agenda carregada: arquivo, backend e registros."""
+
+    def __init__(self, path, label, backend):
+        self.path = path
+        self.label = label
+        self.backend = backend
+        self.extra = {}      # demais chaves do arquivo além de "softwares"
+        self.warnings = []
+        self.load_ms = None
+        self.view = None     # SourceData, preenchido pelo InventorySet
+
+class SourceData(Mapping):
+    """data["softwares"] restrito a uma origem, calculado na hora da leitura.
+
+    É o 'data' entregue ao SaveQueue da origem: o snapshot feito na gravação
+    já vê a lista combinada mais recente.
+    """
+
+    def __init__(self, inventory, source):
+        self.inventory = inventory
+        self.source = source
+
+    def __getitem__(self, key):
+        if key == "softwares":
+            return self.inventory.records_of(self.source)
+        return self.source.extra[key]
+
+    def __iter__(self):
+        yield "softwares"
+        yield from self.source.extra
+
+    def __len__(self):
+        return 1 + len(self.source.extra)
+
+class InventorySet:
+    """Agendas combinadas em um único data["softwares"].
+
+    Os registros continuam sendo os dicts de cada arquivo; a origem de cada
+    um fica em um mapa id -> Source, sem alterar o conteúdo gravado.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.data = {"softwares": []}
+        self._source_by_id = {}
+        self.errors = []  # (caminho, mensagem) dos arquivos que não abriram
+        self.rekeyed = []  # (origem, registro com o id antigo, registro) a regravar
+        for source in sources:
+            source.view = SourceData(self, source)
+
+    def _attach(self, source, records):
+        softwares = self.data["softwares"]
+        for record in records:
+            key = record_key(record)
+            if key in self._source_by_id:
+                # Arquivo copiado de outro departamento: os ids se repetem.
+                # O novo id só vai para o arquivo quando o editor abre a fila
+                # de gravação (InventorySaveQueue); a verificação não grava
+                old = dict(record)
+                key = record["id"] = new_record_id()
+                self.rekeyed.append((source, old, record))
+            self._source_by_id[key] = source
+            softwares.append(record)
+
+    def source_of(self, record):
+        return self._source_by_id.get(record_key(record))
+
+    def label_of(self, record):
+        source = self.source_of(record)
+        return source.label if source else ""
+
+    def assign(self, record, source):
+        """Define a origem de um registro novo."""
+        self._source_by_id[record_key(record)] = source
+
+    def forget(self, record):
+        self._source_by_id.pop(record_key(record), None)
+
+    def records_of(self, source):
+        by_id = self._source_by_id
+        return [r for r in list(self.data["softwares"]) if by_id.get(r.get("id")) is source]
+
+    def replace_records(self, source, records):
+        """Troca os registros de uma origem, mantendo as demais no lugar."""
+        for record in self.records_of(source):
+            self.forget(record)
+        for record in records:
+            self.assign(record, source)
+        grouped = defaultdict(list)
+        for record in self.data["softwares"]:
+            grouped[self.source_of(record)].append(record)
+        grouped[source] = list(records)
+        self.data["softwares"][:] = [r for s in self.sources for r in grouped[s]]
+
+def _labels(paths):
+    """Nome de cada arquivo sem extensão; com o diretório se houver repetição."""
+    names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    repeated = {n for n in names if names.count(n) > 1}
+    return [
+        f"{os.path.basename(os.path.dirname(os.path.abspath(p)))}/{n}" if n in repeated else n
+        for n, p in zip(names, paths)
+    ]
+
+def load_inventories(paths, workers=None):
+    """Carrega várias agendas em paralelo e retorna um InventorySet.
+
+    Com poucos dados usa threads; acima de PROCESS_POOL_MIN_BYTES usa um
+    processo por núcleo, então o tempo acompanha o número de núcleos e não
+    o de arquivos. Arquivos que não abrem ficam em InventorySet.errors.
+    """
+    paths = resolve_paths(paths)
+    total = sum(os.path.getsize(p) for p in paths if os.path.isfile(p))
+    use_processes = len(paths) > 1 and total >= PROCESS_POOL_MIN_BYTES and (os.cpu_count() or 1) > 1
+
+    if len(paths) <= 1:
+        results = [_load_worker(p, True) for p in paths]
+    elif use_processes:
+        # Só os .json vão para outros processos: o SQLite e o diário guardam no
+        # backend o que foi carregado (ids criados, estado e posição do
+        # diário), e um backend novo no processo principal não saberia disso
+        in_pool = [_is_json(p) for p in paths]
+        with ProcessPoolExecutor(max_workers=workers) as processes, \
+                ThreadPoolExecutor(max_workers=workers or min(32, len(paths))) as threads:
+            futures = [
+                processes.submit(_load_worker, p, False) if json_path else threads.submit(_load_worker, p, True)
+                for p, json_path in zip(paths, in_pool)
+            ]
+            results = [future.result() for future in futures]
+    else:
+        with ThreadPoolExecutor(max_workers=workers or min(32, len(paths))) as pool:
+            results = list(pool.map(_load_worker, paths, [True] * len(paths)))
+
+    sources = []
+    loaded = []
+    errors = []
+    for result, label in zip(results, _labels(paths)):
+        if result["error"] is not None:
+            errors.append((result["path"], result["error"]))
+            continue
+        backend = result["backend"] or backend_for_path(result["path"])
+        data = result["data"]
+        if result["backend"] is None:
+            # JSON carregado em outro processo: passa adiante a base de
+            # mesclagem e os ids que ainda precisam ser gravados
+            signature, text = result["sync"]
+            backend.mark_synced(signature, text, data["softwares"],
+                                memory_is_file=not result["ids_assigned"])
+            backend.ids_assigned = result["ids_assigned"]
+        source = Source(result["path"], label, backend)
+        source.extra = {k: v for k, v in data.items() if k != "softwares"}
+        source.warnings = result["warnings"]
+        source.load_ms = result["ms"]
+        sources.append(source)
+        loaded.append(data["softwares"])
+
+    inventory = InventorySet(sources)
+    inventory.errors = errors
+    for source, records in zip(sources, loaded):
+        inventory._attach(source, records)
+    return inventory
+
+# ====================================================
+# Gravação por origem
+# ====================================================
+class InventorySaveQueue:
+    """Mesma interface do SaveQueue, com uma fila (e um backend) por origem."""
+
+    def __init__(self, inventory, **kwargs):
+        self.inventory = inventory
+        self.queues = {s: SaveQueue(s.backend, **kwargs) for s in inventory.sources}
+        self._write_ids()
+
+    def _write_ids(self):
+        """Grava nos arquivos os ids criados ou trocados ao carregar.
+
+        Arquivos antigos, sem id, são regravados inteiros (ids_assigned do
+        backend). Ids repetidos entre agendas (ver InventorySet._attach) viram
+        remoção do id antigo mais inclusão do novo: SQLite e diário alteram
+        por id, e sem isso a primeira edição incluiria uma segunda cópia do
+        registro e a original ficaria no arquivo.
+        """
+        for source, queue in self.queues.items():
+            if getattr(source.backend, "ids_assigned", 0):
+                queue.save(source.view)
+        for source, old, record in self.inventory.rekeyed:
+            queue = self.queues[source]
+            queue.delete(source.view, old)
+            queue.insert(source.view, record)
+        self.inventory.rekeyed.clear()
+
+    def _groups(self, records):
+        groups = defaultdict(list)
+        for record in records:
+            source = self.inventory.source_of(record)
+            if source is not None:
+                groups[source].append(record)
+        for source, items in groups.items():
+            yield source, self.queues[source], items
+
+    def insert(self, data, record):
+        for source, queue, items in self._groups([record]):
+            queue.insert(source.view, items[0])
+
+    def update(self, data, record):
+        self.update_many(data, [record])
+
+    def delete(self, data, record):
+        self.delete_many(data, [record])
+
+    def update_many(self, data, records):
+        for source, queue, items in self._groups(records):
+            queue.update_many(source.view, items)
+
+    def delete_many(self, data, records):
+        for source, queue, items in self._groups(records):
+            queue.delete_many(source.view, items)
+        for record in records:
+            self.inventory.forget(record)
+
+    def save(self, data):
+        for source, queue in self.queues.items():
+            queue.save(source.view)
+
+    def flush(self):
+        results = [queue.flush() for queue in self.queues.values()]
+        return all(results)
+
+    def close(self):
+        results = [queue.close() for queue in self.queues.values()]
+        return all(results)
+
+    @property
+    def pending_count(self):
+        return sum(queue.pending_count for queue in self.queues.values())
+
+    @property
+    def flush_count(self):
+        return sum(queue.flush_count for queue in self.queues.values())
+
+    @property
+    def last_flush_ms(self):
+        times = [q.last_flush_ms for q in self.queues.values() if q.last_flush_ms is not None]
+        return max(times) if times else None
+
+    @property
+    def last_error(self):
+        for queue in self.queues.values():
+            if queue.last_error is not None:
+                return queue.last_error
+        return None
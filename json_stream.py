@@ -0,0 +1,106 @@
+# Leitura incremental de um array dentro de um documento JSON grande
+
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+
+_NON_WHITESPACE = re.compile(r"[^ \t\n\r]")
+_NUMBER_CHARS = frozenset("0123456789.eE+-")
+
+class _Reader:
+    """Buffer sobre o arquivo: lê blocos sob demanda e descarta o já consumido."""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """Lê mais um bloco; retorna False no fim do arquivo."""
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self):
+        """Próximo caractere que não é espaço ("" no fim do arquivo)."""
+        while True:
+            # A indentação do arquivo gravado é longa: o regex a pula de uma vez
+            match = _NON_WHITESPACE.search(self.buf, self.pos)
+            if match is not None:
+                self.pos = match.start()
+                return match.group()
+            self.pos = len(self.buf)
+            if not self.more():
+                return ""
+
+    def expect(self, chars):
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"JSON inválido perto da posição {self.pos}: esperado {chars!r}")
+        self.pos += 1
+        return c
+
+    def value(self, decoder):
+        """Decodifica o próximo valor, lendo mais blocos até ele estar completo."""
+        self.peek()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.more():
+                    continue
+                raise
+            # Um número cortado pelo fim do bloco ("1." ou "1.5e") é lido só
+            # até o corte: se ele pode continuar, lê mais e decodifica de novo
+            if self._number_may_continue(value, end) and self.more():
+                continue
+            self.pos = end
+            return value
+
+    def _number_may_continue(self, value, end):
+        if end == len(self.buf):
+            return True
+        return type(value) in (int, float) and self.buf[end] in _NUMBER_CHARS
+
+def iter_array(stream, key, chunk_size=CHUNK_SIZE):
+    """Gera os itens do array 'key' do objeto JSON de 'stream', um por vez.
+
+    Só o item atual e um bloco de texto ficam em memória, qualquer que seja
+    o tamanho do arquivo. As demais chaves do objeto são lidas e descartadas.
+    """
+    decoder = json.JSONDecoder()
+    reader = _Reader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        name = reader.value(decoder)
+        reader.expect(":")
+        if name == key and reader.peek() == "[":
+            reader.expect("[")
+            if reader.peek() != "]":
+                while True:
+                    yield reader.value(decoder)
+                    if reader.expect(",]") == "]":
+                        break
+            else:
+                reader.expect("]")
+        else:
+            reader.value(decoder)
+        if reader.expect(",}") == "}":
+            return
+
+def iter_file_array(path, key, chunk_size=CHUNK_SIZE):
+    with open(path, "r", encoding="utf-8") as f:
+        yield from iter_array(f, key, chunk_size)
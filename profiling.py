@@ -0,0 +1,175 @@
+# Medição de tempos por etapa (--profile) para diagnóstico de lentidão
+
+import datetime
+import functools
+import json
+import os
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+# Etapas instrumentadas no editor e na verificação
+STAGES = ("load", "parse", "filter", "sort", "render", "save")
+
+_NULL = nullcontext()
+
+def percentile(sorted_values, p):
+    """Percentil por posição mais próxima (valores já ordenados)."""
+    if not sorted_values:
+        return None
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[k]
+
+class Profiler:
+    """Coleta a duração de cada chamada das etapas instrumentadas.
+
+    Desligado, stage() devolve um contexto vazio compartilhado e timed()
+    só confere um atributo, então a instrumentação pode ficar no código.
+    """
+
+    def __init__(self, max_samples=10000):
+        self.enabled = False
+        self.max_samples = max_samples
+        self.started_at = None
+        self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._counts = defaultdict(int)
+        self._totals = defaultdict(float)
+        self._cprofile = None
+        self._tracemalloc = False
+
+    def enable(self, cprofile=False, tracemalloc_frames=0):
+        self.enabled = True
+        self.started_at = datetime.datetime.now()
+        if cprofile:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        if tracemalloc_frames:
+            import tracemalloc
+            tracemalloc.start(tracemalloc_frames)
+            self._tracemalloc = True
+
+    # ---------- Coleta ----------
+    def record(self, name, ms):
+        self._samples[name].append(ms)
+        self._counts[name] += 1
+        self._totals[name] += ms
+
+    @contextmanager
+    def _measure(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+
+    def stage(self, name):
+        """with PROFILER.stage("filter"): ..."""
+        if not self.enabled:
+            return _NULL
+        return self._measure(name)
+
+    def timed(self, name):
+        """Decorador equivalente a envolver a função em stage(name)."""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.record(name, (time.perf_counter() - start) * 1000)
+            return wrapper
+        return decorator
+
+    # ---------- Relatório ----------
+    def summary(self):
+        """{etapa: {chamadas, p50_ms, p95_ms, max_ms, total_ms}}"""
+        result = {}
+        names = [s for s in STAGES if s in self._samples]
+        names += sorted(s for s in self._samples if s not in STAGES)
+        for name in names:
+            values = sorted(self._samples[name])
+            result[name] = {
+                "chamadas": self._counts[name],
+                "p50_ms": round(percentile(values, 50), 3),
+                "p95_ms": round(percentile(values, 95), 3),
+                "max_ms": round(values[-1], 3),
+                "total_ms": round(self._totals[name], 3),
+            }
+        return result
+
+    def _cprofile_top(self, path, limit=30):
+        import pstats
+
+        self._cprofile.disable()
+        prof_path = os.path.splitext(path)[0] + ".prof"
+        self._cprofile.dump_stats(prof_path)
+        stats = pstats.Stats(self._cprofile)
+        rows = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            rows.append({
+                "funcao": f"{os.path.basename(filename)}:{line}({func})",
+                "chamadas": nc,
+                "tottime_ms": round(tt * 1000, 3),
+                "cumtime_ms": round(ct * 1000, 3),
+            })
+        rows.sort(key=lambda r: r["cumtime_ms"], reverse=True)
+        return {"arquivo": prof_path, "top": rows[:limit]}
+
+    def _tracemalloc_top(self, limit=20):
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        top = [
+            {"local": str(stat.traceback[0]), "kb": round(stat.size / 1024, 1), "blocos": stat.count}
+            for stat in snapshot.statistics("lineno")[:limit]
+        ]
+        return {"atual_kb": round(current / 1024, 1), "pico_kb": round(peak / 1024, 1), "top": top}
+
+    def report(self, program=None):
+        return {
+            "programa": program,
+            "inicio": self.started_at.isoformat(timespec="seconds") if self.started_at else None,
+            "fim": datetime.datetime.now().isoformat(timespec="seconds"),
+            "etapas": self.summary(),
+        }
+
+    def finish(self, path, program=None):
+        """Grava o relatório em JSON (com cProfile/tracemalloc, se ativos)."""
+        if not self.enabled:
+            return
+        report = self.report(program)
+        if self._cprofile is not None:
+            report["cprofile"] = self._cprofile_top(path)
+            self._cprofile = None
+        if self._tracemalloc:
+            report["tracemalloc"] = self._tracemalloc_top()
+            self._tracemalloc = False
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        self.enabled = False
+
+PROFILER = Profiler()
+
+def add_profile_arguments(parser, default_path):
+    """Acrescenta --profile/--cprofile/--tracemalloc a um ArgumentParser."""
+    parser.add_argument("--profile", nargs="?", const=default_path, metavar="ARQUIVO",
+                        help=f"Mede o tempo de cada etapa e grava um JSON ao sair (padrão: {default_path})")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="Com --profile, inclui uma captura do cProfile (também salva em .prof)")
+    parser.add_argument("--tracemalloc", type=int, nargs="?", const=1, default=0, metavar="QUADROS",
+                        help="Com --profile, inclui o consumo de memória medido pelo tracemalloc")
+
+def start_from_args(args, program):
+    """Liga o PROFILER conforme os argumentos e agenda o relatório para a saída."""
+    if not args.profile:
+        return
+    import atexit
+
+    PROFILER.enable(cprofile=args.cprofile, tracemalloc_frames=args.tracemalloc)
+    atexit.register(PROFILER.finish, os.path.abspath(args.profile), program)
@@ -0,0 +1,75 @@
+# Mescla de três vias entre a agenda em memória e a gravada por outra pessoa
+
+_MISSING = object()
+
+def index_by_id(records):
+    return {r["id"]: r for r in records}
+
+def merge_record(base, ours, theirs):
+    """Mescla campo a campo; retorna (registro, houve conflito).
+
+    Um campo alterado só de um lado fica com a alteração; alterado dos dois
+    lados com valores diferentes fica com o nosso valor (conflito).
+    """
+    if ours == theirs or theirs == base:
+        return ours, False
+    if ours == base or base is None:
+        return (theirs, False) if base is not None else (ours, True)
+
+    result = {}
+    conflict = False
+    for key in list(ours) + [k for k in theirs if k not in ours]:
+        b = base.get(key, _MISSING)
+        o = ours.get(key, _MISSING)
+        t = theirs.get(key, _MISSING)
+        if o == t or t == b:
+            value = o
+        elif o == b:
+            value = t
+        else:
+            value = o
+            conflict = True
+        if value is not _MISSING:
+            result[key] = value
+    return result, conflict
+
+def merge_records(base, ours, theirs):
+    """Mescla três versões da lista de registros, casando-as pelo id.
+
+    base: {id: registro} da última versão em comum; ours e theirs: listas.
+    Retorna (lista mesclada, ids em conflito). Registros iguais à versão
+    comum são devolvidos como estão (mesmo objeto) de 'ours' ou 'theirs'.
+    Remoção de um lado e alteração do outro mantém o registro alterado.
+    """
+    ours_by_id = index_by_id(ours)
+    theirs_by_id = index_by_id(theirs)
+    merged = []
+    conflicts = []
+
+    # Na ordem do arquivo gravado por último
+    for rid, t in theirs_by_id.items():
+        o = ours_by_id.get(rid)
+        b = base.get(rid)
+        if o is None:
+            if b is None:
+                merged.append(t)           # incluído por eles
+            elif t != b:
+                merged.append(t)           # removido aqui, alterado lá
+                conflicts.append(rid)
+            continue                       # removido aqui
+        record, conflict = merge_record(b, o, t)
+        merged.append(record)
+        if conflict:
+            conflicts.append(rid)
+
+    for rid, o in ours_by_id.items():
+        if rid in theirs_by_id:
+            continue
+        b = base.get(rid)
+        if b is None:
+            merged.append(o)               # incluído aqui
+        elif o != b:
+            merged.append(o)               # removido lá, alterado aqui
+            conflicts.append(rid)
+        # removido lá e intacto aqui: sai
+    return merged, conflicts
@@ -0,0 +1,122 @@
+# Modelo de registro compartilhado pelo editor e pela verificação
+
+import datetime
+import re
+from data_handler import record_key
+from date_parser import parse_iso, to_ordinals
+
+WARN_DAYS = 90  # expira em até 3 meses
+
+# Situação de um registro (também usada como tag de cor na Treeview)
+STATUS_OK = "ok"
+STATUS_WARN = "warn"
+STATUS_EXPIRED = "expired"
+STATUS_INVALID = ""
+
+LIFETIME_LABEL = "Vitalício"
+LIFETIME_DATE = datetime.date(9999, 12, 31)  # Data futura longínqua para ordenação
+
+def is_lifetime(validade):
+    return validade.lower() == "vitalício"
+
+def validade_ordinals(values):
+    """RecordInfo(v).ordinal de uma coluna de validades inteira.
+
+    As datas distintas costumam ser poucas: cada uma é convertida uma vez
+    só, em lote (date_parser.to_ordinals).
+    """
+    values = [v or "" for v in values]
+    distinct = list(dict.fromkeys(values))
+    ordinal_of = dict(zip(distinct, to_ordinals(distinct)))
+    lifetime = LIFETIME_DATE.toordinal()
+    for v in distinct:
+        if is_lifetime(v):
+            ordinal_of[v] = lifetime
+    return [ordinal_of[v] for v in values]
+
+# Primeiro número do texto: "10", "2,5", "1.000" (milhar), "5 usuários"
+_LICENSE_NUMBER = re.compile(r"(?P<milhar>\d{1,3}(?:\.\d{3})+(?:,\d+)?)(?!\d)|(?P<simples>\d+(?:[.,]\d+)?)")
+
+def license_count(value):
+    """Número de licenças de "numero_licencas" (gravado como texto), ou None.
+
+    "Ilimitado", "site" e outros textos sem número retornam None.
+    """
+    match = _LICENSE_NUMBER.search(str(value or ""))
+    if match is None:
+        return None
+    if match.group("milhar"):
+        number = float(match.group("milhar").replace(".", "").replace(",", "."))
+    else:
+        number = float(match.group("simples").replace(",", "."))
+    return int(number) if number.is_integer() else number
+
+class RecordInfo:
+    """Dados derivados da validade de um registro.
+
+    A data é interpretada uma única vez; dias restantes e situação são
+    recalculados só quando o dia muda.
+    """
+
+    __slots__ = ("validade", "date", "lifetime", "ordinal", "day", "days", "status")
+
+    def __init__(self, validade):
+        self.validade = validade
+        self.lifetime = is_lifetime(validade)
+        self.date = LIFETIME_DATE if self.lifetime else parse_iso(validade)
+        # Datas inválidas ficam antes de todas as outras na ordenação
+        self.ordinal = self.date.toordinal() if self.date else 0
+        self.day = None
+        self.days = None
+        self.status = STATUS_INVALID
+
+    @property
+    def valid(self):
+        return self.date is not None
+
+    def refresh(self, today_ordinal, warn_days=WARN_DAYS):
+        self.day = today_ordinal
+        if self.lifetime:
+            self.days = None
+            self.status = STATUS_OK
+        elif self.date is None:
+            self.days = None
+            self.status = STATUS_INVALID
+        else:
+            self.days = self.ordinal - today_ordinal
+            if self.days < 0:
+                self.status = STATUS_EXPIRED
+            elif self.days <= warn_days:
+                self.status = STATUS_WARN
+            else:
+                self.status = STATUS_OK
+
+class RecordCache:
+    """Guarda um RecordInfo por registro.
+
+    O RecordInfo é refeito quando a validade do registro muda e atualizado
+    quando a data de hoje muda; nos demais casos é reaproveitado.
+    """
+
+    def __init__(self, warn_days=WARN_DAYS):
+        self.warn_days = warn_days
+        self._infos = {}  # record_key -> RecordInfo
+
+    def get(self, record, today=None):
+        today_ordinal = (today or datetime.date.today()).toordinal()
+        key = record_key(record)
+        validade = record.get("validade", "")
+
+        info = self._infos.get(key)
+        if info is None or info.validade != validade:
+            info = RecordInfo(validade)
+            self._infos[key] = info
+        if info.day != today_ordinal:
+            info.refresh(today_ordinal, self.warn_days)
+        return info
+
+    def discard(self, record):
+        self._infos.pop(record_key(record), None)
+
+    def clear(self):
+        self._infos.clear()
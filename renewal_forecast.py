@@ -0,0 +1,189 @@
+# Previsão de renovações: vencimentos, licenças e renovação por mês
+
+import csv
+import datetime
+from data_handler import record_key
+from records import RecordCache, LIFETIME_DATE, license_count
+from profiling import PROFILER
+
+FORECAST_MONTHS = 24
+
+_LIFETIME_ORDINAL = LIFETIME_DATE.toordinal()
+
+# Posições dos totais de cada mês
+_COUNT, _SEATS, _RENEW, _NO_RENEW = range(4)
+
+_MISSING = object()
+
+def month_index(d):
+    return d.year * 12 + d.month - 1
+
+def month_label(index):
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def _seats(total):
+    # Licenças fracionárias ("2,5") somam como float: arredonda o resíduo
+    # de somas e subtrações sucessivas
+    total = round(total, 2)
+    return int(total) if float(total).is_integer() else total
+
+def _totals(values):
+    return {
+        "softwares": values[_COUNT],
+        "licencas": _seats(values[_SEATS]),
+        "renovar": values[_RENEW],
+        "nao_renovar": values[_NO_RENEW],
+    }
+
+class RenewalForecast:
+    """Totais por mês de validade, mantidos a cada inclusão, alteração e remoção.
+
+    Cada registro conta em um único mês (o da validade) com 1 software, suas
+    licenças (só as numéricas, ver records.license_count) e 1 em "renovar"
+    ou "não renovar". A contribuição de cada registro fica guardada, então
+    alterar um registro é tirá-la de um mês e somá-la em outro, sem percorrer
+    a agenda. Vitalícios e datas inválidas ficam de fora.
+    """
+
+    def __init__(self, records=(), cache=None, ordinals=None):
+        self.cache = cache or RecordCache()
+        self._months = {}    # mês -> [softwares, licenças, renovar, não renovar]
+        self._contrib = {}   # chave -> (mês, licenças, renova)
+        self._load(records, ordinals)
+
+    @PROFILER.timed("forecast")
+    def _load(self, records, ordinals=None):
+        if ordinals is None:
+            today = datetime.date.today()
+            ordinals = [self.cache.get(record, today).ordinal for record in records]
+        # Poucos valores distintos de data, licenças e renovação: cada um é
+        # interpretado uma vez só
+        month_of = {}   # ordinal -> mês
+        seats_of = {}   # numero_licencas -> número
+        months = self._months
+        contrib = self._contrib
+        for record, ordinal in zip(records, ordinals):
+            if ordinal == 0 or ordinal == _LIFETIME_ORDINAL:
+                continue
+            month = month_of.get(ordinal)
+            if month is None:
+                month = month_of[ordinal] = month_index(datetime.date.fromordinal(ordinal))
+            text = record.get("numero_licencas")
+            seats = seats_of.get(text, _MISSING) if type(text) is str else license_count(text)
+            if seats is _MISSING:
+                seats = seats_of[text] = license_count(text)
+            renews = _renews(record)
+
+            values = months.get(month)
+            if values is None:
+                values = months[month] = [0, 0, 0, 0]
+            values[_COUNT] += 1
+            values[_SEATS] += seats or 0
+            values[_RENEW if renews else _NO_RENEW] += 1
+            contrib[record_key(record)] = (month, seats, renews)
+
+    def __len__(self):
+        return len(self._contrib)
+
+    # ---------- Manutenção incremental ----------
+    def _contribution(self, record):
+        info = self.cache.get(record)
+        if info.date is None or info.lifetime:
+            return None
+        return month_index(info.date), license_count(record.get("numero_licencas")), _renews(record)
+
+    def _add(self, key, contribution):
+        month, seats, renews = contribution
+        values = self._months.get(month)
+        if values is None:
+            values = self._months[month] = [0, 0, 0, 0]
+        values[_COUNT] += 1
+        values[_SEATS] += seats or 0
+        values[_RENEW if renews else _NO_RENEW] += 1
+        self._contrib[key] = contribution
+
+    def _subtract(self, key):
+        contribution = self._contrib.pop(key, None)
+        if contribution is None:
+            return
+        month, seats, renews = contribution
+        values = self._months[month]
+        values[_COUNT] -= 1
+        values[_SEATS] -= seats or 0
+        values[_RENEW if renews else _NO_RENEW] -= 1
+        if not values[_COUNT]:
+            del self._months[month]
+
+    def add(self, record):
+        self.update(record)
+
+    def remove(self, record):
+        self._subtract(record_key(record))
+
+    def update(self, record):
+        """Recalcula a contribuição de um registro (novo ou alterado)."""
+        key = record_key(record)
+        contribution = self._contribution(record)
+        if contribution == self._contrib.get(key):
+            return
+        self._subtract(key)
+        if contribution is not None:
+            self._add(key, contribution)
+
+    # ---------- Relatório ----------
+    def report(self, today=None, months=FORECAST_MONTHS):
+        """Os próximos 'months' meses, a partir do atual, mais atrasados e total.
+
+        "atrasados" soma os meses anteriores ao atual (vencidos e ainda na
+        agenda); "total" soma os meses do período.
+        """
+        today = today or datetime.date.today()
+        first = month_index(today)
+        empty = (0, 0, 0, 0)
+
+        overdue = [0, 0, 0, 0]
+        for month, values in self._months.items():
+            if month < first:
+                for i, value in enumerate(values):
+                    overdue[i] += value
+
+        rows = []
+        total = [0, 0, 0, 0]
+        for month in range(first, first + months):
+            values = self._months.get(month, empty)
+            for i, value in enumerate(values):
+                total[i] += value
+            rows.append(dict(mes=month_label(month), **_totals(values)))
+
+        return {
+            "data": today.isoformat(),
+            "meses": rows,
+            "atrasados": _totals(overdue),
+            "total": _totals(total),
+        }
+
+def _renews(record):
+    return str(record.get("renovacao", "")).lower() != "nao"
+
+def format_text(report):
+    """Tabela de texto do relatório (--previsao com --format text)."""
+    lines = [f"Previsão de renovações a partir de {report['data']}",
+             f"{'Mês':<10}{'Softwares':>10}{'Licenças':>10}{'Renovar':>10}{'Não renovar':>13}"]
+
+    def line(label, totals):
+        return (f"{label:<10}{totals['softwares']:>10}{totals['licencas']:>10}"
+                f"{totals['renovar']:>10}{totals['nao_renovar']:>13}")
+
+    if report["atrasados"]["softwares"]:
+        lines.append(line("Atrasados", report["atrasados"]))
+    lines.extend(line(row["mes"], row) for row in report["meses"])
+    lines.append(line("Total", report["total"]))
+    return "\n".join(lines)
+
+def write_csv(report, stream):
+    """Um mês por linha; atrasados e total com "mes" = "atrasados"/"total"."""
+    writer = csv.DictWriter(stream, fieldnames=["mes", "softwares", "licencas", "renovar", "nao_renovar"])
+    writer.writeheader()
+    writer.writerow(dict(mes="atrasados", **report["atrasados"]))
+    writer.writerows(report["meses"])
+    writer.writerow(dict(mes="total", **report["total"]))
@@ -0,0 +1,69 @@
+# Modo contínuo da verificação: dorme até a próxima mudança de situação
+
+import datetime
+import threading
+from data_handler import load_data, get_backend, FileWatcher
+from records import RecordCache, WARN_DAYS
+from expiry_index import ExpiryIndex
+
+def next_crossing(index, today, threshold=WARN_DAYS):
+    """Próxima data em que algum registro muda de situação.
+
+    Um registro com validade no ordinal 'o' entra em aviso no dia
+    o - threshold e passa a vencido no dia o + 1.
+    """
+    t = today.toordinal()
+    candidates = []
+
+    warn_ordinal = index.next_ordinal_after(t + threshold)
+    if warn_ordinal is not None:
+        candidates.append(warn_ordinal - threshold)
+
+    expire_ordinal = index.next_ordinal_after(t - 1)
+    if expire_ordinal is not None:
+        candidates.append(expire_ordinal + 1)
+
+    if not candidates:
+        return None
+    return datetime.date.fromordinal(min(candidates))
+
+def run_daemon(check, threshold=WARN_DAYS, poll_interval=30, stop_event=None, log=print):
+    """Roda a verificação continuamente.
+
+    check(data, today) é chamado ao iniciar, no dia de cada cruzamento de
+    limite e sempre que o arquivo de dados mudar; cabe a ele avisar só o
+    que for novo (ver alert_state).
+
+    Entre um evento e outro a thread só acorda a cada 'poll_interval'
+    segundos para comparar mtime e tamanho do arquivo de dados.
+    """
+    stop_event = stop_event or threading.Event()
+    watcher = FileWatcher(get_backend().path)
+    data = load_data()
+
+    while not stop_event.is_set():
+        today = datetime.date.today()
+        check(data, today)
+
+        index = ExpiryIndex(data["softwares"], RecordCache())
+        crossing = next_crossing(index, today, threshold)
+        if crossing is None:
+            wake_at = None
+            log("Nenhuma mudança de situação prevista; aguardando alterações no arquivo")
+        else:
+            wake_at = datetime.datetime.combine(crossing, datetime.time.min)
+            log(f"Próxima verificação: {wake_at:%Y-%m-%d %H:%M}")
+
+        while not stop_event.is_set():
+            timeout = poll_interval
+            if wake_at is not None:
+                # Compara com o relógio de parede: funciona após suspensão/hibernação
+                remaining = (wake_at - datetime.datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                timeout = min(poll_interval, remaining)
+            stop_event.wait(timeout)
+            if watcher.changed():
+                log("Arquivo de dados alterado; recarregando")
+                data = load_data()
+                break
@@ -0,0 +1,151 @@
+# Índice de busca textual da agenda
+
+from collections import defaultdict
+from data_handler import record_key
+
+# Campos pesquisados pela caixa "Pesquisar"
+SEARCH_FIELDS = ("nome", "ativacao", "usuario", "numero_licencas")
+
+# Separa os campos no texto indexado; nunca aparece em uma consulta
+_FIELD_SEP = "\x00"
+
+def _normalize(value):
+    return str(value or "").lower()
+
+def _trigrams(token):
+    return {token[i:i + 3] for i in range(len(token) - 2)}
+
+class SearchIndex:
+    """Busca por substring nos campos de SEARCH_FIELDS sem varrer a agenda.
+
+    Os campos são quebrados em tokens por espaço. Cada token distinto aponta
+    para os registros que o contêm, e o vocabulário de tokens tem um índice
+    de trigramas. Uma palavra da consulta só pode aparecer dentro de um
+    token, então os candidatos saem da interseção dos trigramas e a
+    confirmação final é um teste de substring no texto do registro.
+    """
+
+    def __init__(self, records=()):
+        self._records = {}                 # chave -> registro
+        self._text = {}                    # chave -> texto normalizado
+        self._tokens = {}                  # chave -> tokens do registro
+        self._seq = {}                     # chave -> ordem de inserção
+        self._postings = defaultdict(set)  # token -> chaves
+        self._grams = defaultdict(set)     # trigrama -> tokens
+        self._next_seq = 0
+        for record in records:
+            self.add(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    # ---------- Manutenção incremental ----------
+    def add(self, record):
+        key = record_key(record)
+        if key in self._records:
+            self.update(record)
+            return
+        self._records[key] = record
+        self._seq[key] = self._next_seq
+        self._next_seq += 1
+        self._index(key, record)
+
+    def remove(self, record):
+        key = record_key(record)
+        if key not in self._records:
+            return
+        self._unindex(key)
+        del self._records[key]
+        del self._seq[key]
+
+    def update(self, record):
+        """Reindexa um registro alterado (mantém a posição original)."""
+        key = record_key(record)
+        if key not in self._records:
+            self.add(record)
+            return
+        self._unindex(key)
+        self._records[key] = record
+        self._index(key, record)
+
+    def _index(self, key, record):
+        text = _FIELD_SEP.join(_normalize(record.get(field)) for field in SEARCH_FIELDS)
+        tokens = set(text.replace(_FIELD_SEP, " ").split())
+        self._text[key] = text
+        self._tokens[key] = tokens
+
+        postings_by_token = self._postings
+        grams = self._grams
+        for token in tokens:
+            postings = postings_by_token[token]
+            if not postings:
+                for gram in _trigrams(token):
+                    grams[gram].add(token)
+            postings.add(key)
+
+    def _unindex(self, key):
+        del self._text[key]
+        for token in self._tokens.pop(key):
+            postings = self._postings[token]
+            postings.discard(key)
+            if not postings:
+                del self._postings[token]
+                for gram in _trigrams(token):
+                    tokens = self._grams[gram]
+                    tokens.discard(token)
+                    if not tokens:
+                        del self._grams[gram]
+
+    # ---------- Consulta ----------
+    def _tokens_containing(self, word, limit):
+        """Tokens que contêm 'word' (len >= 3), ou None se passarem de 'limit'."""
+        grams = sorted((self._grams.get(g, ()) for g in _trigrams(word)), key=len)
+        if not grams[0]:
+            return []
+        if len(grams[0]) > limit:
+            return None
+
+        candidates = set(grams[0])
+        for tokens in grams[1:]:
+            candidates &= tokens
+            if not candidates:
+                return []
+        matches = [token for token in candidates if word in token]
+        return None if len(matches) > limit else matches
+
+    def search(self, query):
+        """Registros cujos campos contêm 'query', na ordem de inserção."""
+        query = _normalize(query).strip()
+        if not query:
+            return list(self._records.values())
+
+        # Palavras com menos de 3 letras não têm trigramas: ficam só para a
+        # confirmação final por substring
+        words = sorted({w for w in query.split() if len(w) >= 3}, key=len, reverse=True)
+        limit = len(self._records) // 8
+
+        keys = None
+        for word in words:
+            tokens = self._tokens_containing(word, limit)
+            if tokens is None or sum(len(self._postings[t]) for t in tokens) > limit:
+                # Palavra pouco seletiva: comparar o texto de cada registro sai
+                # mais barato que unir milhares de listas de ocorrências
+                continue
+            matches = set()
+            for token in tokens:
+                matches |= self._postings[token]
+            keys = matches if keys is None else keys & matches
+            if not keys:
+                return []
+
+        if keys is None:
+            return self._scan(query)
+
+        hits = [k for k in keys if query in self._text[k]]
+        hits.sort(key=self._seq.__getitem__)
+        return [self._records[k] for k in hits]
+
+    def _scan(self, query):
+        text = self._text
+        # _records mantém a ordem de inserção (update não reordena)
+        return [record for key, record in self._records.items() if query in text[key]]
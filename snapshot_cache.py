@@ -0,0 +1,80 @@
+# Cópia binária da agenda ao lado do JSON, para abrir agendas grandes rápido
+
+import hashlib
+import marshal
+import os
+import sys
+import threading
+from array import array
+from records import validade_ordinals
+
+CACHE_VERSION = 1
+_MAGIC = "agenda-cache"
+
+def cache_path_for(data_path):
+    """software_agenda.json -> software_agenda.cache"""
+    return os.path.splitext(data_path)[0] + ".cache"
+
+def content_hash(raw):
+    return hashlib.sha1(raw).hexdigest()
+
+class Snapshot:
+    """Conteúdo de uma cópia válida: dados, ordinais das validades e o bloco
+    binário, guardado para servir de base de mesclagem sem reler o JSON."""
+
+    __slots__ = ("data", "ordinals", "blob")
+
+    def __init__(self, data, ordinals, blob):
+        self.data = data
+        self.ordinals = ordinals
+        self.blob = blob
+
+def decode(blob):
+    """Dados de um Snapshot.blob (uma cópia nova a cada chamada)."""
+    return marshal.loads(blob)[0]
+
+def load(data_path, signature, raw=None):
+    """Snapshot da cópia binária, ou None se ela não corresponde ao JSON.
+
+    Com a mesma assinatura do arquivo o JSON nem é lido. Se só a assinatura
+    mudou (arquivo restaurado de um backup, copiado, tocado), 'raw' — os
+    bytes do JSON — decide pelo hash do conteúdo.
+    """
+    try:
+        with open(cache_path_for(data_path), "rb") as f:
+            header = marshal.load(f)
+            if header[:3] != (_MAGIC, CACHE_VERSION, tuple(sys.version_info[:2])):
+                return None
+            if header[3] != tuple(signature) and (raw is None or header[4] != content_hash(raw)):
+                return None
+            blob = f.read()
+        data, packed = marshal.loads(blob)
+    except (OSError, EOFError, ValueError, TypeError, IndexError):
+        return None  # ausente, de outra versão do Python ou corrompida
+    ordinals = array("i")
+    ordinals.frombytes(packed)
+    if len(ordinals) != len(data.get("softwares", ())):
+        return None
+    return Snapshot(data, ordinals, blob)
+
+def store(data_path, signature, raw, data):
+    """Grava a cópia de 'data' (o conteúdo de 'raw') e retorna os ordinais.
+
+    Falhas de gravação (pasta somente leitura) são ignoradas: a cópia é só
+    um atalho e o JSON continua sendo a fonte dos dados.
+    """
+    ordinals = array("i", validade_ordinals([r.get("validade", "") for r in data.get("softwares", [])]))
+    path = cache_path_for(data_path)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    header = (_MAGIC, CACHE_VERSION, tuple(sys.version_info[:2]), tuple(signature), content_hash(raw))
+    try:
+        with open(tmp_path, "wb") as f:
+            marshal.dump(header, f)
+            marshal.dump((data, ordinals.tobytes()), f)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return ordinals
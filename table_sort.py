@@ -0,0 +1,122 @@
+# Ordenação das colunas do editor, com as chaves guardadas por registro
+
+from data_handler import record_key
+from records import RecordInfo, license_count
+
+def text_key(value):
+    return str(value or "").casefold()
+
+def date_key(validade):
+    """Ordinal da validade: data inválida antes de todas, vitalício depois."""
+    return RecordInfo(str(validade or "")).ordinal
+
+def license_count_key(value):
+    """Chave de "numero_licencas", que é gravado como texto.
+
+    Números vêm primeiro, em ordem numérica ("2" antes de "10"); depois os
+    textos sem número ("Ilimitado"), em ordem alfabética; vazio por último.
+    """
+    text = str(value or "").strip()
+    if not text:
+        return (2, 0, "")
+    count = license_count(text)
+    if count is None:
+        return (1, 0, text.casefold())
+    return (0, count, text.casefold())
+
+class ColumnSorter:
+    """Ordena os registros por uma ou mais colunas (a primeira é a principal).
+
+    'columns' mapeia o nome da coluna para (valor, chave): valor é o nome
+    do campo ou uma função registro -> dado bruto, e chave(dado) calcula a
+    chave de ordenação. A chave fica guardada por registro junto com o dado
+    de onde saiu e só é recalculada quando esse dado muda.
+
+    Com uma só coluna, a ordem decrescente é exatamente a crescente
+    invertida, então trocar o sentido é inverter a lista já ordenada.
+    """
+
+    def __init__(self, columns, column=None, ascending=True):
+        self.columns = columns
+        self.spec = [(column, ascending)] if column else []  # [(coluna, crescente)]
+        self._keys = {name: {} for name in columns}  # coluna -> chave do registro -> (valor, chave)
+
+    def click(self, column, extend=False):
+        """Atualiza a ordenação após um clique no cabeçalho de 'column'.
+
+        Sem 'extend' a coluna passa a ser a única (e inverte o sentido se já
+        era a principal); com 'extend' (shift+clique) ela é acrescentada como
+        critério de desempate, ou tem o sentido invertido se já está na lista.
+        Retorna True quando basta inverter a lista que já estava ordenada.
+        """
+        if extend and self.spec:
+            for i, (name, ascending) in enumerate(self.spec):
+                if name == column:
+                    self.spec[i] = (name, not ascending)
+                    return len(self.spec) == 1
+            self.spec.append((column, True))
+            return False
+
+        if self.spec and self.spec[0][0] == column:
+            single = len(self.spec) == 1
+            self.spec = [(column, not self.spec[0][1])]
+            return single
+        self.spec = [(column, True)]
+        return False
+
+    def direction_of(self, column):
+        """(posição na ordenação a partir de 1, crescente) ou None."""
+        for i, (name, ascending) in enumerate(self.spec):
+            if name == column:
+                return i + 1, ascending
+        return None
+
+    def _key_function(self, column):
+        value_of, key_of = self.columns[column]
+        cache = self._keys[column]
+        get = cache.get
+
+        if isinstance(value_of, str):
+            field = value_of
+            value_of = lambda record: record.get(field, "")
+
+        def key(record):
+            value = value_of(record)
+            rkey = record.get("id") or record_key(record)
+            cached = get(rkey)
+            if cached is not None and cached[0] == value:
+                return cached[1]
+            result = key_of(value)
+            cache[rkey] = (value, result)
+            return result
+        return key
+
+    def sort(self, records):
+        """Nova lista com 'records' na ordem atual (estável)."""
+        result = list(records)
+        if len(self.spec) == 1:
+            column, ascending = self.spec[0]
+            result.sort(key=self._key_function(column))
+            if not ascending:
+                result.reverse()
+            return result
+        # Do critério menos importante para o principal: a ordenação do
+        # Python é estável, então cada passada preserva as anteriores nos empates
+        for column, ascending in reversed(self.spec):
+            result.sort(key=self._key_function(column), reverse=not ascending)
+        return result
+
+    def discard(self, record):
+        rkey = record_key(record)
+        for cache in self._keys.values():
+            cache.pop(rkey, None)
+
+    def invalidate(self, column=None):
+        """Esquece as chaves guardadas (de uma coluna ou de todas).
+
+        Necessário só para colunas cuja chave depende de algo além do valor
+        lido do registro, como a situação do servidor de ativação.
+        """
+        for name, cache in self._keys.items():
+            if column is None or name == column:
+                cache.clear()
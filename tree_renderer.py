@@ -0,0 +1,177 @@
+# Renderização incremental da Treeview do editor
+
+import tkinter as tk
+from tkinter import ttk
+from data_handler import record_key
+
+class TreeRenderer:
+    """Mantém uma ttk.Treeview sincronizada com uma lista ordenada de registros.
+
+    Cada registro vira um item cujo iid deriva de record_key(), então a cada
+    renderização só são aplicadas as diferenças (inserções, remoções,
+    movimentações e alterações de valores/tags).
+
+    Acima de 'virtual_threshold' registros só a janela visível é colocada na
+    Treeview, e a barra de rolagem passa a representar a lista inteira.
+
+    build_row(registro) deve retornar (imagem, values, tags).
+    """
+
+    def __init__(self, tree, scrollbar, build_row, virtual_threshold=1000, overscan=5):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.build_row = build_row
+        self.virtual_threshold = virtual_threshold
+        self.overscan = overscan
+
+        self.records = []     # lista completa, na ordem de exibição
+        self.offset = 0       # primeiro registro da janela (modo virtual)
+        self.virtual = False
+
+        self._rows = {}       # iid -> (imagem, values, tags) do que está na tela
+        self._by_iid = {}     # iid -> registro
+        self._order = []      # iids na ordem em que estão na Treeview
+
+        self._use_native_scroll()
+        for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tree.bind(seq, self._on_mousewheel, add="+")
+        self.tree.bind("<Configure>", self._on_resize, add="+")
+
+    # ---------- API ----------
+    @staticmethod
+    def iid_for(record):
+        return str(record_key(record))
+
+    def record_for(self, iid):
+        """Registro exibido no item 'iid' (ou None)."""
+        return self._by_iid.get(iid)
+
+    def render(self, records):
+        """Exibe 'records' (já filtrados e ordenados)."""
+        self.records = records
+        virtual = len(records) > self.virtual_threshold
+        if virtual != self.virtual:
+            self.virtual = virtual
+            if virtual:
+                self._use_virtual_scroll()
+            else:
+                self._use_native_scroll()
+        self.offset = self._clamp(self.offset)
+        self._render_window()
+
+    def refresh_record(self, record):
+        """Reaplica a linha de um único registro, se ele estiver na tela."""
+        iid = self.iid_for(record)
+        if iid in self._rows:
+            self._update_item(iid, record)
+
+    # ---------- Diferenças ----------
+    def _render_window(self):
+        if self.virtual:
+            window = self.records[self.offset:self.offset + self._viewport_rows()]
+        else:
+            window = self.records
+        self._apply(window)
+        if self.virtual:
+            self._update_scrollbar()
+
+    def _apply(self, window):
+        desired = [self.iid_for(r) for r in window]
+        keep = set(desired)
+
+        stale = [iid for iid in self._order if iid not in keep]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self._rows[iid]
+                del self._by_iid[iid]
+
+        # Percorre a ordem desejada com um ponteiro na ordem atual:
+        # só move o que estiver fora do lugar e insere o que for novo.
+        current = [iid for iid in self._order if iid in keep]
+        placed = set()
+        j = 0
+        for index, (iid, record) in enumerate(zip(desired, window)):
+            while j < len(current) and current[j] in placed:
+                j += 1
+
+            if iid not in self._rows:
+                image, values, tags = self.build_row(record)
+                self.tree.insert("", index, iid=iid, text="", image=image, values=values, tags=tags)
+                self._rows[iid] = (image, values, tags)
+            else:
+                if j < len(current) and current[j] == iid:
+                    j += 1
+                else:
+                    self.tree.move(iid, "", index)
+                self._update_item(iid, record)
+
+            self._by_iid[iid] = record
+            placed.add(iid)
+
+        self._order = desired
+
+    def _update_item(self, iid, record):
+        row = self.build_row(record)
+        if self._rows.get(iid) != row:
+            image, values, tags = row
+            self.tree.item(iid, image=image, values=values, tags=tags)
+            self._rows[iid] = row
+
+    # ---------- Rolagem ----------
+    def _use_native_scroll(self):
+        self.tree.configure(yscrollcommand=self.scrollbar.set)
+        self.scrollbar.configure(command=self.tree.yview)
+
+    def _use_virtual_scroll(self):
+        self.tree.configure(yscrollcommand="")
+        self.scrollbar.configure(command=self._on_scrollbar)
+
+    def _viewport_rows(self):
+        height = self.tree.winfo_height()
+        if height <= 1:  # ainda não foi desenhada
+            height = int(self.tree.cget("height") or 10) * 20
+        try:
+            row_height = int(ttk.Style(self.tree).lookup("Treeview", "rowheight") or 20)
+        except (tk.TclError, ValueError):
+            row_height = 20
+        return max(1, height // row_height) + self.overscan
+
+    def _clamp(self, offset):
+        if not self.virtual:
+            return 0
+        last = max(0, len(self.records) - self._viewport_rows() + self.overscan)
+        return max(0, min(offset, last))
+
+    def _scroll_to(self, offset):
+        offset = self._clamp(offset)
+        if offset != self.offset:
+            self.offset = offset
+            self._render_window()
+
+    def _update_scrollbar(self):
+        total = len(self.records) or 1
+        visible = self._viewport_rows() - self.overscan
+        self.scrollbar.set(self.offset / total, min(1.0, (self.offset + visible) / total))
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self._scroll_to(int(float(amount) * len(self.records)))
+        elif action == "scroll":
+            step = self._viewport_rows() - self.overscan if unit == "pages" else 1
+            self._scroll_to(self.offset + int(amount) * step)
+
+    def _on_resize(self, event):
+        # A janela visível muda de tamanho junto com a Treeview
+        if self.virtual:
+            self.offset = self._clamp(self.offset)
+            self._render_window()
+
+    def _on_mousewheel(self, event):
+        if not self.virtual:
+            return None
+        if event.num == 4 or event.delta > 0:
+            self._scroll_to(self.offset - 3)
+        else:
+            self._scroll_to(self.offset + 3)
+        return "break"
@@ -1,31 +1,29 @@
 import tkinter as tk
-from tkinter import simpledialog, messagebox, ttk
-from data_handler import load_data, save_data
-import datetime, webbrowser
+from tkinter import simpledialog, messagebox, filedialog, ttk
+from data_handler import load_data, SaveQueue, record_key, new_record_id, change_entry
+from tree_renderer import TreeRenderer
+from search_index import SearchIndex
+from records import RecordCache, LIFETIME_LABEL, WARN_DAYS
+from expiry_index import ExpiryIndex
+from renewal_forecast import RenewalForecast
+from date_parser import parse_any, parse_iso, to_iso_string, to_br_string, add_months
+from profiling import PROFILER, add_profile_arguments, start_from_args
+from import_export import read_import, export_records
+from record_merge import merge_records, index_by_id
+from endpoint_health import HealthMonitor, parse_target
+from table_sort import ColumnSorter, text_key, date_key, license_count_key
+from undo_history import UndoHistory
+import zipfile
+import datetime, os, webbrowser
 
-BR_FMT = "%d-%m-%Y"
-ISO_FMT = "%Y-%m-%d"
+# Intervalo da checagem de alterações feitas por outros usuários no arquivo
+EXTERNAL_POLL_MS = 3000
 
-def parse_date_any(s: str):
-    """Tenta parsear data nos formatos ISO (YYYY-MM-DD) e BR (DD-MM-YYYY)."""
-    for fmt in (ISO_FMT, BR_FMT):
-        try:
-            return datetime.datetime.strptime(s, fmt).date()
-        except ValueError:
-            continue
-    return None
-
-def parse_date_iso(s: str):
-    try:
-        return datetime.datetime.strptime(s, ISO_FMT).date()
-    except ValueError:
-        return None
+# Intervalo em que a coluna "Servidor" recebe os resultados das verificações
+HEALTH_POLL_MS = 500
 
-def to_iso_string(d: datetime.date) -> str:
-    return d.strftime(ISO_FMT)
-
-def to_br_string(d: datetime.date) -> str:
-    return d.strftime(BR_FMT)
+# Bit do Shift em event.state (shift+clique no cabeçalho acrescenta a coluna à ordenação)
+SHIFT_MASK = 0x0001
 
 # ====================================================
 # Classe auxiliar para manter popups em primeiro plano
@@ -102,23 +100,66 @@ class TopmostDialogHelper:
 # Classe Principal
 # ====================================================
 class SoftwareEditor(tk.Tk):
-    def __init__(self):
+    def __init__(self, paths=None, check_servers=True):
         super().__init__()
         self.title("Softwares CQMED")
         self.geometry("900x520")
         
         # Inicializações
-        self.data = load_data()
+        if paths:
+            # Várias agendas (uma por laboratório) em uma única lista
+            from inventories import load_inventories, InventorySaveQueue
+            self.inventory = load_inventories(paths)
+            self.data = self.inventory.data
+            self.save_queue = InventorySaveQueue(self.inventory)
+        else:
+            self.inventory = None
+            self.data = load_data()
+            self.save_queue = SaveQueue()  # Grava em segundo plano
+            if getattr(self.save_queue.backend, "ids_assigned", 0):
+                # Arquivo antigo, sem ids: o editor é quem os grava
+                self.save_queue.save(self.data)
+        self.by_id = {record_key(s): s for s in self.data.get("softwares", [])}
+        self.search_index = SearchIndex(self.data.get("softwares", []))
+        self.record_cache = RecordCache()  # Datas interpretadas uma vez por registro
+        # Ordinais das validades calculados uma vez para os dois índices
+        softwares = self.data.get("softwares", [])
+        ordinals = self._snapshot_ordinals()
+        if ordinals is None:
+            today = datetime.date.today()
+            ordinals = [self.record_cache.get(soft, today).ordinal for soft in softwares]
+        self.expiry_index = ExpiryIndex(softwares, self.record_cache, ordinals)
+        self.forecast = RenewalForecast(softwares, self.record_cache, ordinals)
+        self._filter_job = None
         self.filtered_data = list(self.data.get("softwares", []))
-        self.sort_key = "date"
-        self.sort_asc = True
+        self.sorter = ColumnSorter(self._sort_columns(), "Validade")
+        self._sort_extend = False  # o último clique no cabeçalho foi com Shift
         self.dialogs = TopmostDialogHelper(self)  # Helper para diálogos
+        # Servidores de ativação, testados em segundo plano (check_servers=False: nenhuma conexão)
+        self.health = HealthMonitor(enabled=check_servers)
+        self._health_generation = 0
+        self.history = UndoHistory()  # Desfazer/refazer das ações desta sessão
+        self._undo_sources = {}  # id -> agenda de origem dos registros removidos (várias agendas)
         
         # Configuração da UI
         self._setup_ui()
         
         # Carrega dados
         self.apply_filter()
+
+        if self.inventory is not None and self.inventory.errors:
+            self.dialogs.show_warning(
+                "Agendas ignoradas",
+                "\n".join(f"{path}: {error}" for path, error in self.inventory.errors)
+            )
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.bind("<Control-z>", lambda e: self.undo())
+        self.bind("<Control-y>", lambda e: self.redo())
+        self.bind("<Control-Z>", lambda e: self.redo())  # Ctrl+Shift+Z
+        self._poll_save_queue()
+        self.after(EXTERNAL_POLL_MS, self._poll_external_changes)
+        self.after(HEALTH_POLL_MS, self._poll_health)
     
     def _setup_ui(self):
         """Configura todos os elementos da interface"""
@@ -133,8 +174,31 @@ class SoftwareEditor(tk.Tk):
         
         # Menu Arquivo
         file_menu = tk.Menu(menubar, tearoff=0)
-        file_menu.add_command(label="Sair", command=self.quit)
+        file_menu.add_command(label="Importar CSV/XLSX...", command=self.import_file)
+        file_menu.add_command(label="Exportar CSV/XLSX...", command=self.export_file)
+        file_menu.add_separator()
+        file_menu.add_command(label="Sair", command=self.on_close)
         menubar.add_cascade(label="Arquivo", menu=file_menu)
+
+        # Menu Editar (desfazer/refazer)
+        self.edit_menu = tk.Menu(menubar, tearoff=0, postcommand=self._update_edit_menu)
+        self.edit_menu.add_command(label="Desfazer", accelerator="Ctrl+Z", command=self.undo)
+        self.edit_menu.add_command(label="Refazer", accelerator="Ctrl+Y", command=self.redo)
+        menubar.add_cascade(label="Editar", menu=self.edit_menu)
+
+        # Menu Em lote (vale para todos os itens selecionados)
+        menubar.add_cascade(label="Em lote", menu=self._create_bulk_menu(menubar))
+
+        # Menu Relatórios
+        report_menu = tk.Menu(menubar, tearoff=0)
+        report_menu.add_command(label="Previsão de renovações", command=self._show_forecast)
+        menubar.add_cascade(label="Relatórios", menu=report_menu)
+
+        # Menu Diagnóstico
+        diag_menu = tk.Menu(menubar, tearoff=0)
+        diag_menu.add_command(label="Tempos por etapa", command=self._show_timings)
+        diag_menu.add_command(label="Verificar servidores de ativação", command=self.recheck_servers)
+        menubar.add_cascade(label="Diagnóstico", menu=diag_menu)
         
         # Menu Ajuda
         help_menu = tk.Menu(menubar, tearoff=0)
@@ -143,21 +207,242 @@ class SoftwareEditor(tk.Tk):
         
         self.config(menu=menubar)
     
+    def _create_bulk_menu(self, parent):
+        bulk_menu = tk.Menu(parent, tearoff=0)
+        bulk_menu.add_command(label="Renovar: sim", command=lambda: self.bulk_set_renovacao("sim"))
+        bulk_menu.add_command(label="Renovar: não", command=lambda: self.bulk_set_renovacao("nao"))
+        bulk_menu.add_command(label="Adiar validade (meses)...", command=self.bulk_shift_validade)
+        bulk_menu.add_command(label="Definir ativação...", command=self.bulk_set_ativacao)
+        bulk_menu.add_separator()
+        bulk_menu.add_command(label="Remover selecionados", command=self.remove_software)
+        return bulk_menu
+
     def _show_about(self):
         about_text = "Softwares CQMED\nVersão 1.0\n\nGerenciador de licenças de software"
         self.dialogs.show_info("Sobre", about_text)
     
+    def _show_timings(self):
+        """Mostra p50/p95 de cada etapa medida nesta sessão (--profile)"""
+        if not PROFILER.enabled:
+            self.dialogs.show_info(
+                "Diagnóstico",
+                "A medição de tempos está desligada.\n\nAbra o editor com --profile para ativá-la."
+            )
+            return
+
+        win = tk.Toplevel(self)
+        win.title("Tempos por etapa")
+        columns = ("Etapa", "Chamadas", "p50 (ms)", "p95 (ms)", "Máx. (ms)", "Total (ms)")
+        table = ttk.Treeview(win, columns=columns, show="headings", height=8)
+        for col in columns:
+            table.heading(col, text=col)
+            table.column(col, width=90, anchor=tk.E if col != "Etapa" else tk.W)
+        table.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        def refresh():
+            table.delete(*table.get_children())
+            for name, stats in PROFILER.summary().items():
+                table.insert("", tk.END, values=(
+                    name, stats["chamadas"], f"{stats['p50_ms']:.2f}", f"{stats['p95_ms']:.2f}",
+                    f"{stats['max_ms']:.2f}", f"{stats['total_ms']:.1f}"
+                ))
+
+        tk.Button(win, text="Atualizar", command=refresh).pack(pady=(0, 10))
+        refresh()
+
+    def _show_forecast(self):
+        """Vencimentos, licenças e renovação por mês nos próximos 24 meses"""
+        win = tk.Toplevel(self)
+        win.title("Previsão de renovações")
+        columns = ("Mês", "Softwares", "Licenças", "Renovar", "Não renovar")
+        table = ttk.Treeview(win, columns=columns, show="headings", height=16)
+        for col in columns:
+            table.heading(col, text=col)
+            table.column(col, width=90, anchor=tk.E if col != "Mês" else tk.W)
+        table.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+
+        def row(label, totals):
+            table.insert("", tk.END, values=(
+                label, totals["softwares"], totals["licencas"], totals["renovar"], totals["nao_renovar"]
+            ))
+
+        def refresh():
+            # Os totais já estão prontos (mantidos a cada alteração): só monta as linhas
+            report = self.forecast.report()
+            table.delete(*table.get_children())
+            if report["atrasados"]["softwares"]:
+                row("Atrasados", report["atrasados"])
+            for month in report["meses"]:
+                row(month["mes"], month)
+            row("Total", report["total"])
+
+        tk.Button(win, text="Atualizar", command=refresh).pack(pady=(0, 10))
+        refresh()
+
+    def _show_report(self, title, text):
+        """Janela com texto rolável (relatórios longos demais para um messagebox)"""
+        win = tk.Toplevel(self)
+        win.title(title)
+        win.attributes("-topmost", True)
+        frame = tk.Frame(win)
+        frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        scrollbar = ttk.Scrollbar(frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        text_widget = tk.Text(frame, width=90, height=20, wrap=tk.WORD, yscrollcommand=scrollbar.set)
+        text_widget.insert("1.0", text)
+        text_widget.config(state=tk.DISABLED)
+        text_widget.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.config(command=text_widget.yview)
+        tk.Button(win, text="Fechar", command=win.destroy).pack(pady=(0, 10))
+
     def _create_status_bar(self):
+        status_frame = tk.Frame(self)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+
         self.status_var = tk.StringVar()
         self.status_var.set("Pronto")
         status_bar = tk.Label(
-            self, 
+            status_frame, 
             textvariable=self.status_var, 
             bd=1, 
             relief=tk.SUNKEN, 
             anchor=tk.W
         )
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+
+        # Situação da gravação em segundo plano
+        self.save_info_var = tk.StringVar()
+        save_info = tk.Label(
+            status_frame,
+            textvariable=self.save_info_var,
+            bd=1,
+            relief=tk.SUNKEN,
+            anchor=tk.E,
+            width=42
+        )
+        save_info.pack(side=tk.RIGHT)
+
+    def _poll_save_queue(self):
+        """Atualiza a barra de status com a fila de gravação (a cada 250 ms)"""
+        queue = self.save_queue
+        if queue.last_error is not None:
+            text = f"Erro ao salvar ({queue.pending_count} pendentes): {queue.last_error}"
+        elif queue.last_flush_ms is None:
+            text = f"Pendentes: {queue.pending_count}"
+        else:
+            text = f"Pendentes: {queue.pending_count} | Última gravação: {queue.last_flush_ms:.1f} ms"
+        self.save_info_var.set(text)
+        self.after(250, self._poll_save_queue)
+
+    def _new_save_queue(self):
+        if self.inventory is not None:
+            from inventories import InventorySaveQueue
+            return InventorySaveQueue(self.inventory)
+        return SaveQueue(self.save_queue.backend)
+
+    def _target_source(self):
+        """Agenda que recebe registros novos: a do item selecionado ou a primeira"""
+        for soft in self._selected_records():
+            source = self.inventory.source_of(soft)
+            if source is not None:
+                return source
+        return self.inventory.sources[0] if self.inventory.sources else None
+
+    def _poll_external_changes(self):
+        """Incorpora as alterações gravadas no arquivo por outros usuários"""
+        if self.inventory is None:
+            targets = [(self.save_queue.backend, None)]
+        else:
+            targets = [(source.backend, source) for source in self.inventory.sources]
+        for backend, source in targets:
+            poll = getattr(backend, "poll_external", None)
+            if poll is None:
+                continue
+            try:
+                change = poll()
+            except (OSError, ValueError):
+                change = None  # arquivo inacessível ou em gravação: tenta de novo depois
+            if change is not None:
+                self._merge_external(backend, source, *change)
+        self.after(EXTERNAL_POLL_MS, self._poll_external_changes)
+
+    def _merge_external(self, backend, source, base, theirs, signature, text):
+        """Mescla registro a registro, alterando os dicts em memória no lugar"""
+        if source is None:
+            softwares = self.data["softwares"]
+        else:
+            softwares = self.inventory.records_of(source)
+        merged, conflicts = merge_records(base, softwares, theirs)
+
+        current = index_by_id(softwares)
+        added, changed, result = [], [], []
+        for record in merged:
+            mine = current.pop(record["id"], None)
+            if mine is None:
+                added.append(record)
+                result.append(record)
+                continue
+            if record is not mine and record != mine:
+                mine.clear()
+                mine.update(record)
+                changed.append(mine)
+            result.append(mine)
+        removed = list(current.values())
+
+        if source is None:
+            self.data["softwares"][:] = result
+        else:
+            self.inventory.replace_records(source, result)
+        for soft in added:
+            self._on_record_added(soft)
+        for soft in changed:
+            self._on_record_changed(soft)
+        for soft in removed:
+            self._on_record_removed(soft)
+        backend.mark_synced(signature, text, theirs)
+
+        if added or changed or removed:
+            self.apply_filter()
+            message = (f"Alterações de outro usuário: {len(added)} incluído(s), "
+                       f"{len(changed)} alterado(s), {len(removed)} removido(s)")
+            if conflicts:
+                message += f"; {len(conflicts)} conflito(s), mantida a versão local"
+            self.status_var.set(message)
+
+    def on_close(self):
+        """Grava as alterações pendentes antes de fechar"""
+        if not self.save_queue.close():
+            if not self.dialogs.ask_yesno(
+                "Erro ao salvar",
+                f"Não foi possível salvar as alterações:\n{self.save_queue.last_error}\n\nSair mesmo assim?"
+            ):
+                self.save_queue = self._new_save_queue()
+                self.save_queue.save(self.data)
+                return
+        else:
+            # Deixa a cópia binária em dia para a próxima abertura
+            for backend, data in self._storage_targets():
+                write_snapshot = getattr(backend, "write_snapshot", None)
+                if write_snapshot is not None:
+                    write_snapshot(dict(data))
+        self.health.close()
+        self.destroy()
+
+    def _snapshot_ordinals(self):
+        """Ordinais das validades trazidos pela cópia binária (None se algum arquivo não a tinha)."""
+        ordinals = []
+        for backend, data in self._storage_targets():
+            loaded = getattr(backend, "load_ordinals", None)
+            if loaded is None or len(loaded) != len(data["softwares"]):
+                return None
+            ordinals.extend(loaded)
+        return ordinals
+
+    def _storage_targets(self):
+        """(backend, data) de cada arquivo aberto."""
+        if self.inventory is None:
+            return [(self.save_queue.backend, self.data)]
+        return [(source.backend, source.view) for source in self.inventory.sources]
     
     def _create_search_frame(self):
         """Cria o frame de pesquisa"""
@@ -166,14 +451,14 @@ class SoftwareEditor(tk.Tk):
 
         tk.Label(search_frame, text="Pesquisar:").pack(side=tk.LEFT)
         self.search_var = tk.StringVar()
-        self.search_var.trace("w", lambda *args: self.apply_filter())
+        self.search_var.trace("w", lambda *args: self._schedule_filter())
         tk.Entry(search_frame, textvariable=self.search_var).pack(side=tk.LEFT, fill=tk.X, expand=True, padx=6)
 
         tk.Label(search_frame, text="Status:").pack(side=tk.LEFT, padx=6)
-        self.status_var = tk.StringVar(value="Todos")
+        self.status_filter_var = tk.StringVar(value="Todos")
         status_cb = ttk.Combobox(
             search_frame, 
-            textvariable=self.status_var, 
+            textvariable=self.status_filter_var, 
             values=["Todos", "Somente próximos", "Somente vencidos"], 
             width=18, 
             state="readonly"
@@ -183,8 +468,8 @@ class SoftwareEditor(tk.Tk):
     
     def _create_treeview(self):
         """Cria a treeview e configura colunas"""
-        columns = ("Nome", "Validade", "Licenças", "Dias restantes", "Ativação", "Username", "Renovar")
-        self.tree = ttk.Treeview(self, columns=columns, show="headings")
+        columns = ("Nome", "Validade", "Licenças", "Dias restantes", "Ativação", "Username", "Renovar", "Servidor", "Origem")
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="extended")
         self.tree["show"] = ("tree", "headings")  # habilita a coluna tree (#0)
 
 
@@ -193,19 +478,18 @@ class SoftwareEditor(tk.Tk):
         self.unchecked_img = tk.PhotoImage(file="unchecked.png")
 
         # Coluna de checkbox (#0)
-        self.tree.heading("#0", text="Renovar")
         self.tree.column("#0", width=80, anchor=tk.CENTER)
 
         self.tree.heading("Renovar", text="Renovar (hidden)")
         self.tree.column("Renovar", width=0, stretch=False)
 
-        # Configura cabeçalhos
-        self.tree.heading("Nome", text="Nome")
-        self.tree.heading("Validade", text="Validade", command=self.sort_by_date)
-        self.tree.heading("Licenças", text="Licenças")
-        self.tree.heading("Dias restantes", text="Dias restantes", command=self.sort_by_days)
-        self.tree.heading("Ativação", text="Ativação")
-        self.tree.heading("Username", text="Username")
+        # Configura cabeçalhos: todos ordenam (shift+clique desempata por outra coluna)
+        self._sort_headings = {"#0": "Renovar"}
+        for col in ("Nome", "Validade", "Licenças", "Dias restantes", "Ativação", "Username", "Servidor", "Origem"):
+            self._sort_headings[col] = col
+        for heading, column in self._sort_headings.items():
+            self.tree.heading(heading, command=lambda c=column: self.sort_by_column(c))
+        self._update_sort_headings()
 
         # Configura colunas
         self.tree.column("Nome", width=130, anchor=tk.W)
@@ -214,24 +498,38 @@ class SoftwareEditor(tk.Tk):
         self.tree.column("Dias restantes", width=80, anchor=tk.W)
         self.tree.column("Ativação", width=270, anchor=tk.W)
         self.tree.column("Username", width=150, anchor=tk.W)
+
+        # Situação do servidor/portal de ativação (preenchida em segundo plano)
+        self.tree.column("Servidor", width=130, anchor=tk.W)
+
+        # Agenda de origem: só aparece com várias agendas abertas
+        self.tree.column("Origem", width=110, anchor=tk.W)
+        if self.inventory is None:
+            self.tree["displaycolumns"] = columns[:-1]
         
         # Tags de estilo
         self.tree.tag_configure("ok", foreground="green")
         self.tree.tag_configure("warn", foreground="orange")
         self.tree.tag_configure("expired", foreground="red")
         
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        tree_frame = tk.Frame(self)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(in_=tree_frame, side=tk.LEFT, fill=tk.BOTH, expand=True)
 
         self.tree.bind("<Button-1>", self.toggle_checkbox)
+        self.tree.bind("<Button-1>", self._remember_sort_modifier, add="+")
         self.tree.bind("<Button-3>", self.show_context_menu) # Botão direito
         self.tree.bind("<Double-1>", self.on_double_click)   # Duplo clique
 
-
-        self.tree.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        # Aplica só as diferenças na Treeview (e virtualiza listas grandes)
+        self.renderer = TreeRenderer(self.tree, scrollbar, self._build_row)
                         
         # Cria o menu de contexto uma vez para reusar
         self.context_menu = tk.Menu(self, tearoff=0)
         self.context_menu.add_command(label="Copiar", command=self.copy_selection)
+        self.context_menu.add_cascade(label="Em lote", menu=self._create_bulk_menu(self.context_menu))
     
     def _create_buttons(self):
         """Cria os botões CRUD"""
@@ -250,49 +548,64 @@ class SoftwareEditor(tk.Tk):
     # ============================
     # Renderização
     # ============================
+    @PROFILER.timed("render")
     def load_tree(self):
-        self.tree.delete(*self.tree.get_children())
-        today = datetime.date.today()
-        
-        for soft in self.filtered_data:
-            nome = soft.get("nome", "")
-            iso_str = soft.get("validade", "")
-            ativ = soft.get("ativacao", "")
-            license = soft.get("numero_licencas", "")
-            username = soft.get("usuario", "")
-            renovar = soft.get("renovacao", "")
-
-            # Lógica para Vitalício
-            if iso_str.lower() == "vitalício":
-                validade_br = "Vitalício"
-                dias = "∞"
-                tag = "ok" # Fica verde
-            else:
-                d = parse_date_iso(iso_str)
-                if d is None:
-                    validade_br = iso_str
-                    dias = "?"
-                    tag = ""
-                else:
-                    validade_br = to_br_string(d)
-                    dias = (d - today).days
-                    if dias < 0:
-                        tag = "expired"
-                    elif dias <= 90:
-                        tag = "warn"
-                    else:
-                        tag = "ok"
-
-            img = self.checked_img if renovar == "sim" else self.unchecked_img
-
-            item_id = self.tree.insert(
-                "", "end",
-                text="",
-                image=img,
-                values=(nome, validade_br, license, dias, ativ, username),
-                tags=(tag,)
-            )
-            self.tree.set(item_id, "Renovar", renovar)
+        self._today = datetime.date.today()
+        self.renderer.render(self.filtered_data)
+
+    def _build_row(self, soft):
+        """Monta (imagem, values, tags) de uma linha da Treeview"""
+        nome = soft.get("nome", "")
+        ativ = soft.get("ativacao", "")
+        license = soft.get("numero_licencas", "")
+        username = soft.get("usuario", "")
+        renovar = soft.get("renovacao", "")
+
+        info = self.record_cache.get(soft, self._today)
+        if info.lifetime:
+            validade_br = LIFETIME_LABEL
+            dias = "∞"
+        elif info.date is None:
+            validade_br = info.validade
+            dias = "?"
+        else:
+            validade_br = to_br_string(info.date)
+            dias = info.days
+        tag = info.status
+
+        origem = self.inventory.label_of(soft) if self.inventory is not None else ""
+        servidor = self._server_status(ativ)
+
+        img = self.checked_img if renovar == "sim" else self.unchecked_img
+        return img, (nome, validade_br, license, dias, ativ, username, renovar, servidor, origem), (tag,)
+
+    def _server_status(self, ativacao):
+        """Texto da coluna "Servidor"; nunca espera a rede (ver HealthMonitor)"""
+        target = parse_target(ativacao)
+        if target is None or not self.health.enabled:
+            return ""
+        result = self.health.status(target)
+        if result is None:
+            return "verificando..."
+        return result.describe()
+
+    def _poll_health(self):
+        """Redesenha as linhas quando chegam resultados novos dos servidores"""
+        generation = self.health.generation
+        if generation != self._health_generation:
+            self._health_generation = generation
+            # A ordem atual não muda sozinha; o próximo clique já usa os resultados novos
+            self.sorter.invalidate("Servidor")
+            self.load_tree()
+        self.after(HEALTH_POLL_MS, self._poll_health)
+
+    def recheck_servers(self):
+        if not self.health.enabled:
+            self.status_var.set("A verificação dos servidores está desligada (--sem-servidores).")
+            return
+        self.health.invalidate()
+        self.load_tree()
+        self.status_var.set("Verificando os servidores de ativação...")
 
     def toggle_checkbox(self, event):
         """Alterna o estado do checkbox e salva no JSON"""
@@ -304,98 +617,159 @@ class SoftwareEditor(tk.Tk):
         if not item_id:
             return
 
-        # Estado atual vem do próprio tree
-        current_state = self.tree.set(item_id, "Renovar")  # "sim" ou "nao"
-
-        new_state = "nao" if current_state == "sim" else "sim"
-        new_img = self.checked_img if new_state == "sim" else self.unchecked_img
+        # O iid do item é o id do registro
+        soft = self.by_id.get(item_id)
+        if soft is None:
+            return
+        before = dict(soft)
+        soft["renovacao"] = "nao" if soft.get("renovacao") == "sim" else "sim"
+        self._remember(f"Renovar '{soft.get('nome', '')}'", [(before, soft)])
+        self._on_record_changed(soft)
 
-        # Atualiza a Treeview
-        self.tree.item(item_id, image=new_img)
-        self.tree.set(item_id, "Renovar", new_state)
+        # Agenda a gravação só do registro alterado e atualiza a linha
+        self.save_queue.update(self.data, soft)
+        self.renderer.refresh_record(soft)
 
-        # Atualiza a lista em memória
-        idx = self.tree.index(item_id)
-        soft = self.filtered_data[idx]
-        soft["renovacao"] = new_state
 
-        # Propaga para o dataset completo
-        for s in self.data["softwares"]:
-            if s["nome"] == soft["nome"]:  # se "nome" for único
-                s["renovacao"] = new_state
+    # ============================
+    # Índices em memória
+    # ============================
+    def _on_record_added(self, soft):
+        self.by_id[record_key(soft)] = soft
+        self.search_index.add(soft)
+        self.expiry_index.add(soft)
+        self.forecast.add(soft)
 
-        # Salva no JSON
-        save_data(self.data)
+    def _on_record_changed(self, soft):
+        self.search_index.update(soft)
+        self.expiry_index.update(soft)
+        self.forecast.update(soft)
 
+    def _on_record_removed(self, soft):
+        self.by_id.pop(record_key(soft), None)
+        self.search_index.remove(soft)
+        self.expiry_index.remove(soft)
+        self.forecast.remove(soft)
+        self.record_cache.discard(soft)
+        self.sorter.discard(soft)
 
-    
     # ============================
     # Filtro + Ordenação
     # ============================
+    def _schedule_filter(self, delay=150):
+        """Aguarda uma pausa na digitação antes de filtrar"""
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+        self._filter_job = self.after(delay, self.apply_filter)
+
     def apply_filter(self):
+        if self._filter_job is not None:
+            self.after_cancel(self._filter_job)
+            self._filter_job = None
+
+        with PROFILER.stage("filter"):
+            self.filtered_data = self._filtered_records()
+        self.apply_sort()
+        self.load_tree()
+
+    def _filtered_records(self):
         query = (self.search_var.get() or "").lower().strip()
-        status = self.status_var.get()
+        status = self.status_filter_var.get()
         today = datetime.date.today()
 
-        base = self.data.get("softwares", [])
-        result = []
-        for s in base:
-            if query and query not in s.get("nome", "").lower():
-                continue
-            d = parse_date_iso(s.get("validade", ""))
-            dias = (d - today).days if d else None
+        # Consultas por intervalo no índice de validade
+        if status == "Somente próximos":
+            in_range = self.expiry_index.expiring_within(WARN_DAYS, today)
+        elif status == "Somente vencidos":
+            in_range = self.expiry_index.expired(today)
+        else:
+            in_range = None
 
-            if status == "Somente próximos" and not (dias is not None and 0 <= dias <= 90):
-                continue
-            if status == "Somente vencidos" and not (dias is not None and dias < 0):
-                continue
-            result.append(s)
+        if query:
+            result = self.search_index.search(query)
+            if in_range is not None:
+                keys = {record_key(s) for s in in_range}
+                result = [s for s in result if record_key(s) in keys]
+        elif in_range is not None:
+            result = in_range
+        else:
+            result = list(self.data.get("softwares", []))
+        return result
 
-        self.filtered_data = result
-        self.apply_sort()
-        self.load_tree()
+    def _sort_columns(self):
+        """Coluna -> (campo ou função que lê o registro, chave de ordenação do valor)"""
+        columns = {
+            "Renovar": ("renovacao", lambda v: v != "sim"),  # marcados primeiro
+            "Nome": ("nome", text_key),
+            "Validade": ("validade", date_key),
+            "Licenças": ("numero_licencas", license_count_key),
+            # Mesma ordem da validade (vitalício no fim, data inválida no início)
+            "Dias restantes": ("validade", date_key),
+            "Ativação": ("ativacao", text_key),
+            "Username": ("usuario", text_key),
+            "Servidor": ("ativacao", self._server_sort_key),
+        }
+        if self.inventory is not None:
+            columns["Origem"] = (self.inventory.label_of, text_key)
+        return columns
 
+    def _server_sort_key(self, ativacao):
+        """Acessíveis (pela latência), inacessíveis, ainda verificando, sem servidor"""
+        target = parse_target(ativacao)
+        if target is None or not self.health.enabled:
+            return (3, 0, "")
+        result = self.health.status(target)
+        if result is None:
+            return (2, 0, "")
+        if result.ok:
+            return (0, result.latency_ms, "")
+        return (1, 0, result.error or "")
+
+    # Colunas na ordem da validade: o ExpiryIndex já as mantém ordenadas
+    _INDEXED_SORT_COLUMNS = ("Validade", "Dias restantes")
+
+    @PROFILER.timed("sort")
     def apply_sort(self):
-        def get_sort_date(s):
-            val = s.get("validade", "")
-            if val.lower() == "vitalício":
-                return datetime.date(9999, 12, 31) # Data futura longínqua
-            return parse_date_iso(val) or datetime.date.min
-
-        if self.sort_key == "date":
-            self.filtered_data.sort(
-                key=get_sort_date,
-                reverse=not self.sort_asc
-            )
-        elif self.sort_key == "days":
-            today = datetime.date.today()
-            def days_key(s):
-                val = s.get("validade", "")
-                if val.lower() == "vitalício":
-                    return 999999 # Número alto de dias
-                d = parse_date_iso(val)
-                return (d - today).days if d else -999999
-            
-            self.filtered_data.sort(key=days_key, reverse=not self.sort_asc)
+        spec = self.sorter.spec
+        if len(spec) == 1 and spec[0][0] in self._INDEXED_SORT_COLUMNS:
+            # Critério único por data: lê a ordem do índice em vez de ordenar
+            self.filtered_data = self.expiry_index.order(self.filtered_data, reverse=not spec[0][1])
+            return
+        self.filtered_data = self.sorter.sort(self.filtered_data)
 
-    def sort_by_date(self):
-        if self.sort_key == "date":
-            self.sort_asc = not self.sort_asc
-        else:
-            self.sort_key = "date"
-            self.sort_asc = True
-        self.apply_sort()
-        self.load_tree()
+    def _remember_sort_modifier(self, event):
+        # O command do cabeçalho não recebe o evento: guarda aqui se o Shift estava pressionado
+        self._sort_extend = bool(event.state & SHIFT_MASK)
 
-    def sort_by_days(self):
-        if self.sort_key == "days":
-            self.sort_asc = not self.sort_asc
+    def sort_by_column(self, column):
+        if column in self.sorter.columns:
+            self.change_sort(column, extend=self._sort_extend)
+            self._update_sort_headings()
+            self.load_tree()
+        self._sort_extend = False
+
+    def change_sort(self, column, extend=False):
+        """Aplica um clique no cabeçalho à lista exibida (sem redesenhar)"""
+        if self.sorter.click(column, extend):
+            # Só o sentido mudou: inverter a lista já ordenada basta
+            with PROFILER.stage("sort"):
+                self.filtered_data = self.filtered_data[::-1]
         else:
-            self.sort_key = "days"
-            self.sort_asc = True
-        self.apply_sort()
-        self.load_tree()
-    
+            self.apply_sort()
+
+    def _update_sort_headings(self):
+        """Mostra ▲/▼ nas colunas da ordenação (com a prioridade, se forem várias)"""
+        several = len(self.sorter.spec) > 1
+        for heading, column in self._sort_headings.items():
+            text = column
+            position = self.sorter.direction_of(column)
+            if position is not None:
+                index, ascending = position
+                text += " ▲" if ascending else " ▼"
+                if several:
+                    text += str(index)
+            self.tree.heading(heading, text=text)
+
     # ================================
     # Interatividade (Copiar e Links)
     # ================================
@@ -406,8 +780,9 @@ class SoftwareEditor(tk.Tk):
         col = self.tree.identify_column(event.x)
         
         if item and col:
-            # Seleciona a linha visualmente
-            self.tree.selection_set(item)
+            # Seleciona a linha visualmente (mantém a seleção múltipla se ela incluir a linha)
+            if item not in self.tree.selection():
+                self.tree.selection_set(item)
             # Guarda onde clicou para usar na função de copiar
             self.clicked_item = item
             self.clicked_col = col
@@ -468,7 +843,7 @@ class SoftwareEditor(tk.Tk):
         if not validade_in: 
             return
         
-        d = parse_date_any(validade_in)
+        d = parse_any(validade_in)
         if not d:
             self.dialogs.show_error("Erro", "Data inválida. Use YYYY-MM-DD ou DD-MM-YYYY.")
             return
@@ -485,15 +860,21 @@ class SoftwareEditor(tk.Tk):
         if not renovacao: 
             return
 
-        self.data["softwares"].append({
+        soft = {
+            "id": new_record_id(),
             "nome": nome, 
             "validade": to_iso_string(d),
             "numero_licencas": numero_licencas,
             "ativacao": ativacao,
             "usuario": username,
             "renovacao": renovacao
-        })
-        save_data(self.data)
+        }
+        self.data["softwares"].append(soft)
+        if self.inventory is not None:
+            self.inventory.assign(soft, self._target_source())
+        self._remember(f"Adicionar '{nome}'", [(None, soft)])
+        self.save_queue.insert(self.data, soft)
+        self._on_record_added(soft)
         self.apply_filter()
         self.status_var.set(f"Software '{nome}' adicionado com sucesso")
 
@@ -502,12 +883,14 @@ class SoftwareEditor(tk.Tk):
         if not selected:
             self.dialogs.show_warning("Aviso", "Selecione um software para editar.")
             return
+        if len(selected) > 1:
+            self.dialogs.show_warning("Aviso", "Selecione um único software para editar.\nPara vários, use o menu Em lote.")
+            return
 
-        idx = self.tree.index(selected[0])
-        soft = self.filtered_data[idx]
+        soft = self.by_id[selected[0]]
 
         current_name = soft.get("nome", "")
-        current_date = parse_date_iso(soft.get("validade", ""))
+        current_date = parse_iso(soft.get("validade", ""))
         current_date_br = to_br_string(current_date) if current_date else soft.get("validade", "")
         current_num = soft.get("numero_licencas", "")
         current_ativ = soft.get("ativacao", "")
@@ -521,7 +904,7 @@ class SoftwareEditor(tk.Tk):
         if new_validade_in is None: 
             return
         
-        d = parse_date_any(new_validade_in)
+        d = parse_any(new_validade_in)
         if not d:
             self.dialogs.show_error("Erro", "Data inválida.")
             return
@@ -534,31 +917,299 @@ class SoftwareEditor(tk.Tk):
         
         new_user = self.dialogs.ask_string("Editar", "Nome do usuário (username):", initial=current_user)
         
+        before = dict(soft)
         soft["nome"] = new_nome
         soft["validade"] = to_iso_string(d)
         soft["numero_licencas"] = new_num
-        soft["ativacao"] = new_ativacao
-        soft["usuario"] = new_ativacao
-        save_data(self.data)
+        if new_ativacao is not None:
+            soft["ativacao"] = new_ativacao
+        if new_user is not None:
+            soft["usuario"] = new_user
+        self._remember(f"Editar '{new_nome}'", [(before, soft)])
+        self.save_queue.update(self.data, soft)
+        self._on_record_changed(soft)
         self.apply_filter()
         self.status_var.set(f"Software '{new_nome}' atualizado com sucesso")
 
+    def import_file(self):
+        """Importa um lote de softwares de um CSV ou XLSX (tudo ou nada)"""
+        path = filedialog.askopenfilename(
+            parent=self,
+            title="Importar softwares",
+            filetypes=[("Planilhas", "*.csv *.xlsx"), ("CSV", "*.csv"), ("Excel", "*.xlsx")]
+        )
+        if not path:
+            return
+
+        try:
+            batch = read_import(path, self.data["softwares"])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile, SyntaxError) as e:
+            self.dialogs.show_error("Erro", f"Não foi possível ler o arquivo:\n{e}")
+            return
+
+        if batch.errors:
+            self._show_report(
+                "Erros na importação",
+                f"Nenhum registro foi importado. {len(batch.errors)} linha(s) com erro:\n\n" + batch.format_errors()
+            )
+            return
+        if not batch.new and not batch.updates:
+            self.dialogs.show_info("Importar", "O arquivo não tem registros.")
+            return
+        if not self.dialogs.ask_yesno(
+            "Importar",
+            f"Incluir {len(batch.new)} software(s) e atualizar {len(batch.updates)} já existente(s)?"
+        ):
+            return
+
+        # Aplica o lote inteiro, grava uma vez e atualiza a tela uma vez
+        before = {record_key(soft): dict(soft) for soft, _ in batch.updates}
+        new, updated = batch.apply(self.data["softwares"])
+        if self.inventory is not None:
+            target = self._target_source()
+            for soft in new:
+                self.inventory.assign(soft, target)
+        self._remember(
+            f"Importar {os.path.basename(path)}",
+            [(None, soft) for soft in new] + [(before[record_key(soft)], soft) for soft in updated]
+        )
+        for soft in new:
+            self._on_record_added(soft)
+        for soft in updated:
+            self._on_record_changed(soft)
+        self.save_queue.save(self.data)
+        self.apply_filter()
+        self.status_var.set(f"Importação: {len(new)} incluído(s), {len(updated)} atualizado(s)")
+
+    def export_file(self):
+        """Exporta os softwares exibidos (filtro e ordem atuais)"""
+        path = filedialog.asksaveasfilename(
+            parent=self,
+            title="Exportar softwares",
+            defaultextension=".csv",
+            filetypes=[("CSV", "*.csv"), ("Excel", "*.xlsx")]
+        )
+        if not path:
+            return
+        try:
+            export_records(self.filtered_data, path)
+        except OSError as e:
+            self.dialogs.show_error("Erro", f"Não foi possível exportar:\n{e}")
+            return
+        self.status_var.set(f"{len(self.filtered_data)} software(s) exportado(s) para {path}")
+
+    def _remove_from_data(self, records):
+        """Retira os registros de data["softwares"] em uma única passada"""
+        ids = {record_key(s) for s in records}
+        self.data["softwares"][:] = [s for s in self.data["softwares"] if record_key(s) not in ids]
+
     def remove_software(self):
-        selected = self.tree.selection()
+        selected = self._selected_records()
         if not selected:
             self.dialogs.show_warning("Aviso", "Selecione um software para remover.")
             return
 
-        idx = self.tree.index(selected[0])
-        soft = self.filtered_data[idx]
-        nome = soft.get("nome", "")
+        if len(selected) == 1:
+            nome = selected[0].get("nome", "")
+            prompt = f"Remover '{nome}'?"
+            done = f"Software '{nome}' removido com sucesso"
+        else:
+            prompt = f"Remover os {len(selected)} softwares selecionados?"
+            done = f"{len(selected)} softwares removidos com sucesso"
 
-        if self.dialogs.ask_yesno("Confirmar", f"Remover '{nome}'?"):
-            self.data["softwares"].remove(soft)
-            save_data(self.data)
+        if self.dialogs.ask_yesno("Confirmar", prompt):
+            self._remember("Remover", [(soft, None) for soft in selected])
+            self._remove_from_data(selected)
+            self.save_queue.delete_many(self.data, selected)
+            for soft in selected:
+                self._on_record_removed(soft)
             self.apply_filter()
-            self.status_var.set(f"Software '{nome}' removido com sucesso")
+            self.status_var.set(done)
+
+    # ============================
+    # Desfazer / Refazer
+    # ============================
+    def _remember(self, label, pairs):
+        """Guarda uma ação para desfazer: pares (registro antes, registro depois), None se não existe"""
+        changes = []
+        for before, after in pairs:
+            record = after if after is not None else before
+            record_key(record)  # garante o id antes das cópias
+            if self.inventory is not None:
+                self._undo_sources[record["id"]] = self.inventory.source_of(record)
+            changes.append(change_entry(
+                dict(before) if before is not None else None,
+                dict(after) if after is not None else None,
+            ))
+        self.history.record(label, changes)
+
+    def undo(self):
+        step = self.history.undo()
+        if step is None:
+            self.status_var.set("Nada para desfazer")
+            return
+        self._finish_history_step("Desfeito", *step)
+
+    def redo(self):
+        step = self.history.redo()
+        if step is None:
+            self.status_var.set("Nada para refazer")
+            return
+        self._finish_history_step("Refeito", *step)
+
+    def _finish_history_step(self, verb, label, changes):
+        skipped = self._apply_history(changes)
+        message = f"{verb}: {label}"
+        if skipped:
+            message += f" ({skipped} registro(s) alterado(s) depois, mantido(s) como estão)"
+        self.status_var.set(message)
+
+    def _apply_history(self, changes):
+        """Leva cada registro ao estado 'depois' da alteração; retorna quantos ficaram de fora.
+
+        Um registro que não está mais como a ação o deixou (alterado por outro
+        usuário, por exemplo) não é sobrescrito.
+        """
+        added, changed, removed = [], [], []
+        skipped = 0
+        for change in changes:
+            soft = self.by_id.get(change["id"])
+            if soft != change["antes"]:
+                skipped += 1
+                continue
+            target = change["depois"]
+            if target is None:
+                removed.append(soft)
+            elif soft is None:
+                added.append(dict(target))
+            else:
+                soft.clear()
+                soft.update(target)
+                changed.append(soft)
+
+        if removed:
+            self._remove_from_data(removed)
+            self.save_queue.delete_many(self.data, removed)
+            for soft in removed:
+                self._on_record_removed(soft)
+        for soft in added:
+            self.data["softwares"].append(soft)
+            if self.inventory is not None:
+                self.inventory.assign(soft, self._undo_sources.get(soft["id"]) or self._target_source())
+            self.save_queue.insert(self.data, soft)
+            self._on_record_added(soft)
+        if changed:
+            self.save_queue.update_many(self.data, changed)
+            for soft in changed:
+                self._on_record_changed(soft)
+        self.apply_filter()
+        return skipped
+
+    def _update_edit_menu(self):
+        """Mostra no menu Editar qual ação será desfeita/refeita"""
+        for index, verb, label in ((0, "Desfazer", self.history.undo_label),
+                                   (1, "Refazer", self.history.redo_label)):
+            self.edit_menu.entryconfigure(
+                index,
+                label=f"{verb}: {label}" if label else verb,
+                state=tk.NORMAL if label else tk.DISABLED,
+            )
+
+    # ============================
+    # Ações em lote
+    # ============================
+    def _selected_records(self):
+        return [self.by_id[iid] for iid in self.tree.selection() if iid in self.by_id]
+
+    def _apply_bulk(self, records, change, done):
+        """Aplica change(registro) em uma passada, grava uma vez e redesenha uma vez.
+
+        change retorna False para registros que não puderam ser alterados.
+        """
+        before = {record_key(soft): dict(soft) for soft in records}
+        changed = [soft for soft in records if change(soft) is not False]
+        self._remember(done, [(before[record_key(soft)], soft) for soft in changed])
+        if changed:
+            self.save_queue.update_many(self.data, changed)
+            for soft in changed:
+                self._on_record_changed(soft)
+            self.apply_filter()
+        skipped = len(records) - len(changed)
+        suffix = f" ({skipped} ignorado(s))" if skipped else ""
+        self.status_var.set(f"{done}: {len(changed)} software(s){suffix}")
+
+    def _bulk_selection(self):
+        selected = self._selected_records()
+        if not selected:
+            self.dialogs.show_warning("Aviso", "Selecione um ou mais softwares.")
+        return selected
+
+    def bulk_set_renovacao(self, value):
+        selected = self._bulk_selection()
+        if not selected:
+            return
+
+        def change(soft):
+            soft["renovacao"] = value
+        self._apply_bulk(selected, change, f"Renovar = {value}")
+
+    def bulk_shift_validade(self):
+        selected = self._bulk_selection()
+        if not selected:
+            return
+        answer = self.dialogs.ask_string(
+            "Adiar validade",
+            f"Quantos meses somar à validade dos {len(selected)} selecionados? (negativo para antecipar)",
+            initial="12"
+        )
+        if answer is None:
+            return
+        try:
+            months = int(answer.strip())
+        except ValueError:
+            self.dialogs.show_error("Erro", "Informe um número inteiro de meses.")
+            return
+
+        def change(soft):
+            # Vitalícios e datas inválidas ficam como estão
+            d = parse_iso(soft.get("validade", ""))
+            if d is None:
+                return False
+            try:
+                soft["validade"] = to_iso_string(add_months(d, months))
+            except ValueError:
+                return False
+        self._apply_bulk(selected, change, f"Validade adiada em {months} mes(es)")
+
+    def bulk_set_ativacao(self):
+        selected = self._bulk_selection()
+        if not selected:
+            return
+        ativacao = self.dialogs.ask_string(
+            "Definir ativação",
+            f"Modo/servidor de ativação para os {len(selected)} selecionados:"
+        )
+        if ativacao is None:
+            return
+
+        def change(soft):
+            soft["ativacao"] = ativacao
+        self._apply_bulk(selected, change, "Ativação definida")
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Editor da agenda de softwares")
+    parser.add_argument("--agendas", nargs="+", metavar="CAMINHO",
+                        help="Arquivos ou diretórios de agendas (um por laboratório), editados em conjunto")
+    parser.add_argument("--sem-servidores", action="store_true",
+                        help="Não testa os servidores de ativação (nenhuma conexão de rede)")
+    add_profile_arguments(parser, "perfil_editor.json")
+    args = parser.parse_args(argv)
+    start_from_args(args, "ui_editor")
+
+    app = SoftwareEditor(args.agendas, check_servers=not args.sem_servidores)
+    app.mainloop()
 
 if __name__ == "__main__":
-    app = SoftwareEditor()
-    app.mainloop()
\ No newline at end of file
+    main()
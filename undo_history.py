@@ -0,0 +1,49 @@
+# Desfazer/refazer do editor, com as alterações no formato do diário
+
+from data_handler import invert_change
+
+UNDO_LIMIT = 100  # ações guardadas
+
+class UndoHistory:
+    """Pilhas de desfazer e refazer; cada passo é uma ação do usuário.
+
+    Um passo é (descrição, alterações), com as alterações no formato de
+    data_handler.change_entry (registro antes e depois). Desfazer devolve as
+    alterações inversas, na ordem contrária; refazer devolve as originais.
+    """
+
+    def __init__(self, limit=UNDO_LIMIT):
+        self.limit = limit
+        self._undo = []
+        self._redo = []
+
+    def record(self, label, changes):
+        changes = [c for c in changes if c["antes"] != c["depois"]]
+        if not changes:
+            return
+        self._undo.append((label, changes))
+        del self._undo[:-self.limit]
+        self._redo.clear()
+
+    @property
+    def undo_label(self):
+        return self._undo[-1][0] if self._undo else None
+
+    @property
+    def redo_label(self):
+        return self._redo[-1][0] if self._redo else None
+
+    def undo(self):
+        """(descrição, alterações a aplicar) do último passo, ou None."""
+        if not self._undo:
+            return None
+        label, changes = self._undo.pop()
+        self._redo.append((label, changes))
+        return label, [invert_change(c) for c in reversed(changes)]
+
+    def redo(self):
+        if not self._redo:
+            return None
+        label, changes = self._redo.pop()
+        self._undo.append((label, changes))
+        return label, list(changes)